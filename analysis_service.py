@@ -0,0 +1,388 @@
+"""
+Serviço HTTP de longa duração em torno de um único ProcessAnalyzer compartilhado.
+
+Endpoints (JSON):
+    POST /analyze        {"process_data": [...], "timeout": 120}  -> resultado (ou 202 com job_id)
+    POST /jobs           {"process_data": [...]} ou {"processes": [[...], ...]} -> 202 com job_id(s)
+    GET  /jobs/<job_id>  -> estado e resultado de um job
+    GET  /health         -> estado da fila e dos workers
+    GET  /metrics        -> métricas no formato texto do Prometheus
+
+As análises entram em uma fila limitada e são executadas por um pool fixo de workers;
+com a fila cheia o serviço responde 429. Entradas idênticas já em andamento são
+coalescidas em um único job.
+
+Exemplo (modelo simulado, sem chamadas à API):
+    python analysis_service.py --stub-llm --port 8000
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from response_cache import normalize_process_data
+
+DEFAULT_PORT = 8000
+DEFAULT_WAIT_SECONDS = 120.0
+
+STATUS_PENDING = "pendente"
+STATUS_RUNNING = "executando"
+STATUS_DONE = "concluido"
+STATUS_ERROR = "erro"
+
+
+class ServiceBusyError(RuntimeError):
+    """
+    A fila de análises está cheia; tente novamente mais tarde.
+
+    Em um lote aceito em parte, accepted_job_ids traz os jobs já enfileirados, na ordem
+    dos processos enviados.
+    """
+
+    def __init__(self, message: str, accepted_job_ids: list[str] = None):
+        super().__init__(message)
+        self.accepted_job_ids = list(accepted_job_ids or [])
+
+
+class AnalysisJob:
+    """Uma análise enfileirada, compartilhada por todas as requisições idênticas."""
+
+    def __init__(self, key: str, process_data: list[dict]):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.process_data = process_data
+        self.status = STATUS_PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.requests = 1
+        self._done = threading.Event()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def finish(self, result: list[dict] = None, error: str = None) -> None:
+        self.result = result
+        self.error = error
+        self.status = STATUS_ERROR if error else STATUS_DONE
+        self.finished_at = time.time()
+        self._done.set()
+
+    def to_dict(self) -> dict:
+        data = {"job_id": self.id, "status": self.status, "requests": self.requests}
+        if self.status == STATUS_DONE:
+            data["result"] = self.result
+        elif self.status == STATUS_ERROR:
+            data["erro"] = self.error
+        return data
+
+
+class AnalysisService:
+    """
+    Fila limitada de análises atendida por um pool fixo de workers, todos usando o
+    mesmo analisador (índice carregado e conexões reaproveitadas).
+    """
+
+    def __init__(self, analyzer, max_workers: int = 4, max_queue: int = 32, max_finished_jobs: int = 1000):
+        """
+        Inicializa o AnalysisService.
+
+        Args:
+            analyzer (ProcessAnalyzer): Analisador compartilhado pelos workers.
+            max_workers (int): Análises simultâneas (limita o uso da cota da OpenAI).
+            max_queue (int): Jobs aguardando execução; além disso, submit levanta ServiceBusyError.
+            max_finished_jobs (int): Jobs concluídos mantidos para consulta em /jobs/<id>.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.analyzer = analyzer
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def submit(self, process_data) -> tuple[AnalysisJob, bool]:
+        """
+        Enfileira uma análise, ou junta-se a uma idêntica em andamento.
+
+        Returns:
+            tuple[AnalysisJob, bool]: O job e se a requisição foi coalescida a um job existente.
+
+        Raises:
+            ServiceBusyError: Se a fila estiver cheia.
+        """
+        if isinstance(process_data, dict):
+            process_data = [process_data]
+        if not process_data or not all(isinstance(row, dict) for row in process_data):
+            raise ValueError("process_data deve ser um dicionário ou uma lista de dicionários.")
+        key = hashlib.sha256(normalize_process_data(process_data).encode("utf-8")).hexdigest()
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.requests += 1
+                return job, True
+            job = AnalysisJob(key, process_data)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise ServiceBusyError("Fila de análises cheia.")
+            self._in_flight[key] = job
+            self._jobs[job.id] = job
+            self._trim_jobs()
+        return job, False
+
+    def _trim_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id: str) -> AnalysisJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            job = self._queue.get()
+            if job is None:
+                break
+            job.status = STATUS_RUNNING
+            try:
+                result = self.analyzer.analyze_process(job.process_data).to_dict(orient="records")
+                job.finish(result=result)
+            except Exception as e:
+                self.logger.error(f"Falha no job {job.id}: {e}")
+                job.finish(error=str(e))
+            finally:
+                with self._lock:
+                    self._in_flight.pop(job.key, None)
+                self._queue.task_done()
+
+    def health(self) -> dict:
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {
+            "status": "ok",
+            "workers": self.max_workers,
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "in_flight": in_flight,
+        }
+
+
+def _make_handler(service: AnalysisService):
+    class AnalysisRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("O corpo da requisição deve ser um objeto JSON.")
+            return payload
+
+        def _busy(self) -> None:
+            self._send_json(429, {"erro": "Fila de análises cheia; tente novamente."}, {"Retry-After": "5"})
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self._send_json(200, service.health())
+            elif path == "/metrics":
+                body = service.analyzer.instrumentation.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif path.startswith("/jobs/"):
+                job = service.get_job(path[len("/jobs/"):])
+                if job is None:
+                    self._send_json(404, {"erro": "Job não encontrado."})
+                else:
+                    self._send_json(200, job.to_dict())
+            else:
+                self._send_json(404, {"erro": "Endpoint não encontrado."})
+
+        def do_POST(self):
+            path = self.path.rstrip("/")
+            try:
+                payload = self._read_json()
+                if path == "/analyze":
+                    job, _ = service.submit(payload.get("process_data"))
+                    if not job.wait(float(payload.get("timeout", DEFAULT_WAIT_SECONDS))):
+                        self._send_json(202, job.to_dict())
+                    else:
+                        self._send_json(200 if job.status == STATUS_DONE else 500, job.to_dict())
+                elif path == "/jobs":
+                    if "processes" in payload:
+                        job_ids = []
+                        for process_data in payload["processes"]:
+                            try:
+                                job_ids.append(service.submit(process_data)[0].id)
+                            except ServiceBusyError:
+                                # Informa os jobs já aceitos para o cliente reenviar só o restante
+                                self._send_json(429, {"erro": "Fila de análises cheia; tente novamente.",
+                                                      "job_ids": job_ids}, {"Retry-After": "5"})
+                                return
+                        self._send_json(202, {"job_ids": job_ids})
+                    else:
+                        job, _ = service.submit(payload.get("process_data"))
+                        self._send_json(202, job.to_dict())
+                else:
+                    self._send_json(404, {"erro": "Endpoint não encontrado."})
+            except ServiceBusyError:
+                self._busy()
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"erro": str(e)})
+
+        def log_message(self, format, *args):
+            service.logger.debug(format % args)
+
+    return AnalysisRequestHandler
+
+
+def serve(service: AnalysisService, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Inicia os workers e o servidor HTTP em uma thread de fundo."""
+    service.start()
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    threading.Thread(target=server.serve_forever, name="analysis-service", daemon=True).start()
+    service.logger.info(f"Serviço de análise em http://{host}:{server.server_address[1]}")
+    return server
+
+
+class AnalysisServiceClient:
+    """Cliente HTTP do serviço de análise (usado pelo app.py quando ANALYSIS_SERVICE_URL está definida)."""
+
+    def __init__(self, base_url: str, timeout: float = DEFAULT_WAIT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout + 10)
+        if response.status_code == 429:
+            data = response.json()
+            raise ServiceBusyError(data.get("erro", "Serviço ocupado."), data.get("job_ids", []))
+        if response.status_code >= 400 and response.status_code != 500:
+            response.raise_for_status()
+        return response.json()
+
+    def analyze(self, process_data) -> list[dict]:
+        """Analisa um processo e aguarda o resultado (no máximo timeout segundos no servidor)."""
+        data = self._post("/analyze", {"process_data": process_data, "timeout": self.timeout})
+        if data["status"] == STATUS_ERROR:
+            raise RuntimeError(data.get("erro", "Falha na análise."))
+        if data["status"] != STATUS_DONE:
+            data = self.wait_for_job(data["job_id"], self.timeout)
+        return data["result"]
+
+    def submit(self, process_data) -> str:
+        return self._post("/jobs", {"process_data": process_data})["job_id"]
+
+    def submit_batch(self, processes: list) -> list[str]:
+        """
+        Enfileira vários processos e retorna os ids dos jobs, na mesma ordem.
+
+        Raises:
+            ServiceBusyError: Se a fila encher no meio do lote. Os primeiros processos
+                podem já ter sido enfileirados: seus ids estão em accepted_job_ids, e apenas
+                processes[len(accepted_job_ids):] deve ser reenviado.
+        """
+        return self._post("/jobs", {"processes": processes})["job_ids"]
+
+    def job_status(self, job_id: str) -> dict:
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def wait_for_job(self, job_id: str, timeout: float = None, poll_interval: float = 0.5) -> dict:
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            data = self.job_status(job_id)
+            if data["status"] == STATUS_ERROR:
+                raise RuntimeError(data.get("erro", "Falha na análise."))
+            if data["status"] == STATUS_DONE:
+                return data
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} não concluído em {timeout or self.timeout} s.")
+            time.sleep(poll_interval)
+
+
+def _stub_analyzer(faiss_index_path: str, dimension: int, **options):
+    """ProcessAnalyzer com modelo de chat e embeddings simulados, para testes locais."""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from benchmark_retrieval import STUB_ANSWER, HashingEmbeddings
+    from process_analyser import ProcessAnalyzer
+
+    class StubProcessAnalyzer(ProcessAnalyzer):
+        def _setup_api_key(self, api_key: str = None) -> None:
+            pass
+
+        def _initialize_embeddings(self):
+            return HashingEmbeddings(dimension)
+
+        def _initialize_llm(self):
+            return FakeListChatModel(responses=[STUB_ANSWER])
+
+    return StubProcessAnalyzer(faiss_index_path, embedding_cache_path=None, verbose=False, **options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço HTTP de análise de processos.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--faiss-index-path", default="process_index.faiss")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Usa modelo e embeddings simulados (sem chamadas à API)")
+    parser.add_argument("--stub-dimension", type=int, default=1536,
+                        help="Dimensão dos embeddings simulados (a mesma do índice)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.stub_llm:
+        analyzer = _stub_analyzer(args.faiss_index_path, args.stub_dimension)
+    else:
+        from process_analyser import get_process_analyzer
+        analyzer = get_process_analyzer(args.faiss_index_path, os.getenv("OPENAI_API_KEY"), verbose=False)
+    server = serve(AnalysisService(analyzer, args.max_workers, args.max_queue), args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -2,15 +2,95 @@ import streamlit as st
 import base64
 from pathlib import Path
 import os
-from process_analyser import analyze_single_process
+import uuid
 from dotenv import load_dotenv
 import pandas as pd
 
+# process_analyser (LangChain, OpenAI, FAISS) and analysis_service are imported on first use,
+# so the first paint does not wait for them
+
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
+# With ANALYSIS_SERVICE_URL set, analyses run on the shared analysis service instead of inline
+analysis_service_url = os.getenv("ANALYSIS_SERVICE_URL")
+# ANALYZER_WARMUP=0 disables loading the analyzer in the background when the app starts
+analyzer_warmup = os.getenv("ANALYZER_WARMUP", "1") != "0"
+# FAST_SUGGESTIONS=0 disables showing the catalogue suggestions while the model is running
+fast_suggestions = os.getenv("FAST_SUGGESTIONS", "1") != "0"
+# Results of all sessions live in one bounded store; session_state only keeps the session key
+session_store_max_bytes = int(os.getenv("SESSION_STORE_MAX_MB", "64")) * 1024 * 1024
+session_ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+FAISS_INDEX_PATH = "process_index.faiss"
+STATIC_DIR = Path("static")
+
+@st.cache_resource
+def start_analyzer_warmup():
+    """
+    Start building the shared analyzer in a background thread, once per server process.
+
+    Returns:
+        threading.Thread: The warm-up thread.
+    """
+    from process_analyser import warm_up
+    return warm_up(FAISS_INDEX_PATH, api_key)
+
+@st.cache_resource
+def get_service_client(base_url):
+    """
+    Return the analysis service client shared by all sessions.
+
+    Args:
+        base_url (str): Base URL of the analysis service.
+
+    Returns:
+        AnalysisServiceClient: Client with a pooled HTTP session.
+    """
+    from analysis_service import AnalysisServiceClient
+    return AnalysisServiceClient(base_url)
+
+@st.cache_resource
+def get_session_store():
+    """
+    Return the result store shared by all sessions, bounded in total and per session.
+
+    Returns:
+        SessionStore: Content-addressed store of immutable result tuples.
+    """
+    from session_store import SessionStore
+    return SessionStore(max_bytes=session_store_max_bytes, session_ttl=session_ttl_seconds)
+
+def session_key():
+    """
+    Return the key of the current browser session in the session store.
 
-@st.cache_data
+    Returns:
+        str: A random id kept in st.session_state.
+    """
+    if "session_key" not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    return st.session_state.session_key
+
+def store_results(slot, rows):
+    """
+    Save results of the current session in the shared store.
+
+    Args:
+        slot (str): Name of the results ("resultados", "selecionadas", "final").
+        rows: DataFrame, list of dicts or list of tuples.
+
+    Returns:
+        bool: False if the results exceed the per-session limit (an error is shown).
+    """
+    from session_store import SessionStoreFullError
+    try:
+        get_session_store().put(session_key(), slot, rows)
+    except SessionStoreFullError:
+        st.error("Os resultados excedem o limite de memória da sessão. Reduza a quantidade de oportunidades.")
+        return False
+    return True
+
+@st.cache_data(max_entries=256)
 def convert_df_to_csv(df):
     """
     Convert a pandas DataFrame to a CSV string with custom separators and encoding.
@@ -44,6 +124,65 @@ def stylable_container(key, css_styles):
     """, unsafe_allow_html=True)
     return st.container()
 
+def file_fingerprint(path):
+    """
+    Return a cheap fingerprint of a file, used as the cache key of its contents.
+
+    Args:
+    path (str): Path to the file.
+
+    Returns:
+    tuple: (size, modification time in nanoseconds).
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+@st.cache_data(show_spinner=False)
+def encode_image(image_file, fingerprint):
+    """
+    Base64-encode an image once per file version instead of on every rerun.
+
+    Args:
+    image_file (str): Path to the image file.
+    fingerprint (tuple): File fingerprint; a new value invalidates the cached encoding.
+
+    Returns:
+    str: The base64-encoded file contents.
+    """
+    with Path(image_file).open("rb") as file:
+        return base64.b64encode(file.read()).decode()
+
+@st.cache_data(show_spinner=False)
+def read_text_file(path, fingerprint):
+    """
+    Read a text file once per file version instead of on every rerun.
+
+    Args:
+    path (str): Path to the file.
+    fingerprint (tuple): File fingerprint; a new value invalidates the cached contents.
+
+    Returns:
+    str: The file contents.
+    """
+    with open(path, "r") as f:
+        return f.read()
+
+def image_url(image_file):
+    """
+    Return a URL for a local image: the static file URL when static serving is enabled
+    (.streamlit/config.toml) and the image is in the static folder, otherwise a data URI.
+
+    Args:
+    image_file (str): Path to the local image file.
+
+    Returns:
+    str: URL usable in CSS.
+    """
+    path = Path(image_file)
+    if st.get_option("server.enableStaticServing") and path.parent == STATIC_DIR:
+        return f"app/static/{path.name}"
+    return f"data:image/png;base64,{encode_image(image_file, file_fingerprint(image_file))}"
+
 def add_bg_from_local(image_file):
     """
     Add a background image to the Streamlit app from a local file.
@@ -51,13 +190,11 @@ def add_bg_from_local(image_file):
     Args:
     image_file (str): Path to the local image file.
     """
-    with Path(image_file).open("rb") as file:
-        encoded_string = base64.b64encode(file.read()).decode()
     st.markdown(
         f"""
         <style>
         .stApp {{
-            background-image: url(data:image/png;base64,{encoded_string});
+            background-image: url({image_url(image_file)});
             background-size: cover;
             background-position: center;
             background-repeat: no-repeat;
@@ -74,8 +211,8 @@ def load_css(css_file):
     Args:
     css_file (str): Path to the CSS file.
     """
-    with open(css_file, "r") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    css = read_text_file(css_file, file_fingerprint(css_file))
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
 def get_button_style(button_class):
     """
@@ -169,7 +306,7 @@ def render_oportunidade_melhoria():
     if submit_button:
         if ramo_empresa and direcionadores and nome_processo and atividade and evento and causa:              
             # Store form data in session state
-            processo = st.session_state.processo = [{
+            processo = [{
                 "ramo_empresa": ramo_empresa,
                 "direcionadores": direcionadores,
                 "nome_processo": nome_processo,
@@ -184,16 +321,52 @@ def render_oportunidade_melhoria():
             }]
 
             #Apply AI
+            # Render each opportunity as soon as it is parsed from the token stream
+            results_placeholder = st.empty()
+            rows = []
             with st.spinner('Identificando oportunidade de melhoria...'):  
-                resultados = analyze_single_process(
-                    process_data=processo,
-                    faiss_index_path="process_index.faiss",
-                    api_key=api_key
-                )
+                if analysis_service_url:
+                    from analysis_service import ServiceBusyError
+                    try:
+                        rows = get_service_client(analysis_service_url).analyze(processo)
+                    except ServiceBusyError:
+                        st.error("O serviço de análise está ocupado. Tente novamente em alguns instantes.")
+                        return
+                    except TimeoutError:
+                        st.error("A análise excedeu o tempo limite do serviço. Tente novamente.")
+                        return
+                    except RuntimeError as e:
+                        st.error(f"Falha na análise: {e}")
+                        return
+                    if rows:
+                        results_placeholder.dataframe(pd.DataFrame(rows), use_container_width=True)
+                else:
+                    from process_analyser import stream_single_process, suggest_single_process
+                    # Curated suggestions from the catalogue show up at once, without the model;
+                    # the first streamed opportunity replaces them
+                    status_placeholder = st.empty()
+                    if fast_suggestions:
+                        suggestions = suggest_single_process(processo, FAISS_INDEX_PATH, api_key)
+                        if not suggestions.empty:
+                            status_placeholder.caption("Sugestões do catálogo. Refinando com IA...")
+                            results_placeholder.dataframe(suggestions, use_container_width=True)
+                    for row in stream_single_process(
+                        process_data=processo,
+                        faiss_index_path=FAISS_INDEX_PATH,
+                        api_key=api_key
+                    ):
+                        rows.append(row)
+                        results_placeholder.dataframe(pd.DataFrame(rows), use_container_width=True)
+                    status_placeholder.empty()
+            if not rows:
+                st.error("Nenhuma oportunidade de melhoria foi identificada. Tente novamente.")
+                return
+            resultados = pd.DataFrame(rows)
             st.success("Oportunidade de melhoria identificada com sucesso.")
 
-            # Store resultados in the session state
-            st.session_state.resultados = resultados
+            # Store resultados in the shared session store
+            if not store_results("resultados", rows):
+                return
 
             # Then allow the user to download the results as CSV
             csv = convert_df_to_csv(resultados)
@@ -211,21 +384,14 @@ def render_refinamento_tarefas():
     Render the "Refinamento das tarefas" page.
     This page allows users to select and refine improvement opportunities.
     """
-    # Retrieve 'resultados' from session state
-    if 'resultados' not in st.session_state:
+    # Retrieve 'resultados' from the session store (None if never searched or expired)
+    resultados = get_session_store().get(session_key(), "resultados")
+    if resultados is None:
         st.warning("Nenhum resultado disponível. Por favor, volte e busque uma oportunidade de melhoria.")
         return
-    
-    resultados = st.session_state['resultados']
-    lista_resultados = resultados.iloc[:, 0].tolist() 
-    
-    # If we have stored additional opportunities, add them to the list
-    if 'additional_opportunities' not in st.session_state:
-        st.session_state.additional_opportunities = []
-    
-    # Combine original results with additional opportunities
-    lista_resultados.extend(st.session_state.additional_opportunities)
-    
+
+    lista_resultados = [record[0] for record in resultados]
+
     st.markdown('<p class="medium-font">Escolha as oportunidades de melhoria:</p>', unsafe_allow_html=True)
 
     # Display checkboxes for each opportunity
@@ -240,10 +406,10 @@ def render_refinamento_tarefas():
 
     if add_button and new_opportunity:
        
-        # Update the resultados DataFrame
-        new_row = pd.DataFrame({resultados.columns[0]: [new_opportunity]})
-        st.session_state.resultados = pd.concat([resultados, new_row], ignore_index=True)
-        
+        # Results are immutable tuples: store a new version with the added opportunity
+        if not store_results("resultados", resultados + ((new_opportunity, "", ""),)):
+            return
+
         st.success(f"Nova oportunidade adicionada: {new_opportunity}")
         st.rerun()
 
@@ -252,15 +418,16 @@ def render_refinamento_tarefas():
 
     if confirm_button:
         selected_text = ""
-        st.session_state.selected_opportunities = []
+        selected_records = []
         for key, selected in selected_opportunities.items():
             if selected:
                 index = int(key.split('_')[1])
                 selected_text += f"- {lista_resultados[index]}\n"
-                st.session_state.selected_opportunities.append(lista_resultados[index])
+                selected_records.append(resultados[index])
 
-        # Store updated selected_text in session state
-        st.session_state.selected_text = selected_text
+        # Store the selected opportunities (full records) in the session store
+        if not store_results("selecionadas", selected_records):
+            return
 
         # Display selected opportunities
         if selected_text:
@@ -275,27 +442,14 @@ def render_planilha_final():
     Render the "Planilha Final" page with merged data from selected opportunities and results.
     This page displays a final spreadsheet with editable fields and allows CSV download.
     """
-    # Get the selected opportunities from the session state
-    selecao = st.session_state.get('selected_opportunities')
-    
-    # Get the resultados from the session state
-    resultados = st.session_state.get('resultados')
-    
-    # Filter resultados to only include selected opportunities
-    if not resultados.empty and selecao:
-        # Get the name of the first column (opportunity column)
-        opportunity_column = resultados.columns[0]
-        
-        # Filter resultados where the opportunity column values are in selecao
-        filtered_resultados = resultados[resultados[opportunity_column].isin(selecao)].copy()
-        
-        # Rename columns
-        column_mapping = {
-            filtered_resultados.columns[0]: 'Oportunidade de Melhoria',
-            filtered_resultados.columns[1]: 'Tarefa',
-            filtered_resultados.columns[2]: 'Critério de Aceitação'
-        }
-        filtered_resultados = filtered_resultados.rename(columns=column_mapping)
+    from session_store import to_frame
+
+    # Get the selected opportunities (full records) from the session store
+    selecao = get_session_store().get(session_key(), "selecionadas")
+
+    if selecao:
+        # Build the DataFrame only for display, with the final column names
+        filtered_resultados = to_frame(selecao, columns=('Oportunidade de Melhoria', 'Tarefa', 'Critério de Aceitação'))
         
         # Display editable dataframe using st.data_editor
         st.write("Edite os dados conforme necessário:")
@@ -322,8 +476,8 @@ def render_planilha_final():
             }
         )
         
-        # Update session state with edited data
-        st.session_state.final_df = edited_df
+        # Update the session store with the edited data
+        store_results("final", edited_df)
         
         # Add download button for filtered CSV
         if not edited_df.empty:
@@ -348,7 +502,9 @@ def main():
     It also handles the progress bar and navigation buttons.
     """
     st.set_page_config(page_title="Oportunidade de Melhoria", layout="wide")
-    add_bg_from_local('background.png')
+    if analyzer_warmup and not analysis_service_url:
+        start_analyzer_warmup()
+    add_bg_from_local('static/background.png')
     load_css('style.css')  # Load the external CSS file
     
     pages = setup_navigation()
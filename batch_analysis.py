@@ -0,0 +1,216 @@
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+from output_parser import RESULT_FIELDS
+from process_analyser import get_process_analyzer
+
+# Mesmos campos do formulário em app.render_oportunidade_melhoria
+PROCESS_FIELDS = [
+    "ramo_empresa", "direcionadores", "nome_processo", "atividade", "evento", "causa",
+    "operaciona_atividade", "sistema_relacionado", "solucao_gap", "outro_gap", "transcrição",
+]
+REQUIRED_FIELDS = ["ramo_empresa", "direcionadores", "nome_processo", "atividade", "evento", "causa"]
+ROW_ID_COLUMN = "row_id"
+
+
+def read_processes(input_path: str) -> list[tuple[str, dict]]:
+    """
+    Lê uma planilha Excel, CSV ou JSONL de processos.
+
+    Returns:
+        list[tuple[str, dict]]: Pares (id da linha de origem, processo). O id vem da coluna
+        "row_id" quando existir; caso contrário, é a posição da linha (a partir de 1).
+    """
+    extension = os.path.splitext(input_path)[1].lower()
+    if extension in (".xlsx", ".xls"):
+        df = pd.read_excel(input_path, dtype=str)
+    elif extension == ".csv":
+        # Aceita tanto "," quanto o "|" usado nos CSVs exportados pelo app
+        df = pd.read_csv(input_path, sep=None, engine="python", dtype=str)
+    elif extension in (".jsonl", ".ndjson"):
+        df = pd.read_json(input_path, lines=True, dtype=False)
+    else:
+        raise ValueError(f"Formato de entrada não suportado: {extension}")
+
+    df = df.fillna("")
+    processes = []
+    for position, row in enumerate(df.to_dict(orient="records"), start=1):
+        row_id = str(row.pop(ROW_ID_COLUMN, "") or position)
+        process = {field: str(row.get(field, "") or "") for field in PROCESS_FIELDS}
+        processes.append((row_id, process))
+    return processes
+
+
+class _ResultWriter:
+    """Grava os resultados linha a linha (JSONL ou CSV), descarregando o buffer a cada linha."""
+
+    def __init__(self, output_path: str):
+        self.extension = os.path.splitext(output_path)[1].lower()
+        if self.extension not in (".jsonl", ".csv"):
+            raise ValueError(f"Formato de saída não suportado: {self.extension}")
+        self._file = open(output_path, "w", encoding="utf-8", newline="")
+        self._lock = threading.Lock()
+        if self.extension == ".csv":
+            self._csv = csv.DictWriter(
+                self._file, fieldnames=["source_row", "status", *RESULT_FIELDS, "erro"], delimiter="|"
+            )
+            self._csv.writeheader()
+
+    def write(self, source_row: str, records: list[dict] = None, error: str = None) -> None:
+        with self._lock:
+            if self.extension == ".jsonl":
+                line = {"source_row": source_row, "status": "erro" if error else "ok"}
+                if error:
+                    line["erro"] = error
+                else:
+                    line["oportunidades"] = records
+                self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            elif error:
+                self._csv.writerow({"source_row": source_row, "status": "erro", "erro": error})
+            else:
+                for record in records:
+                    self._csv.writerow({
+                        "source_row": source_row,
+                        "status": "ok",
+                        **{field: record.get(field, "") for field in RESULT_FIELDS},
+                    })
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _missing_fields(process: dict) -> list[str]:
+    return [field for field in REQUIRED_FIELDS if not process.get(field)]
+
+
+def _analyze_row(analyzer, process: dict, documents: list = None) -> list[dict]:
+    missing = _missing_fields(process)
+    if missing:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(missing)}")
+    return analyzer.analyze_process([process], documents=documents).to_dict(orient="records")
+
+
+def _prefetch_documents(analyzer, processes: list[tuple[str, dict]], batch_size: int):
+    """
+    Gera (id da linha, processo, documentos) recuperando o contexto de batch_size linhas
+    por vez com analyzer.retrieve_many (uma requisição de embeddings e uma busca no
+    índice por lote). Se a recuperação em lote falhar, as linhas seguem sem documentos
+    e cada análise faz a sua própria recuperação.
+    """
+    logger = logging.getLogger(__name__)
+    for start in range(0, len(processes), batch_size):
+        chunk = processes[start:start + batch_size]
+        valid = [position for position, (_, process) in enumerate(chunk) if not _missing_fields(process)]
+        documents = [None] * len(chunk)
+        if valid:
+            try:
+                retrieved = analyzer.retrieve_many([[chunk[position][1]] for position in valid])
+                for position, row_documents in zip(valid, retrieved):
+                    documents[position] = row_documents
+            except Exception as e:
+                logger.warning(f"Recuperação em lote falhou ({e}); recuperando linha a linha.")
+        for (row_id, process), row_documents in zip(chunk, documents):
+            yield row_id, process, row_documents
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    faiss_index_path: str = "process_index.faiss",
+    api_key: str = None,
+    max_workers: int = 4,
+    analyzer=None,
+    retrieval_batch_size: int = 32,
+) -> dict:
+    """
+    Analisa cada processo da planilha de forma independente e em paralelo.
+
+    Cada linha é analisada isoladamente; uma falha é registrada na saída com o id da
+    linha de origem sem interromper o lote. No máximo max_workers análises ficam em
+    andamento ao mesmo tempo.
+
+    Args:
+        input_path (str): Planilha de entrada (.xlsx, .csv ou .jsonl).
+        output_path (str): Arquivo de saída (.jsonl ou .csv).
+        faiss_index_path (str): Caminho do índice FAISS.
+        api_key (str, optional): Chave da API OpenAI.
+        max_workers (int): Número máximo de análises simultâneas.
+        analyzer (ProcessAnalyzer, optional): Analisador a usar. Padrão: analisador compartilhado.
+        retrieval_batch_size (int): Linhas cuja recuperação é feita em lote (retrieve_many)
+            antes das análises. 0 desativa: cada análise recupera seus documentos.
+
+    Returns:
+        dict: Resumo com total de linhas, sucessos, falhas e tempo decorrido.
+    """
+    logger = logging.getLogger(__name__)
+    analyzer = analyzer or get_process_analyzer(faiss_index_path, api_key)
+    processes = read_processes(input_path)
+    writer = _ResultWriter(output_path)
+    summary = {"total": len(processes), "ok": 0, "erro": 0}
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            if retrieval_batch_size:
+                rows = _prefetch_documents(analyzer, processes, retrieval_batch_size)
+            else:
+                rows = ((row_id, process, None) for row_id, process in processes)
+
+            def submit_next() -> bool:
+                for row_id, process, documents in rows:
+                    pending[executor.submit(_analyze_row, analyzer, process, documents)] = row_id
+                    return True
+                return False
+
+            # Mantém a fila de trabalho limitada para não materializar todos os futures
+            for _ in range(max_workers * 2):
+                if not submit_next():
+                    break
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row_id = pending.pop(future)
+                    try:
+                        writer.write(row_id, records=future.result())
+                        summary["ok"] += 1
+                    except Exception as e:
+                        logger.error(f"Falha ao analisar a linha {row_id}: {e}")
+                        writer.write(row_id, error=str(e))
+                        summary["erro"] += 1
+                    submit_next()
+    finally:
+        writer.close()
+
+    summary["segundos"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Lote concluído: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analisa em lote uma planilha de processos.")
+    parser.add_argument("input_path", help="Planilha de entrada (.xlsx, .csv ou .jsonl)")
+    parser.add_argument("output_path", help="Arquivo de saída (.jsonl ou .csv)")
+    parser.add_argument("--faiss-index-path", default="process_index.faiss")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--retrieval-batch-size", type=int, default=32,
+                        help="Linhas recuperadas em lote antes das análises (0 desativa)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_batch(
+        args.input_path,
+        args.output_path,
+        faiss_index_path=args.faiss_index_path,
+        max_workers=args.max_workers,
+        retrieval_batch_size=args.retrieval_batch_size,
+    )
@@ -0,0 +1,280 @@
+"""
+Benchmark offline da pilha de recuperação (ProcessEmbeddingsCreator + ProcessAnalyzer).
+
+Usa embeddings determinísticos locais e um modelo de chat simulado, sem chamadas à API.
+Para cada tamanho de corpus e tipo de índice, mede o tempo de construção e de carga,
+a latência das consultas (p50/p95/p99), o tamanho do índice em memória e o recall@k
+em relação à busca exata.
+
+Exemplo:
+    python benchmark_retrieval.py --sizes 1000 20000 --index-types flat ivf hnsw ivfpq
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+import faiss
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from create_embeddings import ProcessEmbeddingsCreator
+from faiss_index import INDEX_TYPES, IndexConfig
+from excel_loader import COLUMN_NAMES, load_process_table
+from safe_index_store import STORAGE_FORMATS
+from process_analyser import ProcessAnalyzer
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+STUB_ANSWER = json.dumps(
+    [
+        {
+            "oportunidade_melhoria": "Oportunidade simulada",
+            "tarefa": "Tarefa simulada",
+            "criterio_aceitacao": "Critério simulado",
+        }
+    ],
+    ensure_ascii=False,
+)
+
+CORPUS_COLUMNS = COLUMN_NAMES
+
+
+class HashingEmbeddings(Embeddings):
+    """Embeddings determinísticos locais: bag-of-words com hashing assinado, normalizado em L2."""
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.model = f"hashing-{dimension}"
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimension] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+
+class BenchmarkEmbeddingsCreator(ProcessEmbeddingsCreator):
+    """ProcessEmbeddingsCreator alimentado por um DataFrame sintético e embeddings locais."""
+
+    def __init__(self, df: pd.DataFrame, embeddings: Embeddings, faiss_index_path: str, index_config: IndexConfig,
+                 storage_format: str = "pickle"):
+        self._synthetic_df = df
+        self._benchmark_embeddings = embeddings
+        super().__init__(
+            excel_path="<sintético>",
+            faiss_index_path=faiss_index_path,
+            checkpoint_dir=os.path.join(os.path.dirname(faiss_index_path), "checkpoints"),
+            embedding_cache_path=None,
+            index_config=index_config,
+            storage_format=storage_format,
+        )
+
+    def _setup_api_key(self, api_key: str = None) -> None:
+        pass
+
+    def _initialize_embeddings(self):
+        return self._benchmark_embeddings
+
+    def _load_excel_data(self) -> pd.DataFrame:
+        return self._synthetic_df.copy()
+
+
+class BenchmarkProcessAnalyzer(ProcessAnalyzer):
+    """ProcessAnalyzer com embeddings locais e modelo de chat simulado."""
+
+    def __init__(self, faiss_index_path: str, embeddings: Embeddings):
+        self._benchmark_embeddings = embeddings
+        super().__init__(faiss_index_path, embedding_cache_path=None, response_cache=None, verbose=False)
+
+    def _setup_api_key(self, api_key: str = None) -> None:
+        pass
+
+    def _initialize_embeddings(self):
+        return self._benchmark_embeddings
+
+    def _initialize_llm(self):
+        return FakeListChatModel(responses=[STUB_ANSWER])
+
+
+def load_seed_rows(excel_path: str) -> pd.DataFrame:
+    """Linhas reais de Base.xlsx usadas como semente; gera linhas fictícias se o arquivo faltar."""
+    if os.path.exists(excel_path):
+        return load_process_table(excel_path)[CORPUS_COLUMNS].fillna("nan")
+    rng = np.random.default_rng(0)
+    words = [f"termo{i}" for i in range(500)]
+    return pd.DataFrame({
+        column: [" ".join(rng.choice(words, size=8)) for _ in range(200)]
+        for column in CORPUS_COLUMNS
+    })
+
+
+def make_synthetic_corpus(seed_rows: pd.DataFrame, size: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Amplia as linhas semente até size linhas, misturando campos de linhas diferentes e
+    acrescentando termos do próprio vocabulário, para que cada linha seja distinta.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(sorted({
+        token for text in seed_rows['melhoria'] for token in _TOKEN.findall(text.lower())
+    }) or ["termo"])
+    data = {}
+    for column in CORPUS_COLUMNS:
+        values = seed_rows[column].to_numpy()
+        data[column] = values[rng.integers(0, len(values), size=size)]
+    df = pd.DataFrame(data)
+    extra = [" ".join(rng.choice(vocabulary, size=3)) for _ in range(size)]
+    df['melhoria'] = df['melhoria'] + " " + pd.Series(extra)
+    df['combined_text'] = [
+        ' '.join(f"{column}: {row[column]}" for column in CORPUS_COLUMNS)
+        for row in df.to_dict(orient="records")
+    ]
+    return df
+
+
+def make_queries(corpus: pd.DataFrame, n_queries: int, seed: int = 1) -> list[str]:
+    """Consultas no formato do formulário, a partir de linhas do corpus com campos omitidos."""
+    rng = np.random.default_rng(seed)
+    rows = corpus.iloc[rng.integers(0, len(corpus), size=n_queries)]
+    return [
+        f"ramo_empresa: {row['ramo_empresa']} nome_processo: {row['nome_processo']} "
+        f"atividade: {row['atividade']} causa: {row['causa']}"
+        for row in rows.to_dict(orient="records")
+    ]
+
+
+def _percentiles(samples: list[float]) -> dict:
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def _exact_neighbors(corpus_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    index = faiss.IndexFlatL2(corpus_vectors.shape[1])
+    index.add(corpus_vectors)
+    return index.search(query_vectors, k)[1]
+
+
+def run_case(corpus: pd.DataFrame, queries: list[str], embeddings: Embeddings, config: IndexConfig,
+             k: int, n_analyses: int, work_dir: str, storage_format: str = "pickle") -> dict:
+    index_path = os.path.join(work_dir, f"{config.index_type}_{len(corpus)}", "index.faiss")
+
+    start = time.perf_counter()
+    creator = BenchmarkEmbeddingsCreator(corpus, embeddings, index_path, config, storage_format)
+    creator.save_embeddings()
+    build_seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    analyzer = BenchmarkProcessAnalyzer(index_path, embeddings)
+    load_seconds = time.perf_counter() - start
+    _, load_peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    analyzer.search_kwargs["k"] = k
+    query_latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        analyzer._retrieve_documents(query)
+        query_latencies.append(time.perf_counter() - start)
+
+    # Recall@k: posições retornadas pelo índice configurado vs. busca exata nos mesmos vetores
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+    corpus_vectors = np.asarray(embeddings.embed_documents(creator.df['combined_text'].tolist()), dtype=np.float32)
+    _, approximate = analyzer.vectorstore.index.search(query_vectors, k)
+    position_to_id = analyzer.vectorstore.index_to_docstore_id
+    exact = _exact_neighbors(corpus_vectors, query_vectors, k)
+    hits = 0
+    for approximate_row, exact_row in zip(approximate, exact):
+        approximate_ids = {position_to_id[p] for p in approximate_row if p != -1}
+        exact_ids = {creator.doc_ids[p] for p in exact_row}
+        hits += len(approximate_ids & exact_ids)
+    recall = hits / (len(queries) * k)
+
+    analysis_latencies = []
+    process = {"ramo_empresa": "", "nome_processo": "", "atividade": "", "causa": ""}
+    for query in queries[:n_analyses]:
+        process["causa"] = query
+        start = time.perf_counter()
+        analyzer.analyze_process([process])
+        analysis_latencies.append(time.perf_counter() - start)
+
+    return {
+        "index_type": config.index_type,
+        "corpus_size": len(corpus),
+        "storage_format": storage_format,
+        "build_s": round(build_seconds, 3),
+        "load_s": round(load_seconds, 4),
+        "load_peak_mb": round(load_peak_bytes / 2**20, 2),
+        "index_mb": round(faiss.serialize_index(analyzer.vectorstore.index).nbytes / 2**20, 2),
+        **{f"query_{key}": value for key, value in _percentiles(query_latencies).items()},
+        f"recall@{k}": round(recall, 4),
+        **({f"analysis_{key}": value for key, value in _percentiles(analysis_latencies).items()}
+           if analysis_latencies else {}),
+    }
+
+
+def run_benchmark(sizes: list[int], index_types: list[str], n_queries: int = 200, k: int = 4,
+                  dimension: int = 256, n_analyses: int = 20, excel_path: str = "Base.xlsx",
+                  storage_format: str = "pickle") -> list[dict]:
+    """Executa todas as combinações de tamanho de corpus e tipo de índice."""
+    embeddings = HashingEmbeddings(dimension)
+    seed_rows = load_seed_rows(excel_path)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            corpus = make_synthetic_corpus(seed_rows, size)
+            queries = make_queries(corpus, n_queries)
+            for index_type in index_types:
+                result = run_case(corpus, queries, embeddings, IndexConfig(index_type=index_type),
+                                  k, n_analyses, work_dir, storage_format)
+                print(json.dumps(result, ensure_ascii=False))
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline da recuperação de processos.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--analyses", type=int, default=20, help="Análises completas com o modelo simulado")
+    parser.add_argument("--excel-path", default="Base.xlsx")
+    parser.add_argument("--storage-format", choices=STORAGE_FORMATS, default="pickle")
+    parser.add_argument("--output", help="Arquivo JSON para salvar os resultados")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(args.sizes, args.index_types, args.queries, args.k,
+                            args.dimension, args.analyses, args.excel_path, args.storage_format)
+    print(pd.DataFrame(results).to_string(index=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,127 @@
+"""
+Benchmark da inicialização: tempo de import dos módulos e primeira renderização do app.
+
+Cada medição roda em um interpretador novo (import a frio). A primeira renderização e
+a re-execução do app são medidas com o AppTest do Streamlit, sem navegador e sem o
+pré-carregamento do analisador. Com os limites --max-*, o script termina com código 1
+quando algum é excedido ou quando o import ou a renderização carregam módulos pesados
+(LangChain, OpenAI, FAISS), servindo de guarda contra regressões.
+
+Exemplo:
+    python benchmark_startup.py --repeat 5 --max-import-seconds 1.5 --max-first-paint-seconds 3
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Módulos que não devem ser carregados só para desenhar a página
+HEAVY_MODULES = ("langchain_openai", "langchain_community", "langchain.chains", "openai", "faiss")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+_APP_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout=120)
+start = time.perf_counter()
+app.run()
+first_paint = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - start
+print(json.dumps({{
+    "first_paint_seconds": first_paint,
+    "rerun_seconds": rerun,
+    "exceptions": [str(exception.value) for exception in app.exception],
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def _run_python(script: str, cwd: str) -> dict:
+    env = {**os.environ, "ANALYZER_WARMUP": "0"}
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_import(module: str, repeat: int, cwd: str) -> dict:
+    """Mediana e máximo do tempo de import de module em interpretadores novos."""
+    runs = [_run_python(_IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES), cwd) for _ in range(repeat)]
+    samples = [run["seconds"] for run in runs]
+    return {
+        "case": f"import {module}",
+        "median_seconds": round(statistics.median(samples), 3),
+        "max_seconds": round(max(samples), 3),
+        "heavy_modules": runs[-1]["heavy_modules"],
+    }
+
+
+def measure_app(app_path: str, repeat: int, cwd: str) -> dict:
+    """Primeira renderização e re-execução do app em interpretadores novos."""
+    runs = [_run_python(_APP_SCRIPT.format(app_path=app_path, heavy=HEAVY_MODULES), cwd) for _ in range(repeat)]
+    return {
+        "case": f"render {app_path}",
+        "first_paint_seconds": round(statistics.median(run["first_paint_seconds"] for run in runs), 3),
+        "rerun_seconds": round(statistics.median(run["rerun_seconds"] for run in runs), 3),
+        "exceptions": runs[-1]["exceptions"],
+        "heavy_modules": runs[-1]["heavy_modules"],
+    }
+
+
+def check_budgets(results: list[dict], max_import_seconds: float = None,
+                  max_first_paint_seconds: float = None, max_rerun_seconds: float = None) -> list[str]:
+    """Lista as violações dos limites configurados (vazia se tudo passou)."""
+    failures = []
+    for result in results:
+        if max_import_seconds is not None and result.get("median_seconds", 0) > max_import_seconds:
+            failures.append(f"{result['case']}: {result['median_seconds']}s > {max_import_seconds}s")
+        if max_first_paint_seconds is not None and result.get("first_paint_seconds", 0) > max_first_paint_seconds:
+            failures.append(f"{result['case']}: primeira renderização {result['first_paint_seconds']}s > {max_first_paint_seconds}s")
+        if max_rerun_seconds is not None and result.get("rerun_seconds", 0) > max_rerun_seconds:
+            failures.append(f"{result['case']}: re-execução {result['rerun_seconds']}s > {max_rerun_seconds}s")
+        if result.get("heavy_modules"):
+            failures.append(f"{result['case']}: módulos pesados importados: {', '.join(result['heavy_modules'])}")
+        if result.get("exceptions"):
+            failures.append(f"{result['case']}: exceções: {'; '.join(result['exceptions'])}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de import e primeira renderização do app.")
+    parser.add_argument("--modules", nargs="+", default=["process_analyser"])
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--no-app", action="store_true", help="Mede apenas os imports")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-import-seconds", type=float)
+    parser.add_argument("--max-first-paint-seconds", type=float)
+    parser.add_argument("--max-rerun-seconds", type=float)
+    parser.add_argument("--output", help="Arquivo JSON para salvar os resultados")
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    results = [measure_import(module, args.repeat, cwd) for module in args.modules]
+    if not args.no_app:
+        results.append(measure_app(args.app, args.repeat, cwd))
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failures = check_budgets(results, args.max_import_seconds, args.max_first_paint_seconds, args.max_rerun_seconds)
+    for failure in failures:
+        print(f"FALHA: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,143 @@
+import re
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+
+from token_utils import DEFAULT_ENCODING, count_tokens, count_tokens_batch, truncate_to_tokens
+
+TRANSCRIPT_FIELD = "transcrição"
+OMISSION_MARKER = "[...]"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(text: str, chunk_tokens: int = 300, encoding_name: str = DEFAULT_ENCODING) -> list[str]:
+    """
+    Divide text em trechos de até chunk_tokens tokens, respeitando linhas e frases;
+    uma frase maior que o limite é cortada.
+    """
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            units.extend(sentence for sentence in _SENTENCE_END.split(line) if sentence)
+    if not units:
+        return []
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit, tokens in zip(units, count_tokens_batch(units, encoding_name)):
+        if tokens > chunk_tokens:
+            unit = truncate_to_tokens(unit, chunk_tokens, encoding_name)
+            tokens = chunk_tokens
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class ContextBuilder:
+    """
+    Monta o contexto do prompt dentro de orçamentos fixos de tokens: campos do
+    formulário, trechos da transcrição mais relevantes para esses campos e documentos
+    recuperados do catálogo em ordem de relevância.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        field_token_budget: int = 1000,
+        transcript_token_budget: int = 1500,
+        document_token_budget: int = 3000,
+        chunk_tokens: int = 300,
+        encoding_name: str = DEFAULT_ENCODING,
+    ):
+        """
+        Inicializa o ContextBuilder.
+
+        Args:
+            embeddings: Modelo de embeddings usado para ordenar os trechos da transcrição.
+            field_token_budget (int): Limite de tokens dos campos do formulário.
+            transcript_token_budget (int): Limite de tokens dos trechos da transcrição.
+            document_token_budget (int): Limite de tokens dos documentos recuperados.
+            chunk_tokens (int): Tamanho máximo de cada trecho da transcrição.
+            encoding_name (str): Codificação tiktoken usada na contagem.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.embeddings = embeddings
+        self.field_token_budget = field_token_budget
+        self.transcript_token_budget = transcript_token_budget
+        self.document_token_budget = document_token_budget
+        self.chunk_tokens = chunk_tokens
+        self.encoding_name = encoding_name
+
+    def select_transcript(self, transcript: str, query: str) -> str:
+        """
+        Retorna a transcrição inteira se couber no orçamento; senão, os trechos mais
+        similares a query (campos do formulário) até preencher o orçamento, na ordem
+        original e separados por OMISSION_MARKER.
+        """
+        transcript = (transcript or "").strip()
+        if not transcript:
+            return ""
+        if count_tokens(transcript, self.encoding_name) <= self.transcript_token_budget:
+            return transcript
+
+        chunks = chunk_text(transcript, self.chunk_tokens, self.encoding_name)
+        chunk_vectors = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norms = np.linalg.norm(chunk_vectors, axis=1) * np.linalg.norm(query_vector)
+        similarities = chunk_vectors @ query_vector / np.where(norms == 0, 1, norms)
+
+        selected = []
+        used = 0
+        for position, tokens in sorted(
+            zip(range(len(chunks)), count_tokens_batch(chunks, self.encoding_name)),
+            key=lambda item: -similarities[item[0]],
+        ):
+            if used + tokens > self.transcript_token_budget:
+                continue
+            selected.append(position)
+            used += tokens
+        self.logger.info(
+            f"Transcrição reduzida a {len(selected)} de {len(chunks)} trechos ({used} tokens)."
+        )
+        return f" {OMISSION_MARKER} ".join(chunks[position] for position in sorted(selected))
+
+    def build_process_text(self, process_data: list[dict]) -> str:
+        """Texto do processo para o prompt: "campo: valor" por linha e trechos da transcrição."""
+        blocks = []
+        for row in process_data:
+            fields = "\n".join(
+                f"{field}: {value}" for field, value in row.items()
+                if field != TRANSCRIPT_FIELD and value is not None and str(value).strip()
+            )
+            fields = truncate_to_tokens(fields, self.field_token_budget, self.encoding_name)
+            transcript = self.select_transcript(row.get(TRANSCRIPT_FIELD), fields)
+            blocks.append(f"{fields}\n{TRANSCRIPT_FIELD}: {transcript}" if transcript else fields)
+        return "\n\n".join(blocks)
+
+    def fit_documents(self, documents: list[Document]) -> list[Document]:
+        """
+        Mantém os documentos recuperados, em ordem de relevância, enquanto couberem no
+        orçamento; o primeiro é sempre mantido (cortado, se necessário).
+        """
+        fitted = []
+        used = 0
+        for document, tokens in zip(
+            documents, count_tokens_batch([document.page_content for document in documents], self.encoding_name)
+        ):
+            if used + tokens > self.document_token_budget:
+                if not fitted:
+                    content = truncate_to_tokens(document.page_content, self.document_token_budget, self.encoding_name)
+                    fitted.append(Document(id=document.id, page_content=content, metadata=document.metadata))
+                continue
+            fitted.append(document)
+            used += tokens
+        return fitted
@@ -1,17 +1,39 @@
+import numpy as np
 import pandas as pd
 import os
+import json
+import hashlib
+import argparse
 from dotenv import load_dotenv
 from langchain_community.document_loaders import DataFrameLoader
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 import logging
+from embedding_pipeline import BatchEmbeddingPipeline
+from embedding_cache import DEFAULT_CACHE_PATH, CachedEmbeddings, get_embedding_cache
+from faiss_index import INDEX_TYPES, IndexConfig, build_index, stored_labels
+from excel_loader import ExcelTableCache
+from metadata_index import MetadataIndex
+from lexical_index import BM25Index
+from suggestion_index import SuggestionIndex
+from sharded_store import write_shards_manifest
+from text_utils import normalize_text
+from safe_index_store import STORAGE_FORMATS, detect_storage_format, load_vectorstore, save_vectorstore
+from index_versions import MANIFEST_FILE, new_version_dir, publish_version, resolve_index_dir
+
+MANIFEST_VERSION = 1
 
 class ProcessEmbeddingsCreator:
     """
     Classe responsável por criar e salvar embeddings de processos usando FAISS.
     """
     
-    def __init__(self, excel_path: str, faiss_index_path: str = "process_index.faiss", api_key: str = None):
+    def __init__(self, excel_path: str, faiss_index_path: str = "process_index.faiss", api_key: str = None,
+                 incremental: bool = False, max_batch_tokens: int = 8000, max_concurrency: int = 4,
+                 checkpoint_dir: str = None, embedding_cache_path: str = DEFAULT_CACHE_PATH,
+                 index_config: IndexConfig = None, excel_cache_dir: str = None,
+                 storage_format: str = "pickle", dataframe: pd.DataFrame = None):
         """
         Inicializa o ProcessEmbeddingsCreator.
 
@@ -19,15 +41,49 @@ class ProcessEmbeddingsCreator:
             excel_path (str): Caminho para o arquivo Excel.
             faiss_index_path (str): Caminho para salvar o índice FAISS.
             api_key (str, optional): Chave da API OpenAI.
+            incremental (bool): Se True, reaproveita o índice existente e gera embeddings
+                apenas para as linhas novas ou alteradas.
+            max_batch_tokens (int): Limite de tokens por requisição de embeddings.
+            max_concurrency (int): Número máximo de requisições de embeddings simultâneas.
+            checkpoint_dir (str, optional): Diretório de checkpoints dos lotes concluídos.
+                Padrão: "<faiss_index_path>.checkpoints".
+            embedding_cache_path (str, optional): Cache SQLite de embeddings compartilhado com
+                o ProcessAnalyzer. None desativa o cache.
+            index_config (IndexConfig, optional): Tipo e parâmetros do índice FAISS
+                (flat, ivf, hnsw ou ivfpq). Padrão: flat (busca exata).
+            excel_cache_dir (str, optional): Diretório do cache Parquet da planilha.
+                Padrão: "<excel_path>.cache".
+            storage_format (str): "pickle" (save_local do LangChain, com index.pkl) ou "safe"
+                (index.faiss + docstore.sqlite, carregado sem pickle e sob demanda).
+            dataframe (pd.DataFrame, optional): Linhas já carregadas (com combined_text) a
+                indexar no lugar da planilha inteira, ex.: uma partição do catálogo.
         """
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         self.excel_path = excel_path
         self.faiss_index_path = faiss_index_path
+        self.index_config = index_config or IndexConfig()
+        self.excel_cache_dir = excel_cache_dir
+        self.dataframe = dataframe
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Formato de armazenamento inválido: {storage_format}. Use um de {STORAGE_FORMATS}.")
+        self.storage_format = storage_format
         
         self._setup_api_key(api_key)
         self.df = self._load_excel_data()
-        self.vectorstore = self._create_vectorstore()
+        self.doc_ids = self._compute_doc_ids()
+        self.embedding_cache_path = embedding_cache_path
+        self.embeddings = self._initialize_embeddings()
+        self.pipeline = BatchEmbeddingPipeline(
+            self.embeddings,
+            max_batch_tokens=max_batch_tokens,
+            max_concurrency=max_concurrency,
+            checkpoint_dir=checkpoint_dir or f"{faiss_index_path}.checkpoints",
+        )
+        if incremental:
+            self.vectorstore = self._update_vectorstore()
+        else:
+            self.vectorstore = self._create_vectorstore()
 
     def _setup_api_key(self, api_key: str = None) -> None:
         """Configura a chave da API OpenAI."""
@@ -38,46 +94,193 @@ class ProcessEmbeddingsCreator:
             if not os.getenv("OPENAI_API_KEY"):
                 raise ValueError("Chave da API OpenAI não encontrada. Forneça-a ou configure no arquivo .env.")
 
+    def _initialize_embeddings(self):
+        """Cria o modelo de embeddings, consultando o cache persistente quando configurado."""
+        embeddings = OpenAIEmbeddings()
+        if self.embedding_cache_path:
+            return CachedEmbeddings(embeddings, get_embedding_cache(self.embedding_cache_path))
+        return embeddings
+
     def _load_excel_data(self) -> pd.DataFrame:
-        """Carrega e pré-processa os dados do Excel."""
+        """
+        Carrega os dados do Excel a partir do cache colunar, convertendo a planilha
+        apenas quando ela tiver mudado.
+        """
+        if self.dataframe is not None:
+            return self.dataframe.reset_index(drop=True)
         try:
-            df = pd.read_excel(self.excel_path, sheet_name='Vfinal', skiprows=3)
-            df = df.loc[:, ~df.columns.str.contains('Unnamed:')]
-
-            columns = [
-                'SEGMENTO DE MERCADO', 'GANHOS/OBJETIVO', 'PROCESSO',
-                'ATIVIDADE RELACIONADA', 'CAUSA', 'Pessoas / Organização',
-                'DESCONEXÕES (GAP)', 'MELHORIA/SOLUÇÃO'
-            ]
-
-            new_names = [
-                'ramo_empresa', 'direcionadores', 'nome_processo',
-                'atividade', 'causa', 'operaciona_atividade',
-                'solucao_gap', 'melhoria'
-            ]
-
-            df = df[columns]
-            df.columns = new_names
-            df['combined_text'] = df.apply(lambda row: ' '.join(f"{col}: {row[col]}" for col in new_names), axis=1)
-            
-            return df
+            return ExcelTableCache(self.excel_path, self.excel_cache_dir).load()
         except Exception as e:
             self.logger.error(f"Erro ao carregar arquivo Excel: {str(e)}")
             raise
 
-    def _create_vectorstore(self) -> FAISS:
-        """Cria e inicializa o FAISS vector store."""
+    def _compute_doc_ids(self) -> list[str]:
+        """
+        Gera um id estável por linha a partir do hash do combined_text.
+
+        Linhas idênticas recebem um sufixo de ocorrência para continuarem distintas.
+        """
+        doc_ids = []
+        occurrences = {}
+        for text in self.df['combined_text']:
+            content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            count = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = count + 1
+            doc_ids.append(content_hash if count == 0 else f"{content_hash}-{count}")
+        return doc_ids
+
+    def _load_documents(self) -> list:
+        """Converte o DataFrame em documentos LangChain."""
         loader = DataFrameLoader(self.df, page_content_column='combined_text')
-        documents = loader.load()
-        embeddings = OpenAIEmbeddings()
-        return FAISS.from_documents(documents, embeddings)
+        return loader.load()
+
+    def _embed_documents(self, documents: list):
+        """Gera os embeddings em lotes concorrentes e retorna a matriz (n, d)."""
+        return self.pipeline.embed([document.page_content for document in documents])
+
+    def _create_vectorstore(self) -> FAISS:
+        """Cria e inicializa o FAISS vector store com o tipo de índice configurado."""
+        documents = self._load_documents()
+        index, self.index_config = build_index(self._embed_documents(documents), self.index_config)
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(self.doc_ids, documents))),
+            index_to_docstore_id=dict(enumerate(self.doc_ids)),
+        )
+
+    def _load_manifest(self) -> dict | None:
+        """Lê o manifesto salvo junto ao índice, se existir."""
+        if not os.path.exists(self.faiss_index_path):
+            return None
+        manifest_path = os.path.join(resolve_index_dir(self.faiss_index_path), MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def _update_vectorstore(self) -> FAISS:
+        """
+        Atualiza o índice existente gerando embeddings apenas para as linhas novas ou
+        alteradas e removendo as linhas excluídas da planilha.
+
+        Sem manifesto compatível (ou com outro modelo de embeddings), recria o índice do zero.
+        """
+        manifest = self._load_manifest()
+        if manifest is None or manifest.get("embedding_model") != self.embeddings.model:
+            self.logger.info("Manifesto ausente ou incompatível; recriando o índice completo.")
+            return self._create_vectorstore()
+
+        index_dir = resolve_index_dir(self.faiss_index_path)
+        saved_config = IndexConfig.load(index_dir) or IndexConfig()
+        if saved_config.index_type != self.index_config.index_type or not saved_config.supports_removal:
+            self.logger.info(
+                f"Índice {saved_config.index_type} não pode ser atualizado para "
+                f"{self.index_config.index_type}; recriando o índice completo."
+            )
+            return self._create_vectorstore()
+        self.index_config = saved_config
+
+        if detect_storage_format(index_dir) == "safe":
+            vectorstore = load_vectorstore(index_dir, self.embeddings, lazy=False, mmap=False)
+        else:
+            vectorstore = FAISS.load_local(
+                index_dir,
+                self.embeddings,
+                allow_dangerous_deserialization=True
+            )
+        previous_ids = set(manifest["ids"])
+        current_ids = set(self.doc_ids)
+
+        removed_ids = [doc_id for doc_id in manifest["ids"] if doc_id not in current_ids]
+        if removed_ids:
+            vectorstore.delete(removed_ids)
+
+        documents = self._load_documents()
+        new_documents = []
+        new_ids = []
+        for doc_id, document in zip(self.doc_ids, documents):
+            if doc_id not in previous_ids:
+                new_documents.append(document)
+                new_ids.append(doc_id)
+        if new_documents:
+            texts = [document.page_content for document in new_documents]
+            vectorstore.add_embeddings(
+                zip(texts, self._embed_documents(new_documents).tolist()),
+                metadatas=[document.metadata for document in new_documents],
+                ids=new_ids,
+            )
+
+        problem = self._alignment_problem(vectorstore)
+        if problem:
+            self.logger.warning(f"Índice desalinhado após a atualização incremental ({problem}); recriando o índice completo.")
+            return self._create_vectorstore()
+
+        self.logger.info(
+            f"Atualização incremental: {len(new_ids)} linhas adicionadas, "
+            f"{len(removed_ids)} removidas, {len(current_ids) - len(new_ids)} reaproveitadas."
+        )
+        return vectorstore
+
+    def _alignment_problem(self, vectorstore: FAISS) -> str | None:
+        """
+        Verifica se os rótulos do FAISS continuam iguais às posições do docstore: posições
+        contíguas de 0 a ntotal - 1, uma por documento, cobrindo exatamente as linhas atuais.
+        Retorna a descrição do problema ou None.
+        """
+        ntotal = vectorstore.index.ntotal
+        mapping = vectorstore.index_to_docstore_id
+        if ntotal != len(mapping):
+            return f"{ntotal} vetores e {len(mapping)} documentos"
+        if set(mapping) != set(range(ntotal)):
+            return "posições não contíguas"
+        labels = stored_labels(vectorstore.index)
+        if labels is not None and not np.array_equal(np.sort(labels), np.arange(ntotal)):
+            return "rótulos do índice IVF diferentes das posições"
+        if sorted(mapping.values()) != sorted(self.doc_ids):
+            return "documentos diferentes das linhas da planilha"
+        return None
 
     def save_embeddings(self):
-        """Salva o índice FAISS em um arquivo."""
-        self.vectorstore.save_local(self.faiss_index_path)
+        """
+        Salva o índice FAISS, os índices auxiliares e o manifesto de linhas em disco.
+
+        Todos os arquivos são gravados em uma nova versão (versions/<nome>) e publicados
+        juntos pela troca atômica de CURRENT, de modo que um analisador que recarregue o
+        índice durante a gravação nunca combina arquivos de versões diferentes.
+        """
+        version_dir = new_version_dir(self.faiss_index_path)
+        if self.storage_format == "safe":
+            save_vectorstore(self.vectorstore, version_dir)
+        else:
+            self.vectorstore.save_local(version_dir)
+        self.index_config.metadata["ntotal"] = int(self.vectorstore.index.ntotal)
+        self.index_config.save(version_dir)
+        MetadataIndex.from_vectorstore(self.vectorstore).save(version_dir)
+        BM25Index.from_vectorstore(self.vectorstore).save(version_dir)
+        # Sugestões curadas por segmento e processo, para o modo rápido do analisador
+        suggestion_index = SuggestionIndex.from_vectorstore(self.vectorstore, self.index_config)
+        suggestion_index.save(version_dir)
+        self.logger.info(f"Índice de sugestões: {len(suggestion_index.clusters)} grupos de segmento e processo.")
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embeddings.model,
+            "ids": self.doc_ids,
+        }
+        with open(os.path.join(version_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        publish_version(self.faiss_index_path, version_dir)
+        self.pipeline.clear_checkpoints()
+        if isinstance(self.embeddings, CachedEmbeddings):
+            self.logger.info(f"Cache de embeddings: {self.embeddings.cache.stats()}")
         self.logger.info(f"Índice FAISS salvo em {self.faiss_index_path}")
 
-def create_and_save_embeddings(excel_path: str, faiss_index_path: str = "process_index.faiss", api_key: str = None):
+def create_and_save_embeddings(excel_path: str, faiss_index_path: str = "process_index.faiss", api_key: str = None,
+                               incremental: bool = False, max_batch_tokens: int = 8000, max_concurrency: int = 4,
+                               index_config: IndexConfig = None, storage_format: str = "pickle"):
     """
     Função auxiliar para criar e salvar embeddings de forma simplificada.
     
@@ -85,11 +288,123 @@ def create_and_save_embeddings(excel_path: str, faiss_index_path: str = "process
         excel_path (str): Caminho para o arquivo Excel.
         faiss_index_path (str): Caminho para salvar o índice FAISS.
         api_key (str, optional): Chave da API OpenAI.
+        incremental (bool): Gera embeddings apenas para as linhas novas ou alteradas.
+        max_batch_tokens (int): Limite de tokens por requisição de embeddings.
+        max_concurrency (int): Número máximo de requisições de embeddings simultâneas.
+        index_config (IndexConfig, optional): Tipo e parâmetros do índice FAISS.
+        storage_format (str): "pickle" ou "safe" (FAISS + SQLite, sem pickle).
     """
-    creator = ProcessEmbeddingsCreator(excel_path, faiss_index_path, api_key)
+    creator = ProcessEmbeddingsCreator(
+        excel_path, faiss_index_path, api_key,
+        incremental=incremental,
+        max_batch_tokens=max_batch_tokens,
+        max_concurrency=max_concurrency,
+        index_config=index_config,
+        storage_format=storage_format,
+    )
     creator.save_embeddings()
-    
-create_and_save_embeddings(
-    excel_path="Base.xlsx",
-    faiss_index_path="process_index.faiss",
-)
\ No newline at end of file
+
+
+def create_sharded_embeddings(excel_path: str, shards_dir: str, partition_by: str = "ramo_empresa",
+                              api_key: str = None, incremental: bool = False, max_batch_tokens: int = 8000,
+                              max_concurrency: int = 4, index_config: IndexConfig = None,
+                              storage_format: str = "safe", excel_cache_dir: str = None) -> dict:
+    """
+    Cria um índice por valor de partition_by (um shard por ramo, cliente...) a partir de
+    uma única planilha, mais o shards.json lido pelo ShardedVectorStore.
+
+    Args:
+        excel_path (str): Caminho para o arquivo Excel.
+        shards_dir (str): Diretório raiz dos shards (um subdiretório por partição).
+        partition_by (str): Coluna usada para particionar as linhas.
+        api_key (str, optional): Chave da API OpenAI.
+        incremental (bool): Gera embeddings apenas para as linhas novas ou alteradas de cada shard.
+        max_batch_tokens (int): Limite de tokens por requisição de embeddings.
+        max_concurrency (int): Número máximo de requisições de embeddings simultâneas.
+        index_config (IndexConfig, optional): Tipo e parâmetros do índice de cada shard.
+        storage_format (str): "safe" (padrão; mapeado em memória na consulta) ou "pickle".
+        excel_cache_dir (str, optional): Diretório do cache Parquet da planilha.
+
+    Returns:
+        dict: nome do shard -> {"value": valor da partição, "rows": número de linhas}.
+    """
+    logger = logging.getLogger(__name__)
+    df = ExcelTableCache(excel_path, excel_cache_dir).load()
+    if partition_by not in df.columns:
+        raise ValueError(f"Coluna de partição inexistente: {partition_by}")
+
+    values = df[partition_by].fillna("").astype(str).str.strip()
+    shards = {}
+    for value, rows in df.groupby(values, sort=True):
+        name = normalize_text(value).replace(" ", "_") or f"sem_{normalize_text(partition_by).replace(' ', '_')}"
+        if name in shards:
+            raise ValueError(f"Valores de {partition_by} colidem no shard {name}: {shards[name]['value']!r} e {value!r}")
+        logger.info(f"Shard {name} ({partition_by}={value!r}): {len(rows)} linhas.")
+        creator = ProcessEmbeddingsCreator(
+            excel_path, os.path.join(shards_dir, name), api_key,
+            incremental=incremental,
+            max_batch_tokens=max_batch_tokens,
+            max_concurrency=max_concurrency,
+            index_config=index_config,
+            storage_format=storage_format,
+            dataframe=rows,
+        )
+        creator.save_embeddings()
+        shards[name] = {"value": value, "rows": len(rows)}
+
+    write_shards_manifest(shards_dir, shards, partition_by)
+    logger.info(f"{len(shards)} shards salvos em {shards_dir}")
+    return shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cria o índice FAISS a partir da planilha de processos.")
+    parser.add_argument("--excel-path", default="Base.xlsx")
+    parser.add_argument("--faiss-index-path", default="process_index.faiss")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reaproveita o índice existente e processa apenas as linhas alteradas.")
+    parser.add_argument("--max-batch-tokens", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, default=1024, help="Listas invertidas (ivf, ivfpq)")
+    parser.add_argument("--nprobe", type=int, default=16, help="Listas visitadas por consulta (ivf, ivfpq)")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="Vizinhos por nó (hnsw)")
+    parser.add_argument("--ef-search", type=int, default=64, help="Candidatos por consulta (hnsw)")
+    parser.add_argument("--pq-m", type=int, default=16, help="Subvetores da quantização (ivfpq)")
+    parser.add_argument("--storage-format", choices=STORAGE_FORMATS, default="pickle",
+                        help="safe: index.faiss + docstore.sqlite, carregado sem pickle")
+    parser.add_argument("--partition-by", default=None,
+                        help="Cria um shard por valor da coluna (ex.: ramo_empresa) em --shards-dir")
+    parser.add_argument("--shards-dir", default="process_shards",
+                        help="Diretório raiz dos shards (com --partition-by)")
+    args = parser.parse_args()
+
+    index_config = IndexConfig(
+        index_type=args.index_type,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        hnsw_m=args.hnsw_m,
+        ef_search=args.ef_search,
+        pq_m=args.pq_m,
+    )
+    if args.partition_by:
+        create_sharded_embeddings(
+            excel_path=args.excel_path,
+            shards_dir=args.shards_dir,
+            partition_by=args.partition_by,
+            incremental=args.incremental,
+            max_batch_tokens=args.max_batch_tokens,
+            max_concurrency=args.max_concurrency,
+            index_config=index_config,
+            storage_format=args.storage_format,
+        )
+    else:
+        create_and_save_embeddings(
+            excel_path=args.excel_path,
+            faiss_index_path=args.faiss_index_path,
+            incremental=args.incremental,
+            max_batch_tokens=args.max_batch_tokens,
+            max_concurrency=args.max_concurrency,
+            index_config=index_config,
+            storage_format=args.storage_format,
+        )
\ No newline at end of file
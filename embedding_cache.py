@@ -0,0 +1,194 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = "embedding_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 200_000
+
+_CACHE_REGISTRY = {}
+_CACHE_REGISTRY_LOCK = threading.Lock()
+
+
+def text_hash(text: str) -> str:
+    """Hash de conteúdo usado como chave do cache."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache persistente de embeddings em SQLite, endereçado por (modelo, hash do texto).
+
+    Mantém no máximo max_entries vetores, descartando os acessados há mais tempo (LRU).
+    Pode ser compartilhado entre threads e entre processos (modo WAL).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Inicializa o EmbeddingCache.
+
+        Args:
+            path (str): Caminho do arquivo SQLite.
+            max_entries (int): Número máximo de vetores mantidos em disco.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: list[str]) -> list[np.ndarray | None]:
+        """Retorna o vetor em cache de cada texto, ou None quando ausente."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                self._conn.commit()
+            results = [
+                np.frombuffer(found[h], dtype=np.float32) if h in found else None
+                for h in hashes
+            ]
+            n_hits = sum(1 for vector in results if vector is not None)
+            self.hits += n_hits
+            self.misses += len(results) - n_hits
+        return results
+
+    def put_many(self, model: str, texts: list[str], vectors: list) -> None:
+        """Armazena os vetores e aplica a política de descarte LRU."""
+        now = time.time()
+        rows = [
+            (model, text_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Remove os vetores menos recentemente usados acima do limite de entradas."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,),
+            )
+            self.logger.info(f"Cache de embeddings: {excess} entradas descartadas (LRU).")
+
+    def stats(self) -> dict:
+        """Contadores de acertos/falhas e tamanho atual do cache."""
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": count,
+                "max_entries": self.max_entries,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def get_embedding_cache(path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES) -> EmbeddingCache:
+    """Retorna a instância de EmbeddingCache compartilhada pelo processo para o caminho dado."""
+    key = os.path.abspath(path)
+    with _CACHE_REGISTRY_LOCK:
+        cache = _CACHE_REGISTRY.get(key)
+        if cache is None:
+            cache = _CACHE_REGISTRY[key] = EmbeddingCache(path, max_entries)
+        return cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envolve um modelo de embeddings consultando o EmbeddingCache antes de chamar a API.
+
+    Apenas textos ausentes do cache (e sem repetição) são enviados ao modelo.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.dimensions = getattr(embeddings, "dimensions", None)
+
+    def _split_misses(self, texts: list[str]) -> tuple[list, list[str]]:
+        cached = self.cache.get_many(self.model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        return cached, missing
+
+    def _merge(self, texts: list[str], cached: list, missing: list[str], computed: list) -> list[list[float]]:
+        if missing:
+            self.cache.put_many(self.model, missing, computed)
+        computed_by_text = dict(zip(missing, computed))
+        return [
+            vector.tolist() if vector is not None else list(computed_by_text[text])
+            for text, vector in zip(texts, cached)
+        ]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        cached, missing = self._split_misses(texts)
+        computed = self.embeddings.embed_documents(missing) if missing else []
+        return self._merge(texts, cached, missing, computed)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        cached, missing = self._split_misses(texts)
+        computed = await self.embeddings.aembed_documents(missing) if missing else []
+        return self._merge(texts, cached, missing, computed)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,195 @@
+import os
+import asyncio
+import hashlib
+import logging
+import shutil
+from typing import AsyncIterator
+
+import numpy as np
+import openai
+from langchain_core.embeddings import Embeddings
+from tenacity import (
+    AsyncRetrying,
+    before_sleep_log,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from token_utils import DEFAULT_ENCODING, count_tokens_batch
+
+# Erros transitórios da API que justificam nova tentativa (429, timeouts, quedas de conexão)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class BatchEmbeddingPipeline:
+    """
+    Gera embeddings em lotes dimensionados por número de tokens, executados de forma
+    concorrente com asyncio e com checkpoint em disco de cada lote concluído.
+
+    Os lotes são determinísticos para a mesma lista de textos, de modo que uma construção
+    interrompida retoma a partir dos lotes que ainda não foram salvos.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 256,
+        max_concurrency: int = 4,
+        max_attempts: int = 6,
+        checkpoint_dir: str = None,
+        encoding_name: str = DEFAULT_ENCODING,
+    ):
+        """
+        Inicializa o BatchEmbeddingPipeline.
+
+        Args:
+            embeddings (Embeddings): Modelo de embeddings (ex.: OpenAIEmbeddings).
+            max_batch_tokens (int): Limite de tokens somados por requisição.
+            max_batch_size (int): Limite de textos por requisição.
+            max_concurrency (int): Número máximo de requisições simultâneas.
+            max_attempts (int): Tentativas por lote em caso de 429 ou erro transitório.
+            checkpoint_dir (str, optional): Diretório para salvar os lotes concluídos.
+            encoding_name (str): Codificação tiktoken usada para contar tokens.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.checkpoint_dir = checkpoint_dir
+        self.encoding_name = encoding_name
+        # Checkpoints de outro modelo ou dimensão não podem ser reaproveitados
+        self.model_signature = (
+            f"{getattr(embeddings, 'model', type(embeddings).__name__)}:"
+            f"{getattr(embeddings, 'dimensions', None)}"
+        )
+
+    def _count_tokens(self, texts: list[str]) -> list[int]:
+        """Conta os tokens de cada texto."""
+        return count_tokens_batch(texts, self.encoding_name)
+
+    def _make_batches(self, texts: list[str]) -> list[list[int]]:
+        """Agrupa os índices dos textos em lotes limitados por tokens e por quantidade."""
+        batches = []
+        current = []
+        current_tokens = 0
+        for index, n_tokens in enumerate(self._count_tokens(texts)):
+            if current and (
+                current_tokens + n_tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += n_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _batch_id(self, texts: list[str]) -> str:
+        """Identificador do lote (modelo, dimensão e textos), usado como nome do checkpoint."""
+        digest = hashlib.sha256(self.model_signature.encode("utf-8"))
+        for text in texts:
+            digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+        return digest.hexdigest()
+
+    def _checkpoint_path(self, batch_id: str) -> str | None:
+        if not self.checkpoint_dir:
+            return None
+        return os.path.join(self.checkpoint_dir, f"{batch_id}.npy")
+
+    def _load_checkpoint(self, batch_id: str) -> np.ndarray | None:
+        path = self._checkpoint_path(batch_id)
+        if path is None or not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def _save_checkpoint(self, batch_id: str, vectors: np.ndarray) -> None:
+        path = self._checkpoint_path(batch_id)
+        if path is None:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # Escrita atômica: um processo interrompido nunca deixa um checkpoint parcial
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp_path, path)
+
+    async def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        """Envia um lote à API, repetindo com backoff exponencial em erros transitórios."""
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            wait=wait_random_exponential(min=1, max=60),
+            stop=stop_after_attempt(self.max_attempts),
+            before_sleep=before_sleep_log(self.logger, logging.WARNING),
+            reraise=True,
+        ):
+            with attempt:
+                vectors = await self.embeddings.aembed_documents(texts)
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def aiter_batches(self, texts: list[str]) -> AsyncIterator[tuple[list[int], np.ndarray]]:
+        """
+        Produz (índices, vetores) de cada lote à medida que é concluído.
+
+        Lotes já salvos em checkpoint são devolvidos sem chamar a API.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batches = self._make_batches(texts)
+        pending = []
+        resumed = 0
+
+        async def run(indices: list[int], batch_id: str) -> tuple[list[int], np.ndarray]:
+            async with semaphore:
+                vectors = await self._embed_batch([texts[i] for i in indices])
+            self._save_checkpoint(batch_id, vectors)
+            return indices, vectors
+
+        for indices in batches:
+            batch_id = self._batch_id([texts[i] for i in indices])
+            vectors = self._load_checkpoint(batch_id)
+            if vectors is not None:
+                resumed += 1
+                yield indices, vectors
+            else:
+                pending.append(asyncio.ensure_future(run(indices, batch_id)))
+
+        self.logger.info(
+            f"Embeddings: {len(batches)} lotes, {resumed} retomados de checkpoint, "
+            f"{len(pending)} a processar."
+        )
+        try:
+            for future in asyncio.as_completed(pending):
+                yield await future
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        """Retorna a matriz (n, d) de embeddings na mesma ordem dos textos."""
+        result = None
+        async for indices, vectors in self.aiter_batches(texts):
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[indices] = vectors
+        if result is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return result
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Versão síncrona de aembed."""
+        return asyncio.run(self.aembed(list(texts)))
+
+    def clear_checkpoints(self) -> None:
+        """Remove os checkpoints após uma construção concluída com sucesso."""
+        if self.checkpoint_dir and os.path.isdir(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir)
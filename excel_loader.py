@@ -0,0 +1,212 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+SHEET_NAME = "Vfinal"
+HEADER_ROW = 4  # skiprows=3 no pd.read_excel original
+
+SOURCE_COLUMNS = [
+    'SEGMENTO DE MERCADO', 'GANHOS/OBJETIVO', 'PROCESSO',
+    'ATIVIDADE RELACIONADA', 'CAUSA', 'Pessoas / Organização',
+    'DESCONEXÕES (GAP)', 'MELHORIA/SOLUÇÃO'
+]
+
+COLUMN_NAMES = [
+    'ramo_empresa', 'direcionadores', 'nome_processo',
+    'atividade', 'causa', 'operaciona_atividade',
+    'solucao_gap', 'melhoria'
+]
+
+# Incrementar ao mudar a conversão das células: invalida os caches existentes
+CACHE_VERSION = 1
+DEFAULT_CHUNKSIZE = 10_000
+
+_SCHEMA = pa.schema([(name, pa.string()) for name in COLUMN_NAMES])
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cell_to_str(value) -> str | None:
+    """Converte a célula como o pd.read_excel faria (floats inteiros viram int)."""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            value = int(value)
+    return str(value)
+
+
+def iter_excel_chunks(excel_path: str, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """
+    Lê a aba Vfinal em modo streaming (openpyxl read_only), trazendo apenas as oito
+    colunas usadas, em DataFrames de até chunksize linhas com valores em texto.
+
+    Linhas totalmente vazias são descartadas, como no pd.read_excel.
+    """
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[SHEET_NAME].iter_rows(min_row=HEADER_ROW, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"Aba {SHEET_NAME} sem cabeçalho na linha {HEADER_ROW}: {excel_path}")
+        header = [str(name) if name is not None else None for name in header]
+        missing = [name for name in SOURCE_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"Colunas ausentes na aba {SHEET_NAME}: {', '.join(missing)}")
+        positions = [header.index(name) for name in SOURCE_COLUMNS]
+
+        chunk = {name: [] for name in COLUMN_NAMES}
+        size = 0
+        for row in rows:
+            if all(value is None or value == "" for value in row):
+                continue
+            for name, position in zip(COLUMN_NAMES, positions):
+                chunk[name].append(_cell_to_str(row[position]) if position < len(row) else None)
+            size += 1
+            if size >= chunksize:
+                yield pd.DataFrame(chunk, columns=COLUMN_NAMES)
+                chunk = {name: [] for name in COLUMN_NAMES}
+                size = 0
+        if size:
+            yield pd.DataFrame(chunk, columns=COLUMN_NAMES)
+    finally:
+        workbook.close()
+
+
+def build_combined_text(df: pd.DataFrame) -> pd.Series:
+    """
+    Monta o combined_text com operações vetorizadas.
+
+    Produz o mesmo texto do antigo apply linha a linha ("coluna: valor" separados por
+    espaço, com "nan" nas células vazias), preservando os ids derivados do seu hash.
+    """
+    combined = None
+    for name in COLUMN_NAMES:
+        part = f"{name}: " + df[name].astype(object).where(df[name].notna(), "nan").astype(str)
+        combined = part if combined is None else combined + " " + part
+    return combined
+
+
+class ExcelTableCache:
+    """
+    Cache colunar (Parquet) da aba Vfinal de uma planilha.
+
+    A conversão é feita uma única vez, em streaming, e reaproveitada enquanto o tamanho e
+    a data de modificação da planilha não mudarem; se mudarem, o sha256 do arquivo decide
+    se o conteúdo é de fato outro antes de reconverter.
+    """
+
+    def __init__(self, excel_path: str, cache_dir: str = None, chunksize: int = DEFAULT_CHUNKSIZE):
+        """
+        Inicializa o ExcelTableCache.
+
+        Args:
+            excel_path (str): Caminho da planilha.
+            cache_dir (str, optional): Diretório do cache. Padrão: "<excel_path>.cache".
+            chunksize (int): Linhas por bloco na conversão e na leitura em streaming.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.excel_path = excel_path
+        self.cache_dir = cache_dir or f"{excel_path}.cache"
+        self.chunksize = chunksize
+        self.parquet_path = os.path.join(self.cache_dir, f"{SHEET_NAME}.parquet")
+        self.meta_path = os.path.join(self.cache_dir, f"{SHEET_NAME}.json")
+
+    def _source_stat(self) -> dict:
+        stat = os.stat(self.excel_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _read_meta(self) -> dict | None:
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.parquet_path)):
+            return None
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return meta if meta.get("version") == CACHE_VERSION else None
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def is_valid(self) -> bool:
+        """Indica se o cache corresponde ao conteúdo atual da planilha."""
+        meta = self._read_meta()
+        if meta is None:
+            return False
+        stat = self._source_stat()
+        if meta["size"] == stat["size"] and meta["mtime_ns"] == stat["mtime_ns"]:
+            return True
+        # Arquivo tocado ou copiado: só reconverte se o conteúdo tiver mudado
+        if meta["size"] == stat["size"] and meta["sha256"] == _file_sha256(self.excel_path):
+            self._write_meta({**meta, **stat})
+            return True
+        return False
+
+    def refresh(self) -> None:
+        """Converte a planilha para Parquet, bloco a bloco, sem carregá-la inteira em memória."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stat = self._source_stat()
+        tmp_path = f"{self.parquet_path}.tmp"
+        rows = 0
+        with pq.ParquetWriter(tmp_path, _SCHEMA) as writer:
+            for chunk in iter_excel_chunks(self.excel_path, self.chunksize):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=_SCHEMA, preserve_index=False))
+                rows += len(chunk)
+        os.replace(tmp_path, self.parquet_path)
+        self._write_meta({
+            "version": CACHE_VERSION,
+            **stat,
+            "sha256": _file_sha256(self.excel_path),
+            "rows": rows,
+        })
+        self.logger.info(f"Planilha convertida para {self.parquet_path} ({rows} linhas).")
+
+    def ensure(self) -> None:
+        if not self.is_valid():
+            self.refresh()
+
+    def load(self) -> pd.DataFrame:
+        """Retorna as oito colunas e o combined_text de todas as linhas."""
+        self.ensure()
+        df = pq.read_table(self.parquet_path, columns=COLUMN_NAMES).to_pandas()
+        df['combined_text'] = build_combined_text(df)
+        return df
+
+    def iter_chunks(self, chunksize: int = None) -> Iterator[pd.DataFrame]:
+        """Lê o cache em blocos (com combined_text), para bases maiores que a memória."""
+        self.ensure()
+        parquet_file = pq.ParquetFile(self.parquet_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize or self.chunksize, columns=COLUMN_NAMES):
+            df = batch.to_pandas()
+            df['combined_text'] = build_combined_text(df)
+            yield df
+
+
+def load_process_table(excel_path: str, cache_dir: str = None) -> pd.DataFrame:
+    """
+    Função auxiliar: carrega a base de processos a partir do cache colunar.
+
+    Args:
+        excel_path (str): Caminho da planilha.
+        cache_dir (str, optional): Diretório do cache. Padrão: "<excel_path>.cache".
+    """
+    return ExcelTableCache(excel_path, cache_dir).load()
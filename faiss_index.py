@@ -0,0 +1,199 @@
+import os
+import json
+import math
+import logging
+from dataclasses import asdict, dataclass, field, fields
+
+import faiss
+import numpy as np
+
+INDEX_CONFIG_FILE = "index_config.json"
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# O FAISS recomenda ao menos ~39 pontos de treino por centróide
+_MIN_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexConfig:
+    """
+    Parâmetros do índice FAISS escolhidos na construção e respeitados na consulta.
+
+    index_type:
+        "flat"  - busca exata (força bruta), padrão do LangChain;
+        "ivf"   - IVF com nlist listas invertidas, nprobe listas visitadas por consulta;
+        "hnsw"  - grafo HNSW com M vizinhos e ef_search candidatos por consulta;
+        "ivfpq" - IVF com quantização por produto (pq_m subvetores de pq_nbits bits),
+                  para corpora grandes com memória limitada.
+    """
+
+    index_type: str = "flat"
+    nlist: int = 1024
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+    train_sample_size: int = 100_000
+    metadata: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Tipo de índice inválido: {self.index_type}. Use um de {INDEX_TYPES}.")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndexConfig":
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        with open(os.path.join(index_dir, INDEX_CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "IndexConfig | None":
+        """Lê a configuração salva junto ao índice; None para índices antigos (flat)."""
+        path = os.path.join(index_dir, INDEX_CONFIG_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @property
+    def supports_removal(self) -> bool:
+        """
+        Apenas o índice flat renumera as posições no remove_ids, como o LangChain faz com
+        index_to_docstore_id. O HNSW não suporta remoção e os IVF mantêm os rótulos
+        antigos, desalinhando índice e docstore; nesses casos, a atualização recria o índice.
+        """
+        return self.index_type == "flat"
+
+
+def _resolve_nlist(config: IndexConfig, n_vectors: int) -> int:
+    return max(1, min(config.nlist, n_vectors // _MIN_POINTS_PER_CENTROID))
+
+
+def _resolve_pq(config: IndexConfig, dimension: int, n_vectors: int) -> tuple[int, int]:
+    # O número de subvetores precisa dividir a dimensão
+    pq_m = max(m for m in range(1, min(config.pq_m, dimension) + 1) if dimension % m == 0)
+    # Cada subquantizador treina 2^nbits centróides; limita ao tamanho da amostra
+    pq_nbits = max(1, min(config.pq_nbits, int(math.log2(max(2, n_vectors)))))
+    return pq_m, pq_nbits
+
+
+def _training_sample(vectors: np.ndarray, sample_size: int, seed: int) -> np.ndarray:
+    if len(vectors) <= sample_size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+
+
+def build_index(vectors: np.ndarray, config: IndexConfig, seed: int = 0) -> tuple[faiss.Index, IndexConfig]:
+    """
+    Constrói e popula o índice FAISS descrito por config.
+
+    Os índices IVF são treinados em uma amostra de até train_sample_size vetores. Parâmetros
+    incompatíveis com o tamanho do corpus (nlist, pq_m, pq_nbits) são ajustados, e a
+    configuração efetivamente usada é retornada para ser salva com o índice.
+
+    Returns:
+        tuple[faiss.Index, IndexConfig]: Índice populado e configuração resolvida.
+    """
+    logger = logging.getLogger(__name__)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dimension = vectors.shape
+    resolved = IndexConfig.from_dict(config.to_dict())
+
+    if config.index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif config.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        resolved.nlist = _resolve_nlist(config, n_vectors)
+        if config.index_type == "ivf":
+            factory = f"IVF{resolved.nlist},Flat"
+        else:
+            resolved.pq_m, resolved.pq_nbits = _resolve_pq(config, dimension, n_vectors)
+            # "np" desativa o treino polissêmico, lento e desnecessário para a busca por IVF
+            factory = f"IVF{resolved.nlist},PQ{resolved.pq_m}x{resolved.pq_nbits}np"
+        index = faiss.index_factory(dimension, factory)
+        sample = _training_sample(vectors, config.train_sample_size, seed)
+        logger.info(f"Treinando índice {factory} com {len(sample)} vetores.")
+        index.train(sample)
+
+    if (resolved.nlist, resolved.pq_m, resolved.pq_nbits) != (config.nlist, config.pq_m, config.pq_nbits):
+        logger.info(
+            f"Parâmetros ajustados ao corpus: nlist={resolved.nlist}, "
+            f"pq_m={resolved.pq_m}, pq_nbits={resolved.pq_nbits}"
+        )
+
+    index.add(vectors)
+    apply_search_params(index, resolved)
+    resolved.metadata = {**config.metadata, "dimension": dimension, "ntotal": int(index.ntotal)}
+    return index, resolved
+
+
+def apply_search_params(index: faiss.Index, config: IndexConfig, nprobe: int = None, ef_search: int = None) -> None:
+    """Aplica os parâmetros de consulta (nprobe / efSearch) salvos ou sobrescritos."""
+    if config.index_type in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).nprobe = nprobe or config.nprobe
+    elif config.index_type == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = ef_search or config.ef_search
+
+
+def build_search_parameters(index: faiss.Index, config: IndexConfig, ids: np.ndarray,
+                            nprobe: int = None, ef_search: int = None) -> faiss.SearchParameters:
+    """
+    Parâmetros de consulta que restringem a busca às posições em ids (IDSelectorBatch),
+    mantendo nprobe / efSearch do índice.
+    """
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64))
+    if config.index_type in ("ivf", "ivfpq"):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or faiss.extract_index_ivf(index).nprobe)
+    elif config.index_type == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or faiss.downcast_index(index).hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # O SWIG não mantém o seletor vivo a partir dos parâmetros
+    params.referenced_objects = [selector]
+    return params
+
+
+def stored_labels(index: faiss.Index) -> np.ndarray | None:
+    """
+    Rótulos armazenados nas listas invertidas de um índice IVF (que podem divergir das
+    posições 0..ntotal-1 após remove_ids). None para os demais tipos, cujo rótulo é a posição.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+    invlists = ivf.invlists
+    labels = [
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist)
+        if invlists.list_size(list_no)
+    ]
+    return np.concatenate(labels) if labels else np.empty(0, dtype=np.int64)
+
+
+def enable_reconstruction(index: faiss.Index, config: IndexConfig) -> bool:
+    """
+    Permite reconstruir os vetores salvos por posição (reconstruct / reconstruct_batch).
+    Os índices IVF precisam de um mapa direto posição -> lista; nos IVF-PQ os vetores
+    reconstruídos são aproximados. Retorna False se o índice não suportar.
+    """
+    if config.index_type not in ("ivf", "ivfpq"):
+        return True
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError as e:
+        logging.getLogger(__name__).warning(f"Índice sem reconstrução de vetores ({e}).")
+        return False
+    return True
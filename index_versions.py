@@ -0,0 +1,91 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+
+# Arquivo no diretório do índice com o nome da versão publicada
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+# Manifesto de linhas gravado por create_embeddings
+MANIFEST_FILE = "manifest.json"
+
+
+def resolve_index_dir(path: str) -> str:
+    """
+    Diretório com os arquivos do índice: a versão apontada por CURRENT ou, em índices
+    criados antes do versionamento, o próprio path.
+    """
+    pointer = os.path.join(path, CURRENT_FILE)
+    if not os.path.isfile(pointer):
+        return path
+    with open(pointer, "r", encoding="utf-8") as f:
+        name = f.read().strip()
+    version_dir = os.path.join(path, VERSIONS_DIR, name)
+    if not os.path.isdir(version_dir):
+        raise FileNotFoundError(f"Versão publicada do índice não encontrada: {version_dir}")
+    return version_dir
+
+
+def new_version_dir(path: str) -> str:
+    """Cria o diretório de uma nova versão do índice, ainda não visível para os leitores."""
+    name = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    version_dir = os.path.join(path, VERSIONS_DIR, name)
+    os.makedirs(version_dir)
+    return version_dir
+
+
+def publish_version(path: str, version_dir: str) -> None:
+    """
+    Torna version_dir a versão atual com uma única troca atômica do arquivo CURRENT:
+    leitores veem o conjunto anterior inteiro ou o novo inteiro, nunca uma mistura.
+    Depois, remove as versões antigas e os arquivos de um índice não versionado.
+    """
+    logger = logging.getLogger(__name__)
+    pointer = os.path.join(path, CURRENT_FILE)
+    previous = resolve_index_dir(path) if os.path.isfile(pointer) else None
+    with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version_dir))
+    os.replace(f"{pointer}.tmp", pointer)
+
+    # Mantém a versão anterior, que leitores ainda podem estar usando
+    keep = {os.path.basename(version_dir)}
+    if previous is not None:
+        keep.add(os.path.basename(previous))
+    versions_root = os.path.join(path, VERSIONS_DIR)
+    for name in os.listdir(versions_root):
+        if name not in keep:
+            shutil.rmtree(os.path.join(versions_root, name), ignore_errors=True)
+    # Arquivos de antes do versionamento não são mais lidos
+    for name in os.listdir(path):
+        file_path = os.path.join(path, name)
+        if name != CURRENT_FILE and os.path.isfile(file_path):
+            os.remove(file_path)
+    logger.info(f"Versão {os.path.basename(version_dir)} do índice publicada em {path}")
+
+
+def index_fingerprint(path: str) -> tuple:
+    """
+    Impressão digital barata do índice publicado em path: o conteúdo de CURRENT ou, em
+    índices não versionados, o manifesto (gravado por último) ou os arquivos que não são
+    temporários.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"FAISS index not found at path: {path}")
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return ((os.path.basename(path), stat.st_size, stat.st_mtime_ns),)
+    pointer = os.path.join(path, CURRENT_FILE)
+    if os.path.isfile(pointer):
+        with open(pointer, "r", encoding="utf-8") as f:
+            return ("version", f.read().strip())
+    names = sorted(name for name in os.listdir(path) if not name.endswith(".tmp"))
+    if MANIFEST_FILE in names:
+        names = [MANIFEST_FILE]
+    fingerprint = []
+    for name in names:
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path):
+            stat = os.stat(file_path)
+            fingerprint.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
@@ -0,0 +1,256 @@
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pythonjsonlogger import jsonlogger
+
+METRICS_LOGGER_NAME = "process_analyser.metrics"
+
+# Limites (em segundos) dos buckets dos histogramas de duração
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = contextvars.ContextVar("process_analyser_trace", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(label_key: tuple, extra: dict = None) -> str:
+    items = list(label_key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+class MetricsRegistry:
+    """Contadores e histogramas em memória, exportáveis no formato texto do Prometheus."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            histogram = series.setdefault(key, {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": {name: dict(series) for name, series in self._counters.items()},
+                "histograms": {
+                    name: {key: {"count": h["count"], "sum": h["sum"]} for key, h in series.items()}
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {histogram['count']}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram['sum']}")
+        return "\n".join(lines) + "\n"
+
+
+class AnalysisTrace:
+    """
+    Registro de uma análise: duração de cada etapa e atributos (tokens, documentos,
+    cache). Emitido como um único evento ao final.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.spans = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[stage] = self.spans.get(stage, 0.0) + time.perf_counter() - start
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, **values) -> None:
+        for key, value in values.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_event(self) -> dict:
+        return {
+            "event": self.name,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "spans_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.spans.items()},
+            **self.attributes,
+        }
+
+
+class Instrumentation:
+    """
+    Coleta métricas das análises e as publica em logs JSON, em um registro no formato
+    Prometheus e em hooks registrados pelo chamador.
+    """
+
+    def __init__(self, json_logs: bool = False, registry: MetricsRegistry = None):
+        """
+        Inicializa a Instrumentation.
+
+        Args:
+            json_logs (bool): Se True, os eventos são emitidos em JSON (python-json-logger)
+                em um handler próprio, sem propagar para o logger raiz.
+            registry (MetricsRegistry, optional): Registro de métricas a usar.
+        """
+        self.logger = logging.getLogger(METRICS_LOGGER_NAME)
+        self.registry = registry or MetricsRegistry()
+        self._hooks = []
+        self._server = None
+        if json_logs:
+            configure_json_logging()
+
+    def add_hook(self, hook) -> None:
+        """Registra uma função chamada com o dicionário de cada evento emitido."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self._hooks.remove(hook)
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Abre um AnalysisTrace acessível às etapas internas via span()."""
+        trace = AnalysisTrace(name, **attributes)
+        token = _current_trace.set(trace)
+        status = "ok"
+        try:
+            yield trace
+        except Exception:
+            status = "erro"
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.set(status=status)
+            self.emit(trace)
+
+    def span(self, stage: str):
+        """Mede uma etapa do trace corrente (ou nada, fora de um trace)."""
+        trace = _current_trace.get()
+        return trace.span(stage) if trace is not None else nullcontext()
+
+    def annotate(self, **attributes) -> None:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.set(**attributes)
+
+    def accumulate(self, **values) -> None:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(**values)
+
+    def emit(self, trace: AnalysisTrace) -> None:
+        event = trace.to_event()
+        attributes = trace.attributes
+        self.registry.increment(
+            "analysis_total", event=trace.name, status=attributes.get("status", "ok"),
+            cache="hit" if attributes.get("cache_hit") else "miss",
+        )
+        self.registry.observe("analysis_duration_seconds", event["duration_ms"] / 1000, event=trace.name)
+        for stage, seconds in trace.spans.items():
+            self.registry.observe("analysis_stage_duration_seconds", seconds, stage=stage)
+        for field in ("prompt_tokens", "completion_tokens", "retrieved_documents"):
+            if field in attributes:
+                self.registry.increment(f"analysis_{field}_total", attributes[field])
+        if "total_cost" in attributes:
+            self.registry.increment("analysis_cost_usd_total", attributes["total_cost"])
+
+        self.logger.info(f"{trace.name}: {event['duration_ms']} ms", extra=event)
+        for hook in list(self._hooks):
+            try:
+                hook(event)
+            except Exception as e:
+                self.logger.warning(f"Falha em hook de instrumentação: {e}")
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        self.registry.observe(name, value, **labels)
+
+    def render_prometheus(self) -> str:
+        return self.registry.render_prometheus()
+
+    def start_metrics_server(self, port: int = 9100, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Expõe GET /metrics no formato texto do Prometheus em uma thread de fundo."""
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = instrumentation.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self._server
+
+
+def configure_json_logging(stream=None) -> logging.Handler:
+    """Envia os eventos de métricas em JSON para stream (padrão: stderr), sem propagar."""
+    logger = logging.getLogger(METRICS_LOGGER_NAME)
+    for handler in logger.handlers:
+        if isinstance(handler.formatter, jsonlogger.JsonFormatter):
+            return handler
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(jsonlogger.JsonFormatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return handler
+
+
+_DEFAULT_INSTRUMENTATION = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_instrumentation() -> Instrumentation:
+    """Instrumentação compartilhada pelo processo (métricas agregadas de todos os analisadores)."""
+    global _DEFAULT_INSTRUMENTATION
+    with _DEFAULT_LOCK:
+        if _DEFAULT_INSTRUMENTATION is None:
+            _DEFAULT_INSTRUMENTATION = Instrumentation()
+        return _DEFAULT_INSTRUMENTATION
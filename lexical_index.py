@@ -0,0 +1,147 @@
+import os
+import json
+import math
+
+import numpy as np
+from langchain_core.documents import Document
+
+from text_utils import analyze
+
+BM25_FILE = "bm25.json"
+BM25_VERSION = 1
+
+# Constante da Reciprocal Rank Fusion (Cormack et al., 2009)
+RRF_K = 60
+
+
+class BM25Index:
+    """
+    Índice lexical BM25 sobre o texto dos documentos, com posições alinhadas ao índice
+    FAISS. Tokenização em português: sem acentos, sem palavras funcionais e com plurais
+    reduzidos (text_utils.analyze).
+    """
+
+    def __init__(self, postings: dict, doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        """
+        Inicializa o BM25Index.
+
+        Args:
+            postings (dict): termo -> (posições, frequências), ambos np.ndarray.
+            doc_lengths (np.ndarray): Número de tokens de cada documento, por posição.
+            k1 (float): Saturação da frequência do termo.
+            b (float): Peso da normalização pelo tamanho do documento.
+        """
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.ntotal = len(doc_lengths)
+        self.avgdl = float(doc_lengths.mean()) if self.ntotal else 0.0
+
+    @classmethod
+    def from_texts(cls, texts, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Constrói o índice a partir dos textos na ordem das posições do índice FAISS."""
+        postings = {}
+        doc_lengths = []
+        for position, text in enumerate(texts):
+            tokens = analyze(text)
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                positions, frequencies = postings.setdefault(token, ([], []))
+                positions.append(position)
+                frequencies.append(count)
+        return cls(
+            {
+                token: (np.asarray(positions, dtype=np.int64), np.asarray(frequencies, dtype=np.float32))
+                for token, (positions, frequencies) in postings.items()
+            },
+            np.asarray(doc_lengths, dtype=np.float32),
+            k1,
+            b,
+        )
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        def texts():
+            for position in range(vectorstore.index.ntotal):
+                document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+                yield document.page_content if isinstance(document, Document) else ""
+        return cls.from_texts(texts(), k1, b)
+
+    def save(self, index_dir: str) -> None:
+        data = {
+            "version": BM25_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths.astype(int).tolist(),
+            "postings": {
+                token: [positions.tolist(), frequencies.astype(int).tolist()]
+                for token, (positions, frequencies) in self.postings.items()
+            },
+        }
+        path = os.path.join(index_dir, BM25_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index | None":
+        """Lê o índice salvo; None se ausente ou de versão incompatível."""
+        path = os.path.join(index_dir, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != BM25_VERSION:
+            return None
+        return cls(
+            {
+                token: (np.asarray(positions, dtype=np.int64), np.asarray(frequencies, dtype=np.float32))
+                for token, (positions, frequencies) in data["postings"].items()
+            },
+            np.asarray(data["doc_lengths"], dtype=np.float32),
+            data["k1"],
+            data["b"],
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """Pontuação BM25 de todos os documentos para a consulta (vetor por posição)."""
+        scores = np.zeros(self.ntotal, dtype=np.float32)
+        for token in set(analyze(query)):
+            if token not in self.postings:
+                continue
+            positions, frequencies = self.postings[token]
+            idf = math.log(1 + (self.ntotal - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[positions] / self.avgdl)
+            scores[positions] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        return scores
+
+    def search(self, query: str, k: int, candidates: np.ndarray = None) -> list[int]:
+        """
+        Posições dos k documentos mais relevantes (pontuação > 0), opcionalmente restritas
+        às posições candidatas.
+        """
+        scores = self.scores(query)
+        positions = np.arange(self.ntotal) if candidates is None else np.asarray(candidates, dtype=np.int64)
+        selected = scores[positions]
+        matching = selected > 0
+        positions, selected = positions[matching], selected[matching]
+        if len(positions) > k:
+            top = np.argpartition(-selected, k - 1)[:k]
+            positions, selected = positions[top], selected[top]
+        return positions[np.argsort(-selected, kind="stable")].tolist()
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = RRF_K) -> list[int]:
+    """
+    Combina listas ordenadas de posições pela Reciprocal Rank Fusion: cada documento
+    soma 1 / (k + rank) em cada lista em que aparece.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=lambda position: fused[position], reverse=True)
@@ -0,0 +1,129 @@
+import os
+import json
+from functools import reduce
+
+import numpy as np
+from langchain_core.documents import Document
+
+from text_utils import normalize_text, tokenize
+
+METADATA_INDEX_FILE = "metadata_index.json"
+METADATA_INDEX_VERSION = 1
+
+# Campos filtráveis, em ordem de prioridade: ao relaxar o filtro, os últimos saem primeiro
+FILTER_FIELDS = ("ramo_empresa", "nome_processo")
+
+
+def _postings(mapping: dict) -> dict:
+    return {key: np.asarray(sorted(positions), dtype=np.int64) for key, positions in mapping.items()}
+
+
+class MetadataIndex:
+    """
+    Índice invertido dos metadados dos documentos: valor normalizado (e cada token dele)
+    -> posições no índice FAISS. Restringe a busca vetorial a um conjunto de candidatos.
+    """
+
+    def __init__(self, values: dict, tokens: dict, ntotal: int):
+        self.values = values
+        self.tokens = tokens
+        self.ntotal = ntotal
+
+    @classmethod
+    def from_metadatas(cls, metadatas, fields: tuple = FILTER_FIELDS) -> "MetadataIndex":
+        """Constrói o índice a partir dos metadados na ordem das posições do índice FAISS."""
+        values = {field: {} for field in fields}
+        tokens = {field: {} for field in fields}
+        ntotal = 0
+        for position, metadata in enumerate(metadatas):
+            ntotal += 1
+            for field in fields:
+                value = normalize_text(metadata.get(field))
+                if not value:
+                    continue
+                values[field].setdefault(value, []).append(position)
+                for token in set(tokenize(value)):
+                    tokens[field].setdefault(token, []).append(position)
+        return cls(
+            {field: _postings(mapping) for field, mapping in values.items()},
+            {field: _postings(mapping) for field, mapping in tokens.items()},
+            ntotal,
+        )
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, fields: tuple = FILTER_FIELDS) -> "MetadataIndex":
+        def metadatas():
+            for position in range(vectorstore.index.ntotal):
+                document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+                yield document.metadata if isinstance(document, Document) else {}
+        return cls.from_metadatas(metadatas(), fields)
+
+    def save(self, index_dir: str) -> None:
+        data = {
+            "version": METADATA_INDEX_VERSION,
+            "ntotal": self.ntotal,
+            "values": {field: {key: p.tolist() for key, p in mapping.items()} for field, mapping in self.values.items()},
+            "tokens": {field: {key: p.tolist() for key, p in mapping.items()} for field, mapping in self.tokens.items()},
+        }
+        path = os.path.join(index_dir, METADATA_INDEX_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "MetadataIndex | None":
+        """Lê o índice salvo; None se ausente ou de versão incompatível."""
+        path = os.path.join(index_dir, METADATA_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != METADATA_INDEX_VERSION:
+            return None
+        return cls(
+            {field: _postings(mapping) for field, mapping in data["values"].items()},
+            {field: _postings(mapping) for field, mapping in data["tokens"].items()},
+            data["ntotal"],
+        )
+
+    def match(self, field: str, value) -> np.ndarray | None:
+        """
+        Posições cujo campo corresponde a value: valor idêntico após normalização; senão,
+        todos os tokens presentes; senão, qualquer um dos tokens. None se value for vazio.
+        """
+        normalized = normalize_text(value)
+        if not normalized or field not in self.values:
+            return None
+        if normalized in self.values[field]:
+            return self.values[field][normalized]
+        postings = [self.tokens[field].get(token) for token in tokenize(normalized)]
+        postings = [p for p in postings if p is not None]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        both = reduce(np.intersect1d, postings)
+        return both if len(both) else reduce(np.union1d, postings)
+
+    def candidates(self, filters: dict, min_candidates: int = 1) -> np.ndarray | None:
+        """
+        Posições candidatas para os filtros informados.
+
+        Combina os campos de FILTER_FIELDS presentes em filters; se a interseção tiver menos
+        de min_candidates posições, relaxa o filtro removendo os campos de menor prioridade.
+        Retorna o maior conjunto obtido (possivelmente menor que min_candidates) ou None
+        quando nenhum campo filtrável foi informado.
+        """
+        matches = []
+        for field in FILTER_FIELDS:
+            positions = self.match(field, filters.get(field))
+            if positions is not None:
+                matches.append(positions)
+        if not matches:
+            return None
+        best = np.empty(0, dtype=np.int64)
+        for size in range(len(matches), 0, -1):
+            positions = reduce(np.intersect1d, matches[:size])
+            if len(positions) >= min_candidates:
+                return positions
+            if len(positions) > len(best):
+                best = positions
+        return best
@@ -0,0 +1,197 @@
+import re
+import ast
+import json
+import logging
+
+from pydantic import BaseModel, Field
+
+RESULT_FIELDS = ("oportunidade_melhoria", "tarefa", "criterio_aceitacao")
+
+_CODE_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+
+# Pedido curto de correção: não reenvia o contexto recuperado, apenas a resposta malformada
+REPAIR_PROMPT = """A resposta abaixo deveria ser uma lista JSON de objetos com exatamente os campos
+"oportunidade_melhoria", "tarefa" e "criterio_aceitacao", mas não pôde ser interpretada.
+Corrija apenas o formato, sem alterar o conteúdo, e retorne somente a lista JSON válida.
+
+RESPOSTA:
+{text}
+"""
+
+
+class OutputParsingError(ValueError):
+    """A resposta do modelo não pôde ser convertida em lista de oportunidades."""
+
+
+class ParsedRecords(list):
+    """Oportunidades interpretadas; truncated=True se a resposta terminou antes do fim da lista."""
+
+    truncated = False
+
+
+def is_complete_record(record) -> bool:
+    """True se record é um dicionário com todos os RESULT_FIELDS preenchidos."""
+    return isinstance(record, dict) and all(str(record.get(field) or "").strip() for field in RESULT_FIELDS)
+
+
+class Opportunity(BaseModel):
+    """Uma oportunidade de melhoria sugerida pelo modelo."""
+
+    oportunidade_melhoria: str = Field(description="Descrição clara e específica da oportunidade identificada")
+    tarefa: str = Field(description="Ação concreta e mensurável para implementar a melhoria")
+    criterio_aceitacao: str = Field(description="Métricas e resultados específicos que indicam o sucesso da implementação")
+
+
+class OpportunityList(BaseModel):
+    """Esquema usado no modo de saída estruturada (function calling / JSON mode)."""
+
+    oportunidades: list[Opportunity]
+
+
+def parse_object(text: str) -> dict | None:
+    """Interpreta um objeto isolado como JSON ou, em seguida, como literal Python."""
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return None
+    return value if isinstance(value, dict) else None
+
+
+class IncrementalJSONArrayParser:
+    """
+    Extrai os objetos de uma lista JSON à medida que os tokens chegam.
+
+    Cada chamada a feed() devolve os objetos de primeiro nível que foram concluídos
+    no trecho recebido. Texto antes do "[" inicial (ex.: cercas de código) é ignorado,
+    e strings com aspas simples ou duplas são respeitadas ao contar chaves.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._in_array = False
+        self._depth = 0
+        self._quote = None
+        self._escape = False
+        self._object_chars = None
+        self.finished = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        completed = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self._in_array:
+                if char == "[":
+                    self._in_array = True
+                continue
+
+            if self._object_chars is not None:
+                self._object_chars.append(char)
+
+            if self._quote is not None:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == self._quote:
+                    self._quote = None
+                continue
+
+            if char in ("\"", "'") and self._depth > 0:
+                self._quote = char
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_chars = [char]
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Fechamento da lista de primeiro nível
+                    self.finished = True
+                    continue
+                self._depth -= 1
+                if self._depth == 0 and self._object_chars is not None:
+                    text = "".join(self._object_chars)
+                    self._object_chars = None
+                    item = parse_object(text)
+                    if item is None:
+                        self.logger.warning(f"Objeto ignorado por não ser interpretável: {text[:200]}")
+                    else:
+                        completed.append(item)
+        return completed
+
+    @property
+    def pending_text(self) -> str:
+        """Trecho do objeto ainda incompleto (útil para depuração de respostas truncadas)."""
+        return "".join(self._object_chars or [])
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove cercas de código Markdown (```json ... ```), se houver."""
+    match = _CODE_FENCE.search(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+def _as_records(value) -> list[dict] | None:
+    """Aceita uma lista de dicionários ou um dicionário que envolva essa lista."""
+    if isinstance(value, dict):
+        if all(field in value for field in RESULT_FIELDS):
+            return [value]
+        lists = [item for item in value.values() if isinstance(item, list)]
+        value = lists[0] if len(lists) == 1 else None
+    if isinstance(value, (list, tuple)):
+        records = [item for item in value if isinstance(item, dict)]
+        if records and not all(is_complete_record(record) for record in records):
+            # Campos ausentes ou vazios contam como falha de interpretação (e levam à correção)
+            logging.getLogger(__name__).warning(f"Oportunidades com campos ausentes ou vazios (exigidos: {', '.join(RESULT_FIELDS)}).")
+            return None
+        return records or None
+    return None
+
+
+def _parse_literal(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def parse_opportunity_list(text: str) -> list[dict]:
+    """
+    Converte a resposta do modelo em lista de dicionários de forma tolerante.
+
+    Tenta, em ordem: JSON, literal Python, o trecho entre o primeiro "[" e o último "]",
+    e por fim a extração incremental dos objetos completos (recupera listas truncadas,
+    marcadas com truncated=True para não irem ao cache).
+
+    Raises:
+        OutputParsingError: Se nenhum objeto puder ser extraído ou algum não tiver todos
+            os RESULT_FIELDS.
+    """
+    cleaned = strip_code_fences(text)
+    candidates = [cleaned]
+    start, end = cleaned.find("["), cleaned.rfind("]")
+    if start != -1 and end > start:
+        candidates.append(cleaned[start:end + 1])
+
+    for candidate in candidates:
+        records = _as_records(_parse_literal(candidate))
+        if records:
+            return ParsedRecords(records)
+
+    parser = IncrementalJSONArrayParser()
+    records = ParsedRecords(parser.feed(cleaned))
+    if records and all(is_complete_record(record) for record in records):
+        if not parser.finished:
+            records.truncated = True
+            logging.getLogger(__name__).warning(
+                f"Resposta truncada: {len(records)} oportunidades completas recuperadas."
+            )
+        return records
+    raise OutputParsingError(f"Resposta do modelo não pôde ser interpretada: {text[:200]}")
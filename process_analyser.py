@@ -1,21 +1,220 @@
+from __future__ import annotations
+
 import os
+import asyncio
 import json
+import hashlib
+import time
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+from typing import TYPE_CHECKING, Iterator
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.chains import ConversationalRetrievalChain
+from langchain_core.documents import Document
+from langchain_core.prompts import format_document
 import logging
+from embedding_cache import DEFAULT_CACHE_PATH, CachedEmbeddings, get_embedding_cache
+from response_cache import ResponseCache, build_response_cache, make_cache_key, normalize_process_data
+from semantic_cache import DEFAULT_THRESHOLD, SemanticCache, build_semantic_cache
+from text_utils import normalize_text
+from index_versions import index_fingerprint, resolve_index_dir
+from metadata_index import FILTER_FIELDS, MetadataIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from context_builder import TRANSCRIPT_FIELD, ContextBuilder
+from reranker import Reranker
+from instrumentation import Instrumentation, get_instrumentation
+from output_parser import (
+    REPAIR_PROMPT,
+    RESULT_FIELDS,
+    IncrementalJSONArrayParser,
+    OpportunityList,
+    OutputParsingError,
+    is_complete_record,
+    parse_opportunity_list,
+)
+
+# Os clientes da OpenAI, a chain do LangChain, o faiss e o carregamento do índice são
+# importados apenas na primeira análise (ou em warm_up), mantendo barato o import deste módulo.
+if TYPE_CHECKING:
+    import httpx
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain_community.vectorstores import FAISS
+    from langchain_openai import ChatOpenAI
+    from sharded_store import ShardedVectorStore
+    from suggestion_index import SuggestionIndex
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_TEMPERATURE = 0.2
+DEFAULT_MAX_TOKENS = 2000
+
+# Incrementar sempre que o prompt de análise mudar, para invalidar o cache de respostas
+PROMPT_VERSION = "2"
+
+# Até este número de candidatos do pré-filtro, a busca é exata sobre os vetores
+# reconstruídos em vez de filtrada dentro do índice aproximado
+EXACT_SEARCH_MAX_CANDIDATES = 1024
+
+# Cliente HTTP compartilhado por todos os analisadores do processo, para reaproveitar
+# conexões keep-alive com a API da OpenAI em vez de abrir um pool por requisição.
+_HTTP_CLIENT = None
+_ASYNC_HTTP_CLIENT = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+# Event loop compartilhado, executado em uma thread dedicada, para o caminho assíncrono
+_EVENT_LOOP = None
+_EVENT_LOOP_LOCK = threading.Lock()
+
+# Registro de analisadores: chave -> (impressão digital do índice, analisador)
+_ANALYZER_REGISTRY = {}
+_ANALYZER_KEY_LOCKS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Retorna o cliente HTTP compartilhado (thread-safe) usado pelos clientes OpenAI."""
+    global _HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        if _HTTP_CLIENT is None:
+            import httpx
+            _HTTP_CLIENT = httpx.Client(
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+        return _HTTP_CLIENT
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Retorna o cliente HTTP assíncrono compartilhado usado pelos clientes OpenAI.
+
+    O pool de conexões fica associado ao event loop em que é usado; use-o apenas a partir
+    do event loop compartilhado (ver run_in_event_loop).
+    """
+    global _ASYNC_HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        if _ASYNC_HTTP_CLIENT is None:
+            import httpx
+            _ASYNC_HTTP_CLIENT = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+        return _ASYNC_HTTP_CLIENT
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Retorna o event loop compartilhado pelo processo, iniciando sua thread na primeira chamada."""
+    global _EVENT_LOOP
+    with _EVENT_LOOP_LOCK:
+        if _EVENT_LOOP is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="process-analyzer-loop", daemon=True)
+            thread.start()
+            _EVENT_LOOP = loop
+        return _EVENT_LOOP
+
+
+def run_in_event_loop(coro, timeout: float = None):
+    """Executa uma corrotina no event loop compartilhado e aguarda o resultado (uso síncrono)."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
+
 
 class ProcessAnalyzer:
-    def __init__(self, faiss_index_path: str = "process_index.faiss", api_key: str = None):
+    def __init__(
+        self,
+        faiss_index_path: str = "process_index.faiss",
+        api_key: str = None,
+        model: str = DEFAULT_MODEL,
+        temperature: float = DEFAULT_TEMPERATURE,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        embedding_cache_path: str = DEFAULT_CACHE_PATH,
+        response_cache: ResponseCache | str | None = "memory",
+        structured_output: str | None = None,
+        nprobe: int = None,
+        ef_search: int = None,
+        verbose: bool = False,
+        instrumentation: Instrumentation = None,
+        metadata_filter: bool = True,
+        filter_fallback: bool = True,
+        min_candidates: int = None,
+        hybrid: bool = True,
+        fusion_fetch_k: int = 20,
+        field_token_budget: int = 1000,
+        transcript_token_budget: int = 1500,
+        document_token_budget: int = 3000,
+        semantic_cache: SemanticCache | str | None = None,
+        semantic_threshold: float = DEFAULT_THRESHOLD,
+        rerank: bool = True,
+        rerank_fetch_k: int = 20,
+        mmr_lambda: float = 0.7,
+        overlap_weight: float = 0.3,
+        suggestions: bool = True,
+        suggestion_limit: int = 5,
+        refine_workers: int = 2,
+    ):
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        self.faiss_index_path = faiss_index_path
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.embedding_cache_path = embedding_cache_path
+        self.response_cache = build_response_cache(response_cache)
+        # Cache por similaridade, consultado antes da recuperação: None, "memory" ou caminho SQLite
+        self.semantic_cache = build_semantic_cache(semantic_cache, semantic_threshold)
+        # None: resposta em texto livre; "function_calling", "json_schema" ou "json_mode":
+        # resposta validada pelo esquema OpportunityList
+        self.structured_output = structured_output
+        # Sobrescrevem os parâmetros de consulta salvos em index_config.json
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # verbose=True imprime o prompt completo no stdout a cada análise (apenas depuração)
+        self.verbose = verbose
+        self.instrumentation = instrumentation or get_instrumentation()
+        # Pré-filtro por ramo_empresa / nome_processo antes da busca vetorial. Com poucos
+        # candidatos (menos que min_candidates, padrão: k), filter_fallback=True volta à
+        # busca global; False mantém a busca restrita aos candidatos encontrados.
+        self.metadata_filter = metadata_filter
+        self.filter_fallback = filter_fallback
+        self.min_candidates = min_candidates
+        # Modo híbrido: funde os fusion_fetch_k melhores resultados vetoriais e do BM25
+        self.hybrid = hybrid
+        self.fusion_fetch_k = fusion_fetch_k
+        # Reordenação local: busca rerank_fetch_k candidatos e mantém os k melhores por
+        # cosseno, sobreposição com causa / atividade e MMR (None desativa)
+        self.reranker = Reranker(
+            fetch_k=rerank_fetch_k, mmr_lambda=mmr_lambda, overlap_weight=overlap_weight
+        ) if rerank else None
+        # Modo rápido: sugestões curadas do catálogo por segmento e processo, sem o modelo;
+        # a análise completa pode ser refinada em segundo plano (analyze_process_fast)
+        self.suggestions = suggestions
+        self.suggestion_limit = suggestion_limit
+        self.refine_workers = refine_workers
+        self._refine_executor = None
+        self._refine_lock = threading.Lock()
         
+        self.sharded = False
+        # Índices auxiliares (metadados, BM25) lidos do disco na primeira consulta que os usa
+        self._index_dir = None
+        self._sidecars = {}
+        self._sidecar_lock = threading.Lock()
+
         self._setup_api_key(api_key)
+        start = time.perf_counter()
         self.vectorstore = self._load_faiss_index(faiss_index_path)
+        self.instrumentation.observe("index_load_seconds", time.perf_counter() - start)
+        # Mantém o prompt limitado mesmo com transcrições longas
+        self.context_builder = ContextBuilder(
+            self.vectorstore.embedding_function,
+            field_token_budget=field_token_budget,
+            transcript_token_budget=transcript_token_budget,
+            document_token_budget=document_token_budget,
+        )
         self.chat = self._initialize_llm()
         self.retrieval_chain = self._setup_retrieval_chain()
+        self.search_kwargs = dict(self.retrieval_chain.retriever.search_kwargs)
         self.chat_history = []  
 
 
@@ -27,46 +226,158 @@ class ProcessAnalyzer:
             if not os.getenv("OPENAI_API_KEY"):
                 raise ValueError("OpenAI API key not found. Please provide it or set it in the .env file.")
 
-    def _load_faiss_index(self, faiss_index_path: str) -> FAISS:
+    def _initialize_embeddings(self):
+        from langchain_openai import OpenAIEmbeddings
+
+        embeddings = OpenAIEmbeddings(
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+        )
+        if self.embedding_cache_path:
+            return CachedEmbeddings(embeddings, get_embedding_cache(self.embedding_cache_path))
+        return embeddings
+
+    def _load_faiss_index(self, faiss_index_path: str) -> FAISS | ShardedVectorStore:
         if not os.path.exists(faiss_index_path):
             raise FileNotFoundError(f"FAISS index not found at path: {faiss_index_path}")
-        return FAISS.load_local(
-            faiss_index_path, 
-            OpenAIEmbeddings(),
-            allow_dangerous_deserialization=True
+        from faiss_index import IndexConfig, apply_search_params, enable_reconstruction
+        from safe_index_store import open_vectorstore
+        from sharded_store import is_sharded_directory
+
+        if is_sharded_directory(faiss_index_path):
+            return self._load_sharded_index(faiss_index_path)
+        # Todos os arquivos vêm da mesma versão publicada do índice
+        index_dir = resolve_index_dir(faiss_index_path)
+        # Formato seguro: índice mapeado em memória e documentos lidos do SQLite só para os resultados
+        vectorstore = open_vectorstore(index_dir, self._initialize_embeddings())
+        self.index_config = IndexConfig.load(index_dir) or IndexConfig()
+        # Identifica a versão do índice nas entradas do cache semântico
+        self.index_version = hashlib.sha256(
+            repr(_index_fingerprint(faiss_index_path)).encode("utf-8")
+        ).hexdigest()[:16]
+        apply_search_params(vectorstore.index, self.index_config, self.nprobe, self.ef_search)
+        # O reranker e a busca exata entre candidatos usam os vetores salvos no índice
+        self.reconstructable = enable_reconstruction(vectorstore.index, self.index_config)
+        self._index_dir = index_dir
+        self.suggestion_index = self._load_suggestion_index(index_dir, vectorstore)
+        return vectorstore
+
+    def _load_sharded_index(self, faiss_index_path: str) -> ShardedVectorStore:
+        """
+        Catálogo particionado (shards.json): busca vetorial paralela em todos os shards.
+        O pré-filtro por metadados, o BM25 e as sugestões do catálogo não são usados neste modo.
+        """
+        from faiss_index import IndexConfig
+        from sharded_store import ShardedVectorStore
+
+        self.sharded = True
+        vectorstore = ShardedVectorStore.from_directory(
+            faiss_index_path, self._initialize_embeddings(), nprobe=self.nprobe, ef_search=self.ef_search
+        )
+        self.index_config = IndexConfig()
+        self.reconstructable = False
+        self.index_version = vectorstore.version
+        self._sidecars = {"metadata_index": None, "lexical_index": None}
+        self.suggestion_index = None
+        self.logger.info(
+            f"{len(vectorstore.shard_names)} shards carregados ({vectorstore.ntotal} documentos): "
+            f"{', '.join(vectorstore.shard_names)}"
         )
+        return vectorstore
+
+    def refresh_shards(self) -> bool:
+        """Recarrega os shards alterados, novos ou removidos em disco, sem reiniciar."""
+        if not self.sharded or not self.vectorstore.refresh():
+            return False
+        self.index_version = self.vectorstore.version
+        return True
+
+    def _sidecar(self, name: str, loader):
+        # Carregado uma única vez, fora da inicialização: a partida continua lendo só o
+        # índice mapeado em memória
+        if name not in self._sidecars:
+            with self._sidecar_lock:
+                if name not in self._sidecars:
+                    self._sidecars[name] = loader()
+        return self._sidecars[name]
+
+    @property
+    def lexical_index(self) -> BM25Index | None:
+        """Índice BM25 do modo híbrido; None se desativado, ausente ou desatualizado."""
+        return self._sidecar("lexical_index", self._load_lexical_index)
+
+    @property
+    def metadata_index(self) -> MetadataIndex | None:
+        """Índice de metadados do pré-filtro; None se desativado, ausente ou desatualizado."""
+        return self._sidecar("metadata_index", self._load_metadata_index)
+
+    def _load_lexical_index(self) -> BM25Index | None:
+        if not self.hybrid:
+            return None
+        lexical_index = BM25Index.load(self._index_dir)
+        if lexical_index is None or lexical_index.ntotal != self.vectorstore.index.ntotal:
+            # Reconstruir exigiria ler todos os documentos do docstore
+            self.logger.warning(
+                "Índice BM25 ausente ou desatualizado; busca híbrida desativada. "
+                "Recrie o índice com create_embeddings.py para reativá-la."
+            )
+            return None
+        return lexical_index
+
+    def _load_metadata_index(self) -> MetadataIndex | None:
+        if not self.metadata_filter:
+            return None
+        metadata_index = MetadataIndex.load(self._index_dir)
+        if metadata_index is None or metadata_index.ntotal != self.vectorstore.index.ntotal:
+            # Índices criados antes do filtro por metadados
+            self.logger.warning(
+                "Índice de metadados ausente ou desatualizado; pré-filtro desativado. "
+                "Recrie o índice com create_embeddings.py para reativá-lo."
+            )
+            return None
+        return metadata_index
+
+    def _load_suggestion_index(self, faiss_index_path: str, vectorstore: FAISS) -> SuggestionIndex | None:
+        from suggestion_index import SuggestionIndex
+
+        if not self.suggestions:
+            return None
+        suggestion_index = SuggestionIndex.load(faiss_index_path)
+        if suggestion_index is None or suggestion_index.ntotal != vectorstore.index.ntotal:
+            self.logger.info("Índice de sugestões ausente ou desatualizado; construindo a partir do índice.")
+            suggestion_index = SuggestionIndex.from_vectorstore(vectorstore, self.index_config)
+        return suggestion_index
 
     def _initialize_llm(self) -> ChatOpenAI:
-        return ChatOpenAI(model="gpt-4o-mini", temperature=0.2, max_tokens=2000)
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model=self.model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream_usage=True,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+        )
 
     def _setup_retrieval_chain(self) -> ConversationalRetrievalChain:
+        from langchain.chains import ConversationalRetrievalChain
+
         return ConversationalRetrievalChain.from_llm(
             llm=self.chat,
             retriever=self.vectorstore.as_retriever(),
             memory=None,
-            verbose=True
+            verbose=self.verbose
         )
 
-    def analyze_process(self, process_data:list[dict]) -> pd.DataFrame:
-        """
-        Analisa um processo de negócio e sugere melhorias.
-        
-        Args:
-            process_data (dict): Dicionário contendo informações do processo.
-            
-        Returns:
-            pd.DataFrame: DataFrame com análise e sugestões de melhoria.
-        """
-        # Convert input data to DataFrame
-        df_input = pd.DataFrame(process_data)
-        
-        # Create combined text for analysis
-        input_columns = df_input.columns.tolist()
-        df_input['combined_text'] = df_input.apply(
-            lambda row: ' '.join(f"{col}: {row[col]}" for col in input_columns), 
-            axis=1
-        )
-        process_text = df_input['combined_text'].to_string(index=False)
+    @staticmethod
+    def _document_key(document) -> str:
+        """Identificador estável de um documento recuperado (hash do conteúdo)."""
+        return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+    def _build_analysis_prompt(self, process_data: list[dict]) -> str:
+        # Campos do formulário e trechos relevantes da transcrição, dentro do orçamento de tokens
+        process_text = self.context_builder.build_process_text(process_data)
         
         analysis_prompt = f"""
         Você é um consultor sênior especializado em otimização de processos de uma das principais empresas globais de consultoria estratégica. Com base em sua vasta experiência em projetos de transformação organizacional e melhoria contínua, analise criteriosamente o processo a seguir:
@@ -109,17 +420,738 @@ class ProcessAnalyzer:
         Sem "python"
         
         """
-        # Get single comprehensive response
-        result = self.retrieval_chain(
-            {"question": analysis_prompt, "chat_history": self.chat_history}
-        )["answer"]
-        json_result = json.loads(result)
-        df_result = pd.DataFrame(json_result)
-        return df_result
+        return analysis_prompt
+
+    @staticmethod
+    def _metadata_filters(process_data: list[dict]) -> dict:
+        """Valores de ramo_empresa e nome_processo informados no formulário."""
+        first = process_data[0] if process_data else {}
+        return {field: first.get(field) for field in FILTER_FIELDS}
+
+    def _candidate_positions(self, filters: dict | None) -> np.ndarray | None:
+        """Posições do índice às quais a busca deve se restringir (None: busca global)."""
+        if self.metadata_index is None or not filters:
+            return None
+        min_candidates = self.min_candidates or self.search_kwargs.get("k", 4)
+        candidates = self.metadata_index.candidates(filters, min_candidates)
+        if candidates is None:
+            return None
+        self.instrumentation.annotate(prefilter_candidates=len(candidates))
+        if len(candidates) < min_candidates and self.filter_fallback:
+            self.logger.info(
+                f"Filtro por metadados com {len(candidates)} candidatos (mínimo {min_candidates}); "
+                "usando a busca global."
+            )
+            return None
+        return candidates
+
+    def _vector_positions(self, vectors: np.ndarray, k: int, candidates: np.ndarray = None) -> np.ndarray:
+        """
+        Posições dos k vizinhos mais próximos de cada linha de vectors, em uma única
+        chamada a index.search sobre a matriz (n, d); -1 onde houver menos de k resultados.
+        Com candidates, a busca é restrita a essas posições: exata sobre os vetores
+        reconstruídos quando há poucos candidatos ou o índice é HNSW (cujo grafo filtrado
+        encontra poucos vizinhos), senão via IDSelectorBatch do FAISS, com a busca exata
+        como fallback sempre que vierem menos de k resultados.
+        """
+        index = self.vectorstore.index
+        k = min(k, index.ntotal if candidates is None else len(candidates))
+        if k == 0:
+            return np.full((len(vectors), 0), -1, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if candidates is None:
+            _, positions = index.search(vectors, k)
+            return positions
+        if self.reconstructable and (
+            self.index_config.index_type == "hnsw" or len(candidates) <= EXACT_SEARCH_MAX_CANDIDATES
+        ):
+            return self._exact_positions(vectors, k, candidates)
+        from faiss_index import build_search_parameters
+
+        params = build_search_parameters(index, self.index_config, candidates, self.nprobe, self.ef_search)
+        _, positions = index.search(vectors, k, params=params)
+        if self.index_config.index_type in ("ivf", "ivfpq") and (positions == -1).any():
+            # Candidatos fora das listas visitadas: repete visitando todas as listas
+            nlist = self.index_config.nlist
+            params = build_search_parameters(index, self.index_config, candidates, nprobe=nlist)
+            _, positions = index.search(vectors, k, params=params)
+        if self.reconstructable and (positions == -1).any():
+            self.logger.info("Busca filtrada com menos de k resultados; repetindo com busca exata.")
+            positions = self._exact_positions(vectors, k, candidates)
+        return positions
+
+    def _exact_positions(self, vectors: np.ndarray, k: int, candidates: np.ndarray) -> np.ndarray:
+        """k vizinhos de cada linha de vectors por distância L2 exata aos vetores dos candidatos."""
+        candidates = np.asarray(candidates, dtype=np.int64)
+        candidate_vectors = self.vectorstore.index.reconstruct_batch(candidates)
+        distances = (
+            (vectors ** 2).sum(axis=1, keepdims=True)
+            - 2 * vectors @ candidate_vectors.T
+            + (candidate_vectors ** 2).sum(axis=1)
+        )
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+        self.instrumentation.annotate(exact_candidate_search=True)
+        return candidates[np.take_along_axis(nearest, order, axis=1)]
+
+    def _documents_at(self, positions) -> list:
+        from safe_index_store import SQLiteDocstore
+
+        if isinstance(self.vectorstore.docstore, SQLiteDocstore):
+            # Uma consulta ao SQLite para todas as posições
+            return self.vectorstore.docstore.documents_at(positions)
+        documents = []
+        for position in positions:
+            document = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[int(position)])
+            if not isinstance(document, Document):
+                raise ValueError(f"Could not find document for id {position}, got {document}")
+            documents.append(document)
+        return documents
+
+    @staticmethod
+    def _lexical_query(process_data: list[dict]) -> str:
+        """Valores digitados no formulário, sem o texto fixo do prompt, para a busca BM25."""
+        return " ".join(
+            str(value) for row in process_data for value in row.values() if value and str(value).strip()
+        )
+
+    def _search_many(self, vectors: np.ndarray, processes: list) -> list[list]:
+        """
+        Busca os k documentos do contexto de cada consulta (linhas de vectors). Com os
+        dados do formulário, restringe a busca pelos metadados e, no modo híbrido, funde
+        a lista vetorial com a do BM25 por Reciprocal Rank Fusion. Com o reranker, busca
+        mais candidatos e os reordena.
+
+        As consultas com o mesmo filtro compartilham uma única chamada a index.search, e
+        os documentos e vetores dos candidatos de todas as consultas são lidos de uma vez.
+        """
+        if not processes:
+            return []
+        k = self.search_kwargs.get("k", 4)
+        candidate_k = max(k, self.reranker.fetch_k) if self.reranker else k
+        if self.sharded:
+            # O ShardedVectorStore já distribui cada consulta entre os shards em paralelo
+            return [
+                self._rerank(vector, self.vectorstore.similarity_search_by_vector(vector.tolist(), candidate_k),
+                             None, process_data, k)
+                for vector, process_data in zip(vectors, processes)
+            ]
+
+        fetch_k = max(candidate_k, self.fusion_fetch_k) if self.lexical_index is not None else candidate_k
+        # Consultas agrupadas pelo filtro de metadados: uma busca vetorial por grupo
+        groups = {}
+        candidate_sets = {}
+        row_candidates = []
+        for row, process_data in enumerate(processes):
+            filters = self._metadata_filters(process_data) if process_data else None
+            key = tuple(sorted(filters.items())) if filters else None
+            if key not in candidate_sets:
+                candidate_sets[key] = self._candidate_positions(filters)
+            group = None if candidate_sets[key] is None else key
+            groups.setdefault(group, []).append(row)
+            row_candidates.append(candidate_sets[key])
+
+        vector_rankings = [None] * len(processes)
+        for group, rows in groups.items():
+            positions = self._vector_positions(vectors[rows], fetch_k, row_candidates[rows[0]])
+            for row, row_positions in zip(rows, positions):
+                vector_rankings[row] = row_positions[row_positions != -1]
+
+        rankings = []
+        lexical_hits = 0
+        for row, process_data in enumerate(processes):
+            lexical_query = self._lexical_query(process_data) if process_data else ""
+            if self.lexical_index is None or not lexical_query:
+                rankings.append(vector_rankings[row][:candidate_k])
+                continue
+            lexical_ranking = self.lexical_index.search(lexical_query, fetch_k, row_candidates[row])
+            lexical_hits += len(lexical_ranking)
+            fused = reciprocal_rank_fusion([vector_rankings[row].tolist(), lexical_ranking])[:candidate_k]
+            rankings.append(np.asarray(fused, dtype=np.int64))
+        if self.lexical_index is not None:
+            self.instrumentation.annotate(lexical_hits=lexical_hits)
+
+        # Documentos e vetores de todos os candidatos distintos, lidos uma única vez e
+        # redistribuídos por consulta pelos índices inversos
+        lengths = [len(ranking) for ranking in rankings]
+        unique, inverse = np.unique(np.concatenate(rankings).astype(np.int64), return_inverse=True)
+        if len(unique) == 0:
+            return [[] for _ in processes]
+        documents = self._documents_at(unique)
+        stored_vectors = self._candidate_vectors(unique, documents) if self.reranker else None
+        results = []
+        for row, indices in enumerate(np.split(inverse, np.cumsum(lengths)[:-1])):
+            results.append(self._rerank(
+                vectors[row],
+                [documents[i] for i in indices],
+                None if stored_vectors is None else stored_vectors[indices],
+                processes[row],
+                k,
+            ))
+        return results
+
+    def _search(self, embedding: list[float], process_data: list[dict] = None) -> list:
+        """Busca os k documentos do contexto de uma consulta (ver _search_many)."""
+        return self._search_many(np.asarray([embedding], dtype=np.float32), [process_data])[0]
+
+    def _candidate_vectors(self, positions: np.ndarray | None, documents: list) -> np.ndarray:
+        """Vetores dos candidatos: reconstruídos do índice ou, se indisponíveis, do cache de embeddings."""
+        if positions is not None and self.reconstructable:
+            return self.vectorstore.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+        return np.asarray(
+            self.vectorstore.embedding_function.embed_documents([document.page_content for document in documents]),
+            dtype=np.float32,
+        )
+
+    def _rerank(self, embedding, documents: list, vectors: np.ndarray | None,
+                process_data: list[dict] | None, k: int) -> list:
+        if self.reranker is None or not documents:
+            return documents[:k]
+        with self.instrumentation.span("rerank"):
+            if vectors is None:
+                vectors = self._candidate_vectors(None, documents)
+            reranked = self.reranker.rerank(embedding, vectors, documents, process_data, top_n=k)
+        self.instrumentation.annotate(rerank_candidates=len(documents))
+        return reranked
+
+    def _retrieval_queries(self, question: str, process_data: list[dict] | None) -> tuple[list[str], list]:
+        """
+        Consultas da recuperação: com várias linhas no formulário, cada linha tem sua
+        própria consulta; com uma, a pergunta completa.
+        """
+        if not process_data or len(process_data) == 1:
+            return [question], [process_data]
+        rows = [[row] for row in process_data]
+        with self.instrumentation.span("prompt_build"):
+            return [self._build_analysis_prompt(row) for row in rows], rows
+
+    @classmethod
+    def _merge_results(cls, results: list[list]) -> list:
+        """
+        Intercala os documentos de cada consulta, em ordem de relevância, sem repetições
+        (linhas do catálogo com o mesmo texto aparecem uma vez só).
+        """
+        merged = []
+        seen = set()
+        for documents in itertools.zip_longest(*results):
+            for document in documents:
+                if document is None:
+                    continue
+                key = cls._document_key(document)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(document)
+        return merged
+
+    def _retrieve_many(self, questions: list[str], processes: list) -> list[list]:
+        """Uma requisição de embeddings para todas as consultas e uma busca vetorial por filtro."""
+        with self.instrumentation.span("query_embedding"):
+            vectors = np.asarray(self.vectorstore.embedding_function.embed_documents(questions), dtype=np.float32)
+        with self.instrumentation.span("faiss_search"):
+            results = self._search_many(vectors, processes)
+        self.instrumentation.annotate(retrieved_documents=sum(len(documents) for documents in results))
+        return results
+
+    async def _aretrieve_many(self, questions: list[str], processes: list) -> list[list]:
+        with self.instrumentation.span("query_embedding"):
+            vectors = np.asarray(
+                await self.vectorstore.embedding_function.aembed_documents(questions), dtype=np.float32
+            )
+        # A busca no FAISS libera o GIL; roda em uma thread para não bloquear o event loop.
+        # to_thread copia o contexto, então spans e anotações da busca ficam no trace atual
+        with self.instrumentation.span("faiss_search"):
+            results = await asyncio.to_thread(self._search_many, vectors, processes)
+        self.instrumentation.annotate(retrieved_documents=sum(len(documents) for documents in results))
+        return results
+
+    def retrieve_many(self, processes: list[list[dict]]) -> list[list]:
+        """
+        Recuperação em lote: monta a consulta de cada processo, gera todos os embeddings
+        em uma requisição e busca todas as consultas de uma vez no índice.
+
+        Returns:
+            list[list]: Documentos do contexto de cada processo, dentro do orçamento de
+            tokens; podem ser passados a analyze_process(..., documents=...).
+        """
+        if not processes:
+            return []
+        with self.instrumentation.span("prompt_build"):
+            questions = [self._build_analysis_prompt(process_data) for process_data in processes]
+        results = self._retrieve_many(questions, processes)
+        return [self.context_builder.fit_documents(self._merge_results([documents])) for documents in results]
+
+    def _retrieve_documents(self, question: str, process_data: list[dict] = None) -> list:
+        questions, processes = self._retrieval_queries(question, process_data)
+        return self.context_builder.fit_documents(self._merge_results(self._retrieve_many(questions, processes)))
+
+    async def _aretrieve_documents(self, question: str, process_data: list[dict] = None) -> list:
+        questions, processes = self._retrieval_queries(question, process_data)
+        results = await self._aretrieve_many(questions, processes)
+        return self.context_builder.fit_documents(self._merge_results(results))
+
+    @contextmanager
+    def _track_llm_usage(self):
+        """Mede a geração e acumula tokens e custo no trace corrente."""
+        from langchain_community.callbacks.manager import get_openai_callback
+
+        with self.instrumentation.span("llm_generation"), get_openai_callback() as usage:
+            yield
+        self.instrumentation.accumulate(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_cost=usage.total_cost,
+        )
+
+    def _generation_inputs(self, question: str, documents: list) -> dict:
+        return {"input_documents": documents, "question": question, "chat_history": self.chat_history}
+
+    def _generate(self, question: str, documents: list) -> str:
+        return self.retrieval_chain.combine_docs_chain.invoke(
+            self._generation_inputs(question, documents)
+        )["output_text"]
+
+    async def _agenerate(self, question: str, documents: list) -> str:
+        result = await self.retrieval_chain.combine_docs_chain.ainvoke(
+            self._generation_inputs(question, documents)
+        )
+        return result["output_text"]
+
+    def _build_messages(self, question: str, documents: list) -> list:
+        """Monta as mensagens exatamente como a cadeia de combinação de documentos faria."""
+        combine_chain = self.retrieval_chain.combine_docs_chain
+        context = combine_chain.document_separator.join(
+            format_document(document, combine_chain.document_prompt) for document in documents
+        )
+        return combine_chain.llm_chain.prompt.format_messages(
+            **{combine_chain.document_variable_name: context, "question": question}
+        )
+
+    def _lookup_cached_result(self, process_data: list[dict], documents: list) -> tuple[str | None, list | None]:
+        """Consulta o cache de respostas; retorna (chave, resultado em cache ou None)."""
+        if self.response_cache is None:
+            return None, None
+        with self.instrumentation.span("cache_lookup"):
+            cache_key = make_cache_key(
+                process_data,
+                [self._document_key(document) for document in documents],
+                self.model,
+                PROMPT_VERSION,
+            )
+            cached_result = self.response_cache.get(cache_key)
+        self.instrumentation.annotate(cache_hit=cached_result is not None)
+        if cached_result is not None:
+            self.logger.info("Resultado recuperado do cache de respostas.")
+        return cache_key, cached_result
+
+    def _semantic_key(self, process_data: list[dict]) -> tuple[str, str, str]:
+        """
+        (texto a embutir, segmento, chave exata) do cache semântico. A transcrição não entra
+        no embedding, mas precisa ser idêntica, assim como modelo, prompt e índice.
+        """
+        fields = [{key: value for key, value in row.items() if key != TRANSCRIPT_FIELD} for row in process_data]
+        transcript = "\n".join(str(row.get(TRANSCRIPT_FIELD) or "") for row in process_data)
+        exact_key = hashlib.sha256(json.dumps(
+            [self.model, PROMPT_VERSION, self.index_version, transcript], ensure_ascii=False
+        ).encode("utf-8")).hexdigest()
+        segment = normalize_text(process_data[0].get("ramo_empresa")) if process_data else ""
+        return normalize_process_data(fields), segment, exact_key
+
+    def _record_semantic_lookup(self, records: list | None, similarity: float) -> None:
+        hit = records is not None
+        self.instrumentation.annotate(semantic_cache_hit=hit, semantic_similarity=round(similarity, 4))
+        self.instrumentation.registry.increment("semantic_cache_lookups_total", result="hit" if hit else "miss")
+        if hit:
+            self.instrumentation.annotate(cache_hit=True)
+            self.logger.info(f"Resultado recuperado do cache semântico (similaridade {similarity:.3f}).")
+
+    def _semantic_lookup(self, process_data: list[dict]) -> tuple[tuple | None, list | None]:
+        """Consulta o cache semântico; retorna (entrada a gravar, resultado em cache ou None)."""
+        if self.semantic_cache is None:
+            return None, None
+        with self.instrumentation.span("semantic_cache_lookup"):
+            text, segment, exact_key = self._semantic_key(process_data)
+            vector = self.vectorstore.embedding_function.embed_query(text)
+            records, similarity = self.semantic_cache.get(vector, segment, exact_key)
+        self._record_semantic_lookup(records, similarity)
+        return (vector, segment, exact_key), records
+
+    async def _asemantic_lookup(self, process_data: list[dict]) -> tuple[tuple | None, list | None]:
+        if self.semantic_cache is None:
+            return None, None
+        with self.instrumentation.span("semantic_cache_lookup"):
+            text, segment, exact_key = self._semantic_key(process_data)
+            vector = await self.vectorstore.embedding_function.aembed_query(text)
+            records, similarity = self.semantic_cache.get(vector, segment, exact_key)
+        self._record_semantic_lookup(records, similarity)
+        return (vector, segment, exact_key), records
+
+    def _store_result(self, records: list[dict], cache_key: str | None, semantic_entry: tuple | None) -> None:
+        if getattr(records, "truncated", False):
+            # Uma lista cortada não deve ser servida de novo pelo TTL inteiro do cache
+            self.logger.warning("Resultado truncado não será gravado no cache.")
+            return
+        if cache_key is not None:
+            self.response_cache.set(cache_key, records)
+        if semantic_entry is not None:
+            vector, segment, exact_key = semantic_entry
+            self.semantic_cache.set(vector, segment, exact_key, records)
+
+    def _structured_chat(self):
+        return self.chat.with_structured_output(OpportunityList, method=self.structured_output)
+
+    def _parse_or_repair(self, result: str) -> list[dict]:
+        """Interpreta a resposta; se falhar, faz uma única chamada curta pedindo a correção do formato."""
+        try:
+            with self.instrumentation.span("parse"):
+                return parse_opportunity_list(result)
+        except OutputParsingError:
+            self.logger.warning("Resposta fora do formato esperado; solicitando correção ao modelo.")
+        self.instrumentation.annotate(repaired=True)
+        with self._track_llm_usage():
+            repaired = self.chat.invoke(REPAIR_PROMPT.format(text=result)).content
+        return parse_opportunity_list(repaired)
+
+    async def _aparse_or_repair(self, result: str) -> list[dict]:
+        try:
+            with self.instrumentation.span("parse"):
+                return parse_opportunity_list(result)
+        except OutputParsingError:
+            self.logger.warning("Resposta fora do formato esperado; solicitando correção ao modelo.")
+        self.instrumentation.annotate(repaired=True)
+        with self._track_llm_usage():
+            repaired = (await self.chat.ainvoke(REPAIR_PROMPT.format(text=result))).content
+        return parse_opportunity_list(repaired)
+
+    def _generate_records(self, question: str, documents: list) -> list[dict]:
+        if self.structured_output:
+            with self._track_llm_usage():
+                result = self._structured_chat().invoke(self._build_messages(question, documents))
+            return [opportunity.model_dump() for opportunity in result.oportunidades]
+        with self._track_llm_usage():
+            answer = self._generate(question, documents)
+        return self._parse_or_repair(answer)
+
+    async def _agenerate_records(self, question: str, documents: list) -> list[dict]:
+        if self.structured_output:
+            with self._track_llm_usage():
+                result = await self._structured_chat().ainvoke(self._build_messages(question, documents))
+            return [opportunity.model_dump() for opportunity in result.oportunidades]
+        with self._track_llm_usage():
+            answer = await self._agenerate(question, documents)
+        return await self._aparse_or_repair(answer)
+
+    def _build_result(self, records: list[dict], cache_key: str | None, semantic_entry: tuple = None) -> pd.DataFrame:
+        self._store_result(records, cache_key, semantic_entry)
+        return pd.DataFrame(records)
+
+    def analyze_process(self, process_data:list[dict], documents: list = None) -> pd.DataFrame:
+        """
+        Analisa um processo de negócio e sugere melhorias.
+        
+        Args:
+            process_data (dict): Dicionário contendo informações do processo.
+            documents (list, optional): Documentos já recuperados (ex.: por retrieve_many);
+                se omitido, a recuperação é feita aqui.
+            
+        Returns:
+            pd.DataFrame: DataFrame com análise e sugestões de melhoria.
+        """
+        with self.instrumentation.trace("analyze_process", model=self.model):
+            # Entradas reformuladas, mas equivalentes, dispensam recuperação e modelo
+            semantic_entry, cached_result = self._semantic_lookup(process_data)
+            if cached_result is not None:
+                return pd.DataFrame(cached_result)
+
+            with self.instrumentation.span("prompt_build"):
+                analysis_prompt = self._build_analysis_prompt(process_data)
+            if documents is None:
+                documents = self._retrieve_documents(analysis_prompt, process_data)
+
+            # Entradas equivalentes com o mesmo contexto recuperado reaproveitam o resultado
+            cache_key, cached_result = self._lookup_cached_result(process_data, documents)
+            if cached_result is not None:
+                return pd.DataFrame(cached_result)
+
+            # Get single comprehensive response
+            records = self._generate_records(analysis_prompt, documents)
+            return self._build_result(records, cache_key, semantic_entry)
+
+    async def aanalyze_process(self, process_data: list[dict]) -> pd.DataFrame:
+        """
+        Versão assíncrona de analyze_process.
+
+        O embedding da consulta e a chamada ao modelo são assíncronos e a busca no FAISS
+        roda em um executor, permitindo várias análises concorrentes no mesmo event loop.
+        Deve ser aguardada no event loop compartilhado (ver run_in_event_loop).
+        """
+        with self.instrumentation.trace("aanalyze_process", model=self.model):
+            semantic_entry, cached_result = await self._asemantic_lookup(process_data)
+            if cached_result is not None:
+                return pd.DataFrame(cached_result)
+
+            with self.instrumentation.span("prompt_build"):
+                analysis_prompt = self._build_analysis_prompt(process_data)
+            documents = await self._aretrieve_documents(analysis_prompt, process_data)
+
+            cache_key, cached_result = self._lookup_cached_result(process_data, documents)
+            if cached_result is not None:
+                return pd.DataFrame(cached_result)
+
+            records = await self._agenerate_records(analysis_prompt, documents)
+            return self._build_result(records, cache_key, semantic_entry)
+
+    def stream_process(self, process_data: list[dict]) -> Iterator[dict]:
+        """
+        Analisa o processo produzindo cada oportunidade de melhoria assim que ela é gerada.
+
+        Yields:
+            dict: {oportunidade_melhoria, tarefa, criterio_aceitacao} de cada oportunidade.
+        """
+        start = time.perf_counter()
+        with self.instrumentation.trace("stream_process", model=self.model):
+            semantic_entry, cached_result = self._semantic_lookup(process_data)
+            if cached_result is not None:
+                yield from cached_result
+                return
+
+            with self.instrumentation.span("prompt_build"):
+                analysis_prompt = self._build_analysis_prompt(process_data)
+            documents = self._retrieve_documents(analysis_prompt, process_data)
+
+            cache_key, cached_result = self._lookup_cached_result(process_data, documents)
+            if cached_result is not None:
+                yield from cached_result
+                return
+
+            parser = IncrementalJSONArrayParser()
+            records = []
+            chunks = []
+            incomplete = False
+            with self._track_llm_usage():
+                for chunk in self.chat.stream(self._build_messages(analysis_prompt, documents)):
+                    chunks.append(chunk.content)
+                    for record in parser.feed(chunk.content):
+                        if not is_complete_record(record):
+                            self.logger.warning(f"Oportunidade sem todos os campos ignorada: {str(record)[:200]}")
+                            incomplete = True
+                            continue
+                        if not records:
+                            self.instrumentation.annotate(
+                                time_to_first_result_ms=round((time.perf_counter() - start) * 1000, 3)
+                            )
+                        records.append(record)
+                        yield record
+
+            if not records:
+                # Nada pôde ser extraído do fluxo: tenta a interpretação tolerante com correção
+                records = self._parse_or_repair("".join(chunks))
+                yield from records
+            elif not parser.finished:
+                self.logger.warning("Resposta do modelo terminou antes do fechamento da lista.")
+                return
+            elif incomplete:
+                # Parte das oportunidades foi descartada: o resultado não vai para o cache
+                return
+            self._store_result(records, cache_key, semantic_entry)
+
+    @staticmethod
+    def _suggestion_text(row: dict) -> str:
+        """Campos do formulário no formato "campo: valor" dos documentos indexados."""
+        return " ".join(f"{key}: {value}" for key, value in row.items() if key != TRANSCRIPT_FIELD and value)
+
+    def suggest(self, process_data: list[dict], limit: int = None) -> pd.DataFrame:
+        """
+        Sugestões curadas do catálogo para o processo, sem chamada ao modelo.
+
+        Usa o grupo de mesmo segmento e processo; sem ele, o embedding do formulário é
+        comparado aos centróides dos grupos (vizinho mais próximo).
+
+        Args:
+            process_data (list[dict]): Linhas do formulário.
+            limit (int, optional): Sobrescreve suggestion_limit.
+
+        Returns:
+            pd.DataFrame: {oportunidade_melhoria, tarefa, criterio_aceitacao}; vazio se não
+            houver índice de sugestões ou nenhum grupo compatível.
+        """
+        limit = limit or self.suggestion_limit
+        if self.suggestion_index is None:
+            return pd.DataFrame(columns=list(RESULT_FIELDS))
+        records, seen = [], set()
+        with self.instrumentation.trace("suggest"):
+            for row in process_data:
+                vector = None
+                if not self.suggestion_index.has_cluster(row):
+                    with self.instrumentation.span("embedding"):
+                        vector = self.vectorstore.embedding_function.embed_query(self._suggestion_text(row))
+                with self.instrumentation.span("suggestion_lookup"):
+                    suggestions, info = self.suggestion_index.lookup(row, vector, limit)
+                self.instrumentation.annotate(suggestion_match=info["match"], suggestion_similarity=info["similarity"])
+                self.instrumentation.registry.increment("suggestion_lookups_total", match=info["match"] or "none")
+                for record in suggestions:
+                    key = normalize_text(record["tarefa"])
+                    if key not in seen and len(records) < limit:
+                        seen.add(key)
+                        records.append(record)
+        return pd.DataFrame(records, columns=list(RESULT_FIELDS))
+
+    def _get_refine_executor(self) -> ThreadPoolExecutor:
+        with self._refine_lock:
+            if self._refine_executor is None:
+                self._refine_executor = ThreadPoolExecutor(
+                    max_workers=self.refine_workers, thread_name_prefix="analysis-refine"
+                )
+            return self._refine_executor
+
+    def analyze_process_fast(self, process_data: list[dict], refine: bool = True) -> tuple[pd.DataFrame, Future | None]:
+        """
+        Modo rápido: retorna de imediato as sugestões do catálogo (suggest) e, com refine,
+        agenda a análise completa pelo modelo em segundo plano.
+
+        O resultado refinado fica também nos caches de respostas, de modo que uma chamada
+        posterior a analyze_process com o mesmo formulário não chama o modelo de novo.
+
+        Returns:
+            tuple[pd.DataFrame, Future | None]: Sugestões e o Future do DataFrame de
+            analyze_process (None sem refine).
+        """
+        suggestions = self.suggest(process_data)
+        future = self._get_refine_executor().submit(self.analyze_process, process_data) if refine else None
+        return suggestions, future
+
+    def analyze_process_in_loop(self, process_data: list[dict], timeout: float = None) -> pd.DataFrame:
+        """Wrapper síncrono de aanalyze_process, executado no event loop compartilhado."""
+        return run_in_event_loop(self.aanalyze_process(process_data), timeout)
+
+    async def aanalyze_processes(self, processes: list[list[dict]], max_concurrency: int = 8) -> list:
+        """
+        Analisa vários processos concorrentemente no mesmo event loop.
+
+        Returns:
+            list: Um DataFrame por processo, ou a exceção levantada por aquele processo.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(process_data):
+            async with semaphore:
+                return await self.aanalyze_process(process_data)
+
+        return await asyncio.gather(*(run(process_data) for process_data in processes), return_exceptions=True)
     
+def _index_fingerprint(faiss_index_path: str) -> tuple:
+    """Impressão digital barata da versão publicada do índice em disco."""
+    if not os.path.exists(faiss_index_path):
+        raise FileNotFoundError(f"FAISS index not found at path: {faiss_index_path}")
+    from sharded_store import is_sharded_directory
+
+    if is_sharded_directory(faiss_index_path):
+        # Catálogos particionados são atualizados shard a shard por refresh_shards
+        return ("sharded",)
+    return index_fingerprint(faiss_index_path)
+
+
+def get_process_analyzer(
+    faiss_index_path: str = "process_index.faiss",
+    api_key: str = None,
+    **options,
+) -> ProcessAnalyzer:
+    """
+    Retorna um ProcessAnalyzer compartilhado pelo processo, criando-o apenas uma vez
+    por combinação de índice e configurações (options são repassadas ao ProcessAnalyzer,
+    ex.: model, temperature, max_tokens).
+
+    O índice é recarregado automaticamente quando os arquivos em disco mudam; em um
+    catálogo particionado, apenas os shards novos, removidos ou alterados.
+    Seguro para uso concorrente: apenas uma thread constrói cada analisador.
+    """
+    api_key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    key = (os.path.abspath(faiss_index_path), api_key_digest, tuple(sorted(options.items())))
+    fingerprint = _index_fingerprint(faiss_index_path)
+
+    with _REGISTRY_LOCK:
+        entry = _ANALYZER_REGISTRY.get(key)
+        if entry is None or entry[0] != fingerprint:
+            entry = None
+            key_lock = _ANALYZER_KEY_LOCKS.setdefault(key, threading.Lock())
+    if entry is not None:
+        # Catálogo particionado: shards alterados são recarregados individualmente
+        entry[1].refresh_shards()
+        return entry[1]
+
+    with key_lock:
+        # Outra thread pode ter construído o analisador enquanto esperávamos
+        with _REGISTRY_LOCK:
+            entry = _ANALYZER_REGISTRY.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
+        logger = logging.getLogger(__name__)
+        if entry is not None:
+            logger.info(f"Índice FAISS alterado em disco, recarregando: {faiss_index_path}")
+        analyzer = ProcessAnalyzer(faiss_index_path, api_key, **options)
+        with _REGISTRY_LOCK:
+            _ANALYZER_REGISTRY[key] = (fingerprint, analyzer)
+        return analyzer
+
+
+def warm_up(faiss_index_path: str = "process_index.faiss", api_key: str = None, **options) -> threading.Thread:
+    """
+    Constrói o analisador compartilhado em uma thread de fundo (imports pesados, carga do
+    índice e clientes da OpenAI), para que a primeira análise não pague esse custo.
+    Falhas são apenas registradas; a análise tentará de novo ao ser chamada.
+    """
+    def run():
+        start = time.perf_counter()
+        try:
+            get_process_analyzer(faiss_index_path, api_key, **options)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Pré-carregamento do analisador falhou: {e}")
+            return
+        logging.getLogger(__name__).info(f"Analisador pré-carregado em {time.perf_counter() - start:.2f}s.")
+
+    thread = threading.Thread(target=run, name="process-analyzer-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def clear_analyzer_registry() -> None:
+    """Descarta todos os analisadores em cache (útil em testes e benchmarks)."""
+    with _REGISTRY_LOCK:
+        _ANALYZER_REGISTRY.clear()
+        _ANALYZER_KEY_LOCKS.clear()
+
+
 def analyze_single_process(process_data: dict, faiss_index_path: str = "process_index.faiss", api_key: str = None) -> pd.DataFrame:
     """
     Função auxiliar para analisar um único processo de forma simplificada.
+
+    Reutiliza o analisador compartilhado do processo em vez de recarregar o índice
+    FAISS e recriar os clientes da OpenAI a cada chamada.
     """
-    analyzer = ProcessAnalyzer(faiss_index_path, api_key)
+    analyzer = get_process_analyzer(faiss_index_path, api_key)
     return analyzer.analyze_process(process_data)
+
+
+def suggest_single_process(process_data: dict, faiss_index_path: str = "process_index.faiss", api_key: str = None) -> pd.DataFrame:
+    """
+    Função auxiliar que retorna as sugestões curadas do catálogo, sem chamar o modelo.
+    """
+    analyzer = get_process_analyzer(faiss_index_path, api_key)
+    return analyzer.suggest(process_data)
+
+
+def stream_single_process(process_data: dict, faiss_index_path: str = "process_index.faiss", api_key: str = None) -> Iterator[dict]:
+    """
+    Função auxiliar que produz as oportunidades de melhoria à medida que são geradas.
+    """
+    analyzer = get_process_analyzer(faiss_index_path, api_key)
+    yield from analyzer.stream_process(process_data)
+
+
+async def aanalyze_single_process(process_data: dict, faiss_index_path: str = "process_index.faiss", api_key: str = None) -> pd.DataFrame:
+    """
+    Versão assíncrona de analyze_single_process.
+    Deve ser aguardada no event loop compartilhado (ver run_in_event_loop).
+    """
+    analyzer = get_process_analyzer(faiss_index_path, api_key)
+    return await analyzer.aanalyze_process(process_data)
@@ -0,0 +1,111 @@
+import functools
+
+import numpy as np
+from langchain_core.documents import Document
+
+from text_utils import analyze
+
+# Campos do formulário comparados com o texto dos documentos candidatos
+OVERLAP_FIELDS = ("causa", "atividade")
+
+
+@functools.lru_cache(maxsize=4096)
+def _document_terms(text: str) -> frozenset:
+    # Os mesmos documentos do catálogo voltam em muitas consultas; a análise do texto é cara
+    return frozenset(analyze(text))
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class Reranker:
+    """
+    Reordenação local dos candidatos recuperados, antes da chamada ao modelo.
+
+    A relevância de cada candidato combina o cosseno entre os vetores salvos no índice e
+    o embedding da consulta com a sobreposição de termos entre o documento e os campos
+    causa / atividade do formulário. Os top_n documentos são escolhidos por Maximal
+    Marginal Relevance (MMR), que penaliza candidatos muito parecidos com os já
+    escolhidos; o orçamento de tokens é aplicado depois, pelo ContextBuilder.
+    """
+
+    def __init__(self, fetch_k: int = 20, top_n: int = 4, mmr_lambda: float = 0.7,
+                 overlap_weight: float = 0.3, overlap_fields: tuple = OVERLAP_FIELDS):
+        """
+        Inicializa o Reranker.
+
+        Args:
+            fetch_k (int): Candidatos buscados no índice para reordenar.
+            top_n (int): Documentos mantidos.
+            mmr_lambda (float): Peso da relevância no MMR (1.0: sem penalidade de redundância).
+            overlap_weight (float): Peso da sobreposição de termos com o formulário na relevância.
+            overlap_fields (tuple): Campos do formulário usados na sobreposição.
+        """
+        if not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError(f"mmr_lambda deve estar entre 0 e 1: {mmr_lambda}")
+        if not 0.0 <= overlap_weight <= 1.0:
+            raise ValueError(f"overlap_weight deve estar entre 0 e 1: {overlap_weight}")
+        self.fetch_k = fetch_k
+        self.top_n = top_n
+        self.mmr_lambda = mmr_lambda
+        self.overlap_weight = overlap_weight
+        self.overlap_fields = overlap_fields
+
+    def _form_terms(self, process_data: list[dict] | None) -> set[str]:
+        if not process_data:
+            return set()
+        return {
+            term
+            for row in process_data
+            for field in self.overlap_fields
+            for term in analyze(row.get(field) or "")
+        }
+
+    def relevance(self, query_vector, vectors: np.ndarray, documents: list[Document],
+                  process_data: list[dict] = None) -> np.ndarray:
+        """Relevância de cada candidato: cosseno com a consulta e sobreposição com o formulário."""
+        query = _normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        cosine = _normalize_rows(vectors) @ query
+        form_terms = self._form_terms(process_data)
+        if not form_terms:
+            return cosine
+        overlap = np.asarray(
+            [len(form_terms & _document_terms(document.page_content)) / len(form_terms) for document in documents],
+            dtype=np.float32,
+        )
+        return (1 - self.overlap_weight) * cosine + self.overlap_weight * overlap
+
+    def rerank(self, query_vector, vectors, documents: list[Document],
+               process_data: list[dict] = None, top_n: int = None) -> list[Document]:
+        """
+        Retorna até top_n documentos, do mais para o menos relevante, escolhidos por MMR.
+
+        Args:
+            query_vector: Embedding da consulta.
+            vectors: Vetores dos candidatos (n, d), na ordem de documents.
+            documents (list[Document]): Candidatos recuperados.
+            process_data (list[dict], optional): Formulário, para a sobreposição de termos.
+            top_n (int, optional): Sobrescreve self.top_n.
+        """
+        top_n = min(top_n or self.top_n, len(documents))
+        if top_n == 0:
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        relevance = self.relevance(query_vector, vectors, documents, process_data)
+        normalized = _normalize_rows(vectors)
+
+        selected = [int(np.argmax(relevance))]
+        # Maior similaridade de cada candidato com algum documento já escolhido
+        redundancy = normalized @ normalized[selected[0]]
+        remaining = np.ones(len(documents), dtype=bool)
+        remaining[selected[0]] = False
+        while len(selected) < top_n:
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            scores[~remaining] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            remaining[best] = False
+            redundancy = np.maximum(redundancy, normalized @ normalized[best])
+        return [documents[position] for position in selected]
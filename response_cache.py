@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from text_utils import normalize_text
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def _normalize_value(value) -> str:
+    """Normaliza um campo do formulário como o índice lexical (text_utils.normalize_text)."""
+    if isinstance(value, float) and value != value:  # NaN
+        return ""
+    return normalize_text(value)
+
+
+def normalize_process_data(process_data) -> str:
+    """
+    Representação canônica da entrada de analyze_process.
+
+    Campos vazios são ignorados e as chaves são ordenadas, de modo que formulários
+    equivalentes produzem a mesma chave de cache.
+    """
+    if isinstance(process_data, dict):
+        process_data = [process_data]
+    rows = []
+    for row in process_data:
+        normalized = {
+            str(key): _normalize_value(value)
+            for key, value in row.items()
+        }
+        rows.append({key: value for key, value in sorted(normalized.items()) if value})
+    return json.dumps(rows, ensure_ascii=False, sort_keys=True)
+
+
+def make_cache_key(process_data, document_ids: list[str], model: str, prompt_version: str) -> str:
+    """Chave do cache: entrada normalizada, documentos recuperados, modelo e versão do prompt."""
+    payload = json.dumps(
+        {
+            "input": normalize_process_data(process_data),
+            "documents": list(document_ids),
+            "model": model,
+            "prompt_version": prompt_version,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class InMemoryResponseBackend:
+    """
+    Backend em memória com expiração (TTL) e descarte LRU, seguro para threads.
+
+    Os valores ficam serializados em JSON, como no SQLiteResponseBackend: cada get
+    devolve uma cópia nova, que o chamador pode alterar sem afetar o cache.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl_seconds: float) -> None:
+        value = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseBackend:
+    """Backend persistente em SQLite com expiração (TTL) e descarte LRU."""
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl_seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return count
+
+
+class ResponseCache:
+    """
+    Cache de resultados de analyze_process com backend plugável.
+
+    Os valores armazenados são a lista de dicionários retornada pelo modelo, de modo
+    que um acerto reconstrói exatamente o mesmo DataFrame. Os backends guardam uma
+    cópia serializada e devolvem uma cópia nova a cada acerto.
+    """
+
+    def __init__(self, backend=None, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        """
+        Inicializa o ResponseCache.
+
+        Args:
+            backend: Objeto com get(key) e set(key, value, ttl_seconds).
+                Padrão: InMemoryResponseBackend.
+            ttl_seconds (float): Validade de cada resultado em segundos.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend if backend is not None else InMemoryResponseBackend()
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> list[dict] | None:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, records: list[dict]) -> None:
+        self.backend.set(key, records, self.ttl_seconds)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+def build_response_cache(spec, ttl_seconds: float = DEFAULT_TTL_SECONDS) -> ResponseCache | None:
+    """
+    Cria o cache de respostas a partir de uma especificação simples.
+
+    Args:
+        spec: None (desativado), "memory", um caminho de arquivo SQLite ou um ResponseCache pronto.
+    """
+    if spec is None or isinstance(spec, ResponseCache):
+        return spec
+    if spec == "memory":
+        return ResponseCache(InMemoryResponseBackend(), ttl_seconds)
+    return ResponseCache(SQLiteResponseBackend(spec), ttl_seconds)
@@ -0,0 +1,226 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections.abc import Mapping
+
+import faiss
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+PICKLE_FILE = "index.pkl"
+STORAGE_FORMATS = ("pickle", "safe")
+
+# Limite de parâmetros por consulta do SQLite (999 nas versões antigas)
+_SQL_BATCH_SIZE = 900
+
+_SCHEMA = """
+CREATE TABLE documents (
+    position INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL UNIQUE,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+)
+"""
+
+
+def detect_storage_format(index_dir: str) -> str:
+    """Identifica o formato salvo em index_dir: "safe" (FAISS + SQLite) ou "pickle" (LangChain)."""
+    if os.path.exists(os.path.join(index_dir, DOCSTORE_FILE)):
+        return "safe"
+    if os.path.exists(os.path.join(index_dir, PICKLE_FILE)):
+        return "pickle"
+    raise FileNotFoundError(f"Nenhum docstore encontrado em {index_dir}")
+
+
+class _ReadOnlyConnection:
+    """Conexão SQLite somente leitura compartilhada entre threads."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def fetchone(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Docstore lido sob demanda: cada busca carrega apenas o documento pedido, em vez de
+    desserializar todos os documentos na inicialização.
+    """
+
+    def __init__(self, connection: _ReadOnlyConnection):
+        self._conn = connection
+
+    def search(self, search: str) -> Document | str:
+        row = self._conn.fetchone(
+            "SELECT page_content, metadata FROM documents WHERE doc_id = ?", (search,)
+        )
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def __len__(self) -> int:
+        return self._conn.fetchone("SELECT COUNT(*) FROM documents")[0]
+
+    def documents_at(self, positions) -> list[Document]:
+        """Documentos nas posições do índice FAISS, na ordem pedida, lidos em lotes."""
+        positions = [int(position) for position in positions]
+        wanted = list(dict.fromkeys(positions))
+        found = {}
+        for start in range(0, len(wanted), _SQL_BATCH_SIZE):
+            batch = wanted[start:start + _SQL_BATCH_SIZE]
+            rows = self._conn.fetchall(
+                "SELECT position, doc_id, page_content, metadata FROM documents "
+                f"WHERE position IN ({', '.join('?' * len(batch))})",
+                tuple(batch),
+            )
+            for position, doc_id, page_content, metadata in rows:
+                found[position] = Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata))
+        missing = [position for position in wanted if position not in found]
+        if missing:
+            raise ValueError(f"Posições ausentes do docstore: {missing[:10]}")
+        return [found[position] for position in positions]
+
+
+class SQLitePositionMap(Mapping):
+    """Mapeamento posição no índice FAISS -> doc_id, consultado sob demanda."""
+
+    def __init__(self, connection: _ReadOnlyConnection):
+        self._conn = connection
+
+    def __getitem__(self, position: int) -> str:
+        row = self._conn.fetchone("SELECT doc_id FROM documents WHERE position = ?", (int(position),))
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __len__(self) -> int:
+        return self._conn.fetchone("SELECT COUNT(*) FROM documents")[0]
+
+    def __iter__(self):
+        return (row[0] for row in self._conn.fetchall("SELECT position FROM documents ORDER BY position"))
+
+
+def save_vectorstore(vectorstore: FAISS, index_dir: str) -> None:
+    """
+    Salva o vector store no formato seguro: index.faiss (faiss.write_index) e os textos e
+    metadados em docstore.sqlite, sem pickle. Cada arquivo é escrito em um temporário e
+    substituído atomicamente, mas não o par: para que leitores nunca vejam um índice
+    novo com o docstore antigo, grave em uma nova versão (index_versions.new_version_dir)
+    e publique-a com publish_version, como faz create_embeddings.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    docstore_path = os.path.join(index_dir, DOCSTORE_FILE)
+
+    faiss.write_index(vectorstore.index, f"{index_path}.tmp")
+
+    tmp_docstore = f"{docstore_path}.tmp"
+    if os.path.exists(tmp_docstore):
+        os.remove(tmp_docstore)
+    conn = sqlite3.connect(tmp_docstore)
+    try:
+        conn.execute(_SCHEMA)
+        rows = []
+        for position in range(vectorstore.index.ntotal):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            document = vectorstore.docstore.search(doc_id)
+            if not isinstance(document, Document):
+                raise ValueError(f"Documento {doc_id} ausente do docstore.")
+            rows.append((position, doc_id, document.page_content, json.dumps(document.metadata, ensure_ascii=False)))
+        conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(f"{index_path}.tmp", index_path)
+    os.replace(tmp_docstore, docstore_path)
+    # Um index.pkl antigo não deve sobreviver ao lado do formato novo
+    pickle_path = os.path.join(index_dir, PICKLE_FILE)
+    if os.path.exists(pickle_path):
+        os.remove(pickle_path)
+
+
+def load_vectorstore(index_dir: str, embeddings, lazy: bool = True, mmap: bool = True) -> FAISS:
+    """
+    Carrega um índice salvo por save_vectorstore, sem desserialização de pickle.
+
+    Args:
+        index_dir (str): Diretório do índice.
+        embeddings: Modelo de embeddings das consultas.
+        lazy (bool): Se True, documentos e ids são lidos do SQLite apenas para os resultados
+            de cada busca. Se False, tudo é carregado em memória (necessário para atualizar
+            o índice com add/delete).
+        mmap (bool): Abre o índice com IO_FLAG_MMAP (somente leitura; nos índices IVF as
+            listas invertidas ficam mapeadas do disco em vez de copiadas para a memória).
+    """
+    logger = logging.getLogger(__name__)
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    docstore_path = os.path.join(index_dir, DOCSTORE_FILE)
+    if not (os.path.exists(index_path) and os.path.exists(docstore_path)):
+        raise FileNotFoundError(f"Índice seguro incompleto em {index_dir}")
+
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logger.warning(f"Índice não pôde ser mapeado em memória ({e}); lendo normalmente.")
+    if index is None:
+        index = faiss.read_index(index_path)
+
+    connection = _ReadOnlyConnection(docstore_path)
+    if lazy:
+        docstore = SQLiteDocstore(connection)
+        index_to_docstore_id = SQLitePositionMap(connection)
+    else:
+        rows = connection.fetchall(
+            "SELECT position, doc_id, page_content, metadata FROM documents ORDER BY position"
+        )
+        connection.close()
+        docstore = InMemoryDocstore({
+            doc_id: Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata))
+            for _, doc_id, page_content, metadata in rows
+        })
+        index_to_docstore_id = {position: doc_id for position, doc_id, _, _ in rows}
+
+    if index.ntotal != len(index_to_docstore_id):
+        raise ValueError(
+            f"Índice ({index.ntotal} vetores) e docstore ({len(index_to_docstore_id)} documentos) divergem em {index_dir}"
+        )
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def open_vectorstore(index_dir: str, embeddings) -> FAISS:
+    """
+    Abre um diretório de índice no formato em que foi salvo: o seguro (mmap + SQLite sob
+    demanda) ou, para índices antigos, o pickle do LangChain.
+    """
+    if detect_storage_format(index_dir) == "safe":
+        return load_vectorstore(index_dir, embeddings)
+    logging.getLogger(__name__).warning(
+        f"Índice {index_dir} no formato pickle; recrie-o com storage_format='safe' para evitar "
+        "a desserialização insegura."
+    )
+    return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
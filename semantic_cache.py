@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from response_cache import DEFAULT_TTL_SECONDS
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 1000
+
+# Vizinhos examinados por busca; entradas expiradas encontradas são removidas e a busca repetida
+_SEARCH_K = 8
+
+
+def _normalized(vector) -> np.ndarray:
+    import faiss
+
+    vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    faiss.normalize_L2(vector)
+    return vector
+
+
+class SemanticCache:
+    """
+    Cache de resultados por similaridade: entradas reformuladas, mas equivalentes,
+    reaproveitam o resultado de uma análise anterior.
+
+    As entradas anteriores ficam em índices FAISS próprios (IndexIDMap2 sobre
+    IndexFlatIP com vetores normalizados, ou seja, similaridade de cosseno), um por
+    segmento e chave exata (modelo, versão do prompt, índice, transcrição): a busca só
+    compara entradas compatíveis, e entradas de outros segmentos não afetam a taxa de
+    acertos. Um acerto exige similaridade >= threshold. Descarte por TTL e LRU; com path,
+    as entradas persistem em SQLite e os índices são reconstruídos na abertura.
+    """
+
+    def __init__(self, path: str = None, threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        """
+        Inicializa o SemanticCache.
+
+        Args:
+            path (str, optional): Arquivo SQLite para persistência. None mantém só em memória.
+            threshold (float): Similaridade de cosseno mínima para um acerto.
+            max_entries (int): Número máximo de entradas (descarte LRU).
+            ttl_seconds (float): Validade de cada entrada em segundos.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # (segmento, chave exata) -> índice FAISS das entradas compatíveis
+        self._indexes = {}
+        self._dimension = None
+        # id -> (segmento, chave exata, expira em, registros em JSON), em ordem de uso (LRU);
+        # cada acerto devolve uma cópia nova, que o chamador pode alterar
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY,
+                segment TEXT NOT NULL,
+                exact_key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                records TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("DELETE FROM semantic_cache WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, segment, exact_key, vector, records, expires_at FROM semantic_cache ORDER BY last_access"
+        ).fetchall()
+        for entry_id, segment, exact_key, vector, records, expires_at in rows:
+            self._add_vector(entry_id, (segment, exact_key), np.frombuffer(vector, dtype=np.float32).reshape(1, -1))
+            self._entries[entry_id] = (segment, exact_key, expires_at, records)
+            self._next_id = max(self._next_id, entry_id + 1)
+        if rows:
+            self.logger.info(f"Cache semântico carregado de {path}: {len(rows)} entradas.")
+
+    def _add_vector(self, entry_id: int, partition: tuple[str, str], vector: np.ndarray) -> None:
+        import faiss
+
+        if self._dimension is not None and self._dimension != vector.shape[1]:
+            # Outro modelo de embeddings: as entradas antigas não são comparáveis
+            self._remove(list(self._entries))
+        self._dimension = vector.shape[1]
+        index = self._indexes.get(partition)
+        if index is None:
+            index = self._indexes[partition] = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+        index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+
+    def _remove(self, entry_ids: list[int]) -> None:
+        if not entry_ids:
+            return
+        by_partition = {}
+        for entry_id in entry_ids:
+            entry = self._entries.pop(entry_id, None)
+            if entry is not None:
+                by_partition.setdefault((entry[0], entry[1]), []).append(entry_id)
+        for partition, ids in by_partition.items():
+            index = self._indexes[partition]
+            index.remove_ids(np.asarray(ids, dtype=np.int64))
+            if index.ntotal == 0:
+                del self._indexes[partition]
+        if self._conn is not None:
+            self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(i,) for i in entry_ids])
+            self._conn.commit()
+
+    def get(self, vector, segment: str, exact_key: str) -> tuple[list[dict] | None, float]:
+        """
+        Procura um resultado anterior equivalente.
+
+        Returns:
+            tuple: (registros ou None, similaridade do melhor vizinho compatível ou 0.0).
+        """
+        query = _normalized(vector)
+        now = time.time()
+        with self._lock:
+            found = None
+            best = 0.0
+            while found is None:
+                index = self._indexes.get((segment, exact_key))
+                if index is None or index.d != query.shape[1]:
+                    break
+                similarities, ids = index.search(query, min(_SEARCH_K, index.ntotal))
+                # Todas as entradas do índice são compatíveis: a primeira não expirada é a melhor
+                expired = []
+                nearest = None
+                for similarity, entry_id in zip(similarities[0], ids[0]):
+                    entry = self._entries.get(int(entry_id))
+                    if entry is not None and entry[2] < now:
+                        expired.append(int(entry_id))
+                    elif entry is not None:
+                        nearest = (float(similarity), int(entry_id), entry[3])
+                        break
+                self._remove(expired)
+                if nearest is not None:
+                    best = nearest[0]
+                    if best >= self.threshold:
+                        found = nearest[1:]
+                    break
+                if not expired:
+                    break
+            if found is None:
+                self.misses += 1
+                return None, best
+            entry_id, records = found
+            self._entries.move_to_end(entry_id)
+            if self._conn is not None:
+                self._conn.execute("UPDATE semantic_cache SET last_access = ? WHERE id = ?", (now, entry_id))
+                self._conn.commit()
+            self.hits += 1
+            return json.loads(records), best
+
+    def set(self, vector, segment: str, exact_key: str, records: list[dict]) -> None:
+        query = _normalized(vector)
+        now = time.time()
+        records = json.dumps(records, ensure_ascii=False)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._add_vector(entry_id, (segment, exact_key), query)
+            self._entries[entry_id] = (segment, exact_key, now + self.ttl_seconds, records)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (entry_id, segment, exact_key, query.tobytes(),
+                     records, now + self.ttl_seconds, now),
+                )
+                self._conn.commit()
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def build_semantic_cache(spec, threshold: float = DEFAULT_THRESHOLD) -> SemanticCache | None:
+    """
+    Cria o cache semântico a partir de uma especificação simples.
+
+    Args:
+        spec: None (desativado), "memory", um caminho de arquivo SQLite ou um SemanticCache pronto.
+    """
+    if spec is None or isinstance(spec, SemanticCache):
+        return spec
+    if spec == "memory":
+        return SemanticCache(threshold=threshold)
+    return SemanticCache(spec, threshold=threshold)
@@ -0,0 +1,215 @@
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from output_parser import RESULT_FIELDS
+
+# Uma oportunidade: (oportunidade_melhoria, tarefa, criterio_aceitacao)
+Record = tuple[str, str, str]
+
+
+def _cell(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value)
+
+
+def to_records(rows) -> tuple[Record, ...]:
+    """
+    Converte resultados (DataFrame, lista de dicts ou de sequências) em tuplas imutáveis
+    de RESULT_FIELDS, na ordem das colunas do DataFrame.
+    """
+    if isinstance(rows, pd.DataFrame):
+        frame = rows.iloc[:, :len(RESULT_FIELDS)]
+        return tuple(
+            tuple(_cell(value) for value in row) + ("",) * (len(RESULT_FIELDS) - len(row))
+            for row in frame.itertuples(index=False, name=None)
+        )
+    records = []
+    for row in rows:
+        values = [row.get(field) for field in RESULT_FIELDS] if isinstance(row, dict) else list(row)
+        values = (values + [""] * len(RESULT_FIELDS))[:len(RESULT_FIELDS)]
+        records.append(tuple(_cell(value) for value in values))
+    return tuple(records)
+
+
+def to_frame(records: tuple[Record, ...], columns=RESULT_FIELDS) -> pd.DataFrame:
+    """DataFrame (criado sob demanda para exibição) a partir das tuplas armazenadas."""
+    return pd.DataFrame(list(records), columns=list(columns))
+
+
+def content_key(records: tuple[Record, ...]) -> str:
+    return hashlib.sha256(json.dumps(records, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _size_of(records: tuple[Record, ...]) -> int:
+    """Estimativa dos bytes ocupados pelas tuplas e strings."""
+    return sys.getsizeof(records) + sum(
+        sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record) for record in records
+    )
+
+
+class SessionStoreFullError(ValueError):
+    """O conteúdo não cabe no limite de memória por sessão."""
+
+
+class SessionStore:
+    """
+    Armazenamento compartilhado e limitado dos resultados de todas as sessões do app.
+
+    Os resultados ficam como tuplas imutáveis endereçadas pelo hash do conteúdo, de modo
+    que sessões com o mesmo resultado compartilham uma única cópia; cada sessão guarda
+    apenas as chaves dos seus slots (resultados, seleção, planilha final). O total é
+    limitado por max_bytes (o conteúdo menos usado recentemente é descartado primeiro),
+    cada sessão por max_session_bytes, e sessões ociosas há mais de session_ttl segundos
+    são expiradas. Conteúdo que deixa de ser referenciado é liberado na hora.
+
+    Um conteúdo descartado pelo limite global continua referenciado pela sessão até o
+    próximo get, que o retorna como None; o app pede então uma nova busca.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_session_bytes: int = 1024 * 1024,
+                 session_ttl: float = 3600, clock=time.monotonic):
+        """
+        Inicializa o SessionStore.
+
+        Args:
+            max_bytes (int): Limite total estimado do conteúdo armazenado.
+            max_session_bytes (int): Limite estimado do conteúdo referenciado por uma sessão.
+            session_ttl (float): Segundos sem acesso após os quais a sessão é descartada.
+            clock: Função de tempo (monotônica), substituível em testes.
+        """
+        if max_session_bytes > max_bytes:
+            raise ValueError(f"max_session_bytes ({max_session_bytes}) maior que max_bytes ({max_bytes})")
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.max_session_bytes = max_session_bytes
+        self.session_ttl = session_ttl
+        self._clock = clock
+        # chave do conteúdo -> (tuplas, bytes), da menos para a mais usada recentemente
+        self._entries = OrderedDict()
+        # chave do conteúdo -> número de slots que a referenciam
+        self._refs = {}
+        # sessão -> {"last_seen": instante do último acesso, "slots": {slot: chave}}
+        self._sessions = {}
+        self._bytes = 0
+        self._evictions = 0
+        self._expired_sessions = 0
+        self._next_expiry = 0.0
+        self._lock = threading.Lock()
+
+    def _drop_entry(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _release(self, key: str) -> None:
+        # Conteúdo que nenhuma sessão referencia sai do armazenamento imediatamente
+        self._refs[key] -= 1
+        if self._refs[key] == 0:
+            del self._refs[key]
+            self._drop_entry(key)
+
+    def _session_bytes(self, slots: dict) -> int:
+        return sum(self._entries[key][1] for key in set(slots.values()) if key in self._entries)
+
+    def _expire(self, now: float) -> None:
+        # Varredura das sessões no máximo uma vez a cada 1/10 do TTL
+        if now < self._next_expiry:
+            return
+        self._next_expiry = now + self.session_ttl / 10
+        idle = [session_id for session_id, session in self._sessions.items()
+                if now - session["last_seen"] > self.session_ttl]
+        for session_id in idle:
+            for key in self._sessions.pop(session_id)["slots"].values():
+                self._release(key)
+        if idle:
+            self._expired_sessions += len(idle)
+            self.logger.info(f"{len(idle)} sessões ociosas expiradas.")
+
+    def _evict(self) -> None:
+        # Acima do limite global, descarta o conteúdo menos usado recentemente; as sessões
+        # que o referenciavam passam a recebê-lo como ausente em get
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop_entry(next(iter(self._entries)))
+            self._evictions += 1
+
+    def _touch(self, session_id: str, now: float) -> dict:
+        self._expire(now)
+        session = self._sessions.setdefault(session_id, {"last_seen": now, "slots": {}})
+        session["last_seen"] = now
+        return session
+
+    def put(self, session_id: str, slot: str, rows) -> str:
+        """
+        Armazena rows (ver to_records) no slot da sessão, substituindo o conteúdo anterior.
+
+        Returns:
+            str: Chave do conteúdo.
+
+        Raises:
+            SessionStoreFullError: Se a sessão passar de max_session_bytes.
+        """
+        records = to_records(rows)
+        key = content_key(records)
+        with self._lock:
+            now = self._clock()
+            session = self._touch(session_id, now)
+            entry = self._entries.get(key)
+            size = entry[1] if entry is not None else _size_of(records)
+            other_slots = {name: value for name, value in session["slots"].items() if name != slot}
+            session_bytes = self._session_bytes(other_slots) + (0 if key in other_slots.values() else size)
+            if session_bytes > self.max_session_bytes:
+                raise SessionStoreFullError(
+                    f"Resultados da sessão excedem o limite de {self.max_session_bytes} bytes ({session_bytes})."
+                )
+            if entry is None:
+                self._entries[key] = (records, size)
+                self._bytes += size
+            self._entries.move_to_end(key)
+            previous = session["slots"].get(slot)
+            self._refs[key] = self._refs.get(key, 0) + 1
+            session["slots"][slot] = key
+            if previous is not None:
+                self._release(previous)
+            self._evict()
+        return key
+
+    def get(self, session_id: str, slot: str) -> tuple[Record, ...] | None:
+        """Conteúdo do slot da sessão; None se nunca gravado, expirado ou descartado."""
+        with self._lock:
+            session = self._touch(session_id, self._clock())
+            key = session["slots"].get(slot)
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                if key is not None:
+                    # Descartado pelo limite global: a sessão deixa de referenciá-lo
+                    del session["slots"][slot]
+                    self._release(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def discard(self, session_id: str, slot: str) -> None:
+        with self._lock:
+            session = self._touch(session_id, self._clock())
+            key = session["slots"].pop(slot, None)
+            if key is not None:
+                self._release(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "expired_sessions": self._expired_sessions,
+            }
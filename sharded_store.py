@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from pydantic import Field
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+
+from faiss_index import IndexConfig, apply_search_params
+from safe_index_store import INDEX_FILE, open_vectorstore
+from index_versions import index_fingerprint, resolve_index_dir
+
+SHARDS_FILE = "shards.json"
+SHARDS_VERSION = 1
+
+
+def is_sharded_directory(path: str) -> bool:
+    """True se path contém um catálogo particionado (shards.json) em vez de um único índice."""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, SHARDS_FILE))
+
+
+def discover_shards(root: str) -> dict[str, str]:
+    """
+    Shards de um diretório: os listados em shards.json ou, sem ele, os subdiretórios
+    que contêm um index.faiss.
+
+    Returns:
+        dict[str, str]: nome do shard -> diretório do índice.
+    """
+    manifest_path = os.path.join(root, SHARDS_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SHARDS_VERSION:
+            raise ValueError(f"Versão de {SHARDS_FILE} não suportada em {root}: {manifest.get('version')}")
+        return {name: os.path.join(root, name) for name in sorted(manifest["shards"])}
+    return {
+        name: os.path.join(root, name)
+        for name in sorted(os.listdir(root))
+        if os.path.isdir(os.path.join(root, name))
+        and os.path.exists(os.path.join(resolve_index_dir(os.path.join(root, name)), INDEX_FILE))
+    }
+
+
+def write_shards_manifest(root: str, shards: dict, partition_by: str = None) -> None:
+    """Grava shards.json (nome -> informações do shard) de forma atômica."""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, SHARDS_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": SHARDS_VERSION, "partition_by": partition_by, "shards": shards},
+            f, ensure_ascii=False, indent=2,
+        )
+    os.replace(f"{path}.tmp", path)
+
+
+class ShardedRetriever(BaseRetriever):
+    """Retriever LangChain (busca por similaridade) sobre um ShardedVectorStore."""
+
+    vectorstore: Any
+    search_kwargs: dict = Field(default_factory=dict)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return self.vectorstore.similarity_search(query, **self.search_kwargs)
+
+
+class ShardedVectorStore:
+    """
+    Vector store somente leitura sobre vários índices FAISS (um por catálogo: cliente,
+    ramo...). Expõe apenas a interface de busca usada pelo ProcessAnalyzer; os shards
+    são criados e atualizados por create_embeddings.py.
+
+    Cada consulta é executada em todos os shards em paralelo, em um pool de threads (o
+    FAISS libera o GIL durante a busca), e os k melhores resultados são combinados pela
+    distância L2. Shards podem ser adicionados, removidos ou recarregados sem reiniciar:
+    o conjunto de shards é substituído por uma cópia, de modo que consultas em andamento
+    continuam usando a versão anterior.
+    """
+
+    def __init__(self, embeddings, shards: dict = None, root: str = None, max_workers: int = None,
+                 nprobe: int = None, ef_search: int = None, refresh_interval: float = 5.0):
+        """
+        Inicializa o ShardedVectorStore.
+
+        Args:
+            embeddings: Modelo de embeddings das consultas (o mesmo usado nos shards).
+            shards (dict, optional): nome -> diretório do índice, carregados na criação.
+            root (str, optional): Diretório com os shards, relido por refresh().
+            max_workers (int, optional): Threads da busca paralela. Padrão: número de shards
+                (mínimo 4).
+            nprobe (int, optional): Sobrescreve o nprobe salvo nos shards IVF.
+            ef_search (int, optional): Sobrescreve o efSearch salvo nos shards HNSW.
+            refresh_interval (float): Intervalo mínimo, em segundos, entre duas varreduras
+                do diretório raiz por refresh() (chamado a cada get_process_analyzer).
+        """
+        self.logger = logging.getLogger(__name__)
+        self.embedding_function = embeddings
+        self.root = root
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.max_workers = max_workers
+        self.refresh_interval = refresh_interval
+        self._last_refresh = None
+        # nome -> (diretório, impressão digital, FAISS); substituído por inteiro a cada mudança
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._executor = None
+        self._executor_workers = 0
+        for name, shard_dir in (shards or {}).items():
+            self.add_shard(name, shard_dir)
+
+    @classmethod
+    def from_directory(cls, root: str, embeddings, max_workers: int = None,
+                       nprobe: int = None, ef_search: int = None,
+                       refresh_interval: float = 5.0) -> "ShardedVectorStore":
+        """Carrega todos os shards de um diretório (ver discover_shards)."""
+        if not os.path.isdir(root):
+            raise FileNotFoundError(f"Diretório de shards não encontrado: {root}")
+        store = cls(embeddings, root=root, max_workers=max_workers, nprobe=nprobe, ef_search=ef_search,
+                    refresh_interval=refresh_interval)
+        store.refresh(force=True)
+        return store
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    @property
+    def shard_names(self) -> list[str]:
+        return sorted(self._shards)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(vectorstore.index.ntotal for _, _, vectorstore in self._shards.values())
+
+    @property
+    def version(self) -> str:
+        """Identifica o conjunto de shards carregado (muda quando algum shard muda)."""
+        state = sorted((name, fingerprint) for name, (_, fingerprint, _) in self._shards.items())
+        return hashlib.sha256(repr(state).encode("utf-8")).hexdigest()[:16]
+
+    def _open_shard(self, shard_dir: str) -> tuple[tuple, FAISS]:
+        fingerprint = index_fingerprint(shard_dir)
+        index_dir = resolve_index_dir(shard_dir)
+        vectorstore = open_vectorstore(index_dir, self.embedding_function)
+        config = IndexConfig.load(index_dir) or IndexConfig()
+        apply_search_params(vectorstore.index, config, self.nprobe, self.ef_search)
+        return fingerprint, vectorstore
+
+    def add_shard(self, name: str, shard_dir: str) -> None:
+        """Carrega (ou recarrega) o shard name a partir de shard_dir."""
+        if not os.path.exists(shard_dir):
+            raise FileNotFoundError(f"Shard {name} não encontrado: {shard_dir}")
+        # A carga acontece fora do lock; as consultas seguem com os shards atuais
+        fingerprint, vectorstore = self._open_shard(shard_dir)
+        with self._lock:
+            self._shards = {**self._shards, name: (shard_dir, fingerprint, vectorstore)}
+        self.logger.info(f"Shard {name} carregado de {shard_dir}: {vectorstore.index.ntotal} documentos.")
+
+    def remove_shard(self, name: str) -> None:
+        with self._lock:
+            if name not in self._shards:
+                raise ValueError(f"Shard não carregado: {name}")
+            self._shards = {key: value for key, value in self._shards.items() if key != name}
+        self.logger.info(f"Shard {name} removido.")
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Sincroniza com o diretório raiz: carrega shards novos, remove os ausentes e
+        recarrega apenas os que mudaram em disco. Sem force, o diretório é varrido no
+        máximo uma vez a cada refresh_interval segundos.
+
+        Returns:
+            bool: True se algum shard mudou.
+        """
+        if self.root is None:
+            return False
+        now = time.monotonic()
+        if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+            return False
+        with self._refresh_lock:
+            # Outra thread pode ter acabado de varrer o diretório
+            if not force and self._last_refresh is not None and now < self._last_refresh:
+                return False
+            self._last_refresh = time.monotonic()
+            found = discover_shards(self.root)
+            current = self._shards
+            changed = False
+            for name in set(current) - set(found):
+                self.remove_shard(name)
+                changed = True
+            for name, shard_dir in found.items():
+                entry = current.get(name)
+                if entry is None or entry[1] != index_fingerprint(shard_dir):
+                    self.add_shard(name, shard_dir)
+                    changed = True
+        if not self._shards:
+            raise FileNotFoundError(f"Nenhum shard encontrado em {self.root}")
+        return changed
+
+    def _submit_all(self, fn, items) -> list:
+        """Submete fn(item) para cada item ao pool, recriado quando o número de shards muda."""
+        # Submissão e troca do pool sob o mesmo lock: nada é submetido a um pool encerrado
+        with self._lock:
+            workers = self.max_workers or max(4, len(self._shards))
+            if self._executor is not None and self._executor_workers != workers:
+                # Buscas já submetidas terminam no pool anterior
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-search")
+                self._executor_workers = workers
+            return [self._executor.submit(fn, item) for item in items]
+
+    def similarity_search_with_score_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        """
+        Busca os k vizinhos em cada shard em paralelo e retorna os k melhores no total,
+        com o nome do shard em metadata["shard"].
+        """
+        shards = self._shards
+        if not shards:
+            return []
+
+        def search(item):
+            name, (_, _, vectorstore) = item
+            return name, vectorstore.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+
+        if len(shards) == 1:
+            results = [search(next(iter(shards.items())))]
+        else:
+            results = [future.result() for future in self._submit_all(search, shards.items())]
+
+        merged = [
+            (Document(id=document.id, page_content=document.page_content, metadata={**document.metadata, "shard": name}), score)
+            for name, hits in results
+            for document, score in hits
+        ]
+        # Todos os tipos de índice de faiss_index usam distância L2: menor é melhor
+        merged.sort(key=lambda hit: hit[1])
+        return merged[:k]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def as_retriever(self, **kwargs) -> ShardedRetriever:
+        return ShardedRetriever(vectorstore=self, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,238 @@
+import os
+import json
+
+import numpy as np
+from langchain_core.documents import Document
+
+from text_utils import normalize_text
+from faiss_index import IndexConfig, enable_reconstruction
+
+SUGGESTION_INDEX_FILE = "suggestion_index.json"
+SUGGESTION_CENTROIDS_FILE = "suggestion_centroids.npy"
+SUGGESTION_INDEX_VERSION = 1
+
+# Um grupo por segmento de mercado e processo
+CLUSTER_FIELDS = ("ramo_empresa", "nome_processo")
+
+
+def _clean(value) -> str:
+    if value is None:
+        return ""
+    text = str(value).strip()
+    if text.lower() == "nan":
+        return ""
+    return text.strip('"').strip()
+
+
+def curated_record(metadata: dict) -> dict | None:
+    """
+    Sugestão curada de uma linha do catálogo no formato da análise: a desconexão (GAP)
+    como oportunidade, a melhoria/solução como tarefa e os direcionadores (ganhos
+    esperados) como critério de aceitação. None se a linha não tiver melhoria.
+    """
+    tarefa = _clean(metadata.get("melhoria"))
+    if not tarefa:
+        return None
+    return {
+        "oportunidade_melhoria": _clean(metadata.get("solucao_gap")) or tarefa,
+        "tarefa": tarefa,
+        "criterio_aceitacao": _clean(metadata.get("direcionadores")),
+    }
+
+
+def _cluster_key(data: dict) -> tuple[str, str]:
+    return tuple(normalize_text(data.get(field)) for field in CLUSTER_FIELDS)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class SuggestionIndex:
+    """
+    Sugestões curadas pré-calculadas por segmento e processo, para respostas imediatas
+    sem chamada ao modelo.
+
+    Cada grupo (ramo_empresa, nome_processo) guarda as melhorias mais recorrentes do
+    catálogo e o centróide dos embeddings das suas linhas. A consulta usa o grupo do
+    mesmo segmento e processo quando existe e completa (ou substitui) com os grupos de
+    centróide mais próximo do embedding do formulário, priorizando o mesmo segmento.
+    """
+
+    def __init__(self, clusters: list[dict], centroids: np.ndarray | None, ntotal: int):
+        self.clusters = clusters
+        self.centroids = centroids
+        self.ntotal = ntotal
+        self._keys = {_cluster_key(cluster): position for position, cluster in enumerate(clusters)}
+        self._segments = np.asarray([normalize_text(cluster["ramo_empresa"]) for cluster in clusters], dtype=object)
+
+    @classmethod
+    def from_records(cls, metadatas, vectors: np.ndarray = None, per_cluster: int = 5) -> "SuggestionIndex":
+        """
+        Constrói o índice a partir dos metadados (e, opcionalmente, dos vetores) na ordem
+        das posições do índice FAISS.
+
+        Args:
+            metadatas: Metadados de cada documento.
+            vectors (np.ndarray, optional): Vetores (n, d) dos documentos. Sem eles, a
+                consulta usa apenas a correspondência exata de segmento e processo.
+            per_cluster (int): Sugestões mantidas por grupo.
+        """
+        normalized = None if vectors is None else _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        groups = {}
+        ntotal = 0
+        for position, metadata in enumerate(metadatas):
+            ntotal += 1
+            key = _cluster_key(metadata)
+            if not any(key):
+                continue
+            group = groups.setdefault(key, {
+                "ramo_empresa": _clean(metadata.get("ramo_empresa")),
+                "nome_processo": _clean(metadata.get("nome_processo")),
+                "positions": [],
+                "records": {},
+            })
+            group["positions"].append(position)
+            record = curated_record(metadata)
+            if record is not None:
+                # Melhorias repetidas no grupo contam como uma só, com a frequência como peso
+                entry = group["records"].setdefault(normalize_text(record["tarefa"]), [record, 0, []])
+                entry[1] += 1
+                entry[2].append(position)
+
+        clusters, centroids = [], []
+        for group in groups.values():
+            similarity = {}
+            if normalized is not None:
+                centroid = normalized[group["positions"]].mean(axis=0)
+                centroid /= np.linalg.norm(centroid) or 1
+                centroids.append(centroid)
+                similarity = {
+                    key: float(np.max(normalized[positions] @ centroid))
+                    for key, (_, _, positions) in group["records"].items()
+                }
+            # Mais recorrentes primeiro; no empate, as mais próximas do centro do grupo
+            ranked = sorted(
+                group["records"].items(),
+                key=lambda item: (-item[1][1], -similarity.get(item[0], 0.0)),
+            )
+            clusters.append({
+                "ramo_empresa": group["ramo_empresa"],
+                "nome_processo": group["nome_processo"],
+                "size": len(group["positions"]),
+                "suggestions": [record for _, (record, _, _) in ranked[:per_cluster]],
+            })
+        return cls(clusters, np.asarray(centroids, dtype=np.float32) if centroids else None, ntotal)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, index_config: IndexConfig = None, per_cluster: int = 5) -> "SuggestionIndex":
+        """Constrói o índice a partir dos documentos e dos vetores salvos no vector store."""
+        index = vectorstore.index
+        vectors = None
+        if index.ntotal and enable_reconstruction(index, index_config or IndexConfig()):
+            vectors = index.reconstruct_n(0, index.ntotal)
+
+        def metadatas():
+            for position in range(index.ntotal):
+                document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+                yield document.metadata if isinstance(document, Document) else {}
+        return cls.from_records(metadatas(), vectors, per_cluster)
+
+    def save(self, index_dir: str) -> None:
+        data = {
+            "version": SUGGESTION_INDEX_VERSION,
+            "ntotal": self.ntotal,
+            "clusters": self.clusters,
+        }
+        path = os.path.join(index_dir, SUGGESTION_INDEX_FILE)
+        centroids_path = os.path.join(index_dir, SUGGESTION_CENTROIDS_FILE)
+        if self.centroids is not None:
+            with open(f"{centroids_path}.tmp", "wb") as f:
+                np.save(f, self.centroids)
+            os.replace(f"{centroids_path}.tmp", centroids_path)
+        elif os.path.exists(centroids_path):
+            os.remove(centroids_path)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "SuggestionIndex | None":
+        """Lê o índice salvo; None se ausente ou de versão incompatível."""
+        path = os.path.join(index_dir, SUGGESTION_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SUGGESTION_INDEX_VERSION:
+            return None
+        centroids_path = os.path.join(index_dir, SUGGESTION_CENTROIDS_FILE)
+        centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        if centroids is not None and len(centroids) != len(data["clusters"]):
+            return None
+        return cls(data["clusters"], centroids, data["ntotal"])
+
+    def has_cluster(self, process_data: dict) -> bool:
+        """True se existe um grupo com o mesmo segmento e processo do formulário."""
+        return _cluster_key(process_data) in self._keys
+
+    def lookup(self, process_data: dict, query_vector=None, limit: int = 5) -> tuple[list[dict], dict]:
+        """
+        Sugestões para o formulário, sem chamada ao modelo.
+
+        Args:
+            process_data (dict): Campos do formulário (ramo_empresa, nome_processo...).
+            query_vector (optional): Embedding do formulário; ordena os demais grupos por
+                proximidade do centróide. Sem ele, os grupos do mesmo segmento são usados
+                em ordem de tamanho.
+            limit (int): Máximo de sugestões.
+
+        Returns:
+            tuple[list[dict], dict]: Sugestões e informações da correspondência
+            ({"match": "exact" | "nearest" | None, "similarity", "clusters"}).
+        """
+        info = {"match": None, "similarity": 0.0, "clusters": []}
+        if not self.clusters:
+            return [], info
+        segment = normalize_text(process_data.get("ramo_empresa"))
+        scores = None
+        if query_vector is not None and self.centroids is not None:
+            query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+            if query.shape[0] == self.centroids.shape[1]:
+                scores = self.centroids @ (query / (np.linalg.norm(query) or 1))
+        same_segment = (self._segments == segment) if segment else np.zeros(len(self.clusters), dtype=bool)
+        if scores is None:
+            # Sem embedding, grupos de outros segmentos não têm como ser comparados
+            sizes = np.asarray([cluster["size"] for cluster in self.clusters])
+            order = [int(p) for p in np.lexsort((-sizes, ~same_segment)) if same_segment[p]]
+        else:
+            order = [int(p) for p in np.lexsort((-scores, ~same_segment))]
+
+        exact = self._keys.get(_cluster_key(process_data))
+        if exact is not None:
+            order = [exact] + [position for position in order if position != exact]
+            info["match"] = "exact"
+        elif order:
+            info["match"] = "nearest"
+            if scores is not None:
+                info["similarity"] = round(float(scores[order[0]]), 4)
+
+        suggestions, seen = [], set()
+        for position in order:
+            if len(suggestions) >= limit:
+                break
+            cluster = self.clusters[position]
+            added = False
+            for record in cluster["suggestions"]:
+                key = normalize_text(record["tarefa"])
+                if key in seen or len(suggestions) >= limit:
+                    continue
+                seen.add(key)
+                suggestions.append(record)
+                added = True
+            if added:
+                info["clusters"].append(f"{cluster['ramo_empresa']} / {cluster['nome_processo']}")
+        if not suggestions:
+            info["match"] = None
+        return suggestions, info
@@ -0,0 +1,96 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import create_embeddings
+import process_analyser
+from create_embeddings import ProcessEmbeddingsCreator
+from faiss_index import IndexConfig
+from process_analyser import ProcessAnalyzer
+
+
+class HashEmbeddings(Embeddings):
+    """Embeddings determinísticos (hash do texto), sem chamadas à API."""
+
+    model = "hash-embeddings"
+
+    def _vector(self, text: str) -> list[float]:
+        rng = np.random.default_rng(int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16))
+        vector = rng.standard_normal(32).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _catalog(rows) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "ramo_empresa": [f"Ramo {i % 3}" for i in rows],
+        "nome_processo": [f"Processo {i % 7}" for i in rows],
+        "melhoria": [f"Melhoria {i}" for i in rows],
+    })
+    df["combined_text"] = [
+        f"ramo_empresa: {r} nome_processo: {p} melhoria: {m}"
+        for r, p, m in zip(df["ramo_empresa"], df["nome_processo"], df["melhoria"])
+    ]
+    return df
+
+
+def _build(index_dir, df, index_type="flat", storage_format="safe", incremental=False):
+    creator = ProcessEmbeddingsCreator(
+        "unused.xlsx", str(index_dir), api_key="test",
+        incremental=incremental,
+        embedding_cache_path=None,
+        index_config=IndexConfig(index_type=index_type, nlist=4),
+        storage_format=storage_format,
+        dataframe=df,
+    )
+    creator.save_embeddings()
+    return creator
+
+
+@pytest.fixture
+def catalog():
+    """Catálogo sintético com as linhas pedidas (ramo, processo e melhoria por linha)."""
+    return _catalog
+
+
+@pytest.fixture
+def build_index(monkeypatch):
+    """Constrói um índice com create_embeddings usando HashEmbeddings."""
+    monkeypatch.setattr(ProcessEmbeddingsCreator, "_initialize_embeddings", lambda self: HashEmbeddings())
+    monkeypatch.setattr(create_embeddings, "load_dotenv", lambda: None)
+    return _build
+
+
+@pytest.fixture
+def hash_embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def make_analyzer(tmp_path, monkeypatch, build_index, hash_embeddings):
+    """
+    Fábrica de ProcessAnalyzer sobre um índice sintético de 50 linhas, com o modelo de
+    chat simulado respondendo responses em ordem.
+    """
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(process_analyser, "load_dotenv", lambda: None)
+    monkeypatch.setattr(ProcessAnalyzer, "_initialize_embeddings", lambda self: hash_embeddings)
+    index_dir = tmp_path / "index"
+    build_index(index_dir, _catalog(range(50)))
+
+    def factory(responses=("[]",), **options):
+        monkeypatch.setattr(ProcessAnalyzer, "_initialize_llm", lambda self: FakeListChatModel(responses=list(responses)))
+        options = {"embedding_cache_path": None, "response_cache": None, "suggestions": False, **options}
+        return ProcessAnalyzer(str(index_dir), **options)
+
+    factory.index_dir = index_dir
+    return factory
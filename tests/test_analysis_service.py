@@ -0,0 +1,40 @@
+import pytest
+
+from analysis_service import AnalysisService, AnalysisServiceClient, ServiceBusyError, serve
+
+
+def _process(i: int) -> list[dict]:
+    return [{"ramo_empresa": "Varejo", "nome_processo": f"Processo {i}", "causa": "Atraso"}]
+
+
+@pytest.fixture
+def client():
+    # Sem workers, os jobs ficam na fila: a capacidade é exatamente max_queue
+    service = AnalysisService(analyzer=None, max_workers=0, max_queue=2)
+    server = serve(service, port=0)
+    try:
+        yield AnalysisServiceClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_partial_batch_reports_accepted_jobs(client):
+    processes = [_process(i) for i in range(4)]
+    with pytest.raises(ServiceBusyError) as excinfo:
+        client.submit_batch(processes)
+
+    accepted = excinfo.value.accepted_job_ids
+    assert len(accepted) == 2
+    assert all(client.job_status(job_id)["status"] == "pendente" for job_id in accepted)
+
+    # Processos já aceitos são coalescidos aos jobs existentes, sem ocupar a fila
+    assert client.submit_batch(processes[:len(accepted)]) == accepted
+
+
+def test_single_submit_busy_has_no_accepted_jobs(client):
+    client.submit(_process(0))
+    client.submit(_process(1))
+    with pytest.raises(ServiceBusyError) as excinfo:
+        client.submit(_process(2))
+    assert excinfo.value.accepted_job_ids == []
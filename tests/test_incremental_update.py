@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from faiss_index import stored_labels
+from safe_index_store import open_vectorstore
+from index_versions import resolve_index_dir
+
+
+@pytest.mark.parametrize("storage_format", ["safe", "pickle"])
+@pytest.mark.parametrize("index_type", ["flat", "ivf"])
+def test_search_after_incremental_delete(tmp_path, build_index, catalog, hash_embeddings, index_type, storage_format):
+    index_dir = tmp_path / "index"
+    build_index(index_dir, catalog(range(200)), index_type, storage_format, incremental=False)
+
+    # Remove 5 linhas (incluindo a primeira) e acrescenta 3 novas
+    remaining = [i for i in range(203) if i not in (0, 10, 50, 120, 199)]
+    updated = catalog(remaining)
+    build_index(index_dir, updated, index_type, storage_format, incremental=True)
+
+    vectorstore = open_vectorstore(resolve_index_dir(str(index_dir)), hash_embeddings)
+    assert vectorstore.index.ntotal == len(updated)
+    labels = stored_labels(vectorstore.index)
+    if labels is not None:
+        assert np.array_equal(np.sort(labels), np.arange(len(updated)))
+
+    # Cada documento é o vizinho mais próximo do próprio texto
+    for text in updated["combined_text"]:
+        document = vectorstore.similarity_search(text, k=1)[0]
+        assert document.page_content == text
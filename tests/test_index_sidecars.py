@@ -0,0 +1,29 @@
+import os
+import logging
+
+import pytest
+
+import process_analyser
+from index_versions import resolve_index_dir
+from lexical_index import BM25_FILE
+
+
+def test_sidecars_are_loaded_on_first_use(make_analyzer):
+    analyzer = make_analyzer()
+    assert analyzer._sidecars == {}
+
+    assert analyzer.metadata_index.ntotal == 50
+    assert analyzer.lexical_index.ntotal == 50
+    assert set(analyzer._sidecars) == {"metadata_index", "lexical_index"}
+
+
+def test_missing_bm25_disables_hybrid_without_rebuilding(make_analyzer, monkeypatch, caplog):
+    os.remove(os.path.join(resolve_index_dir(str(make_analyzer.index_dir)), BM25_FILE))
+    monkeypatch.setattr(process_analyser.BM25Index, "from_vectorstore", pytest.fail)
+    analyzer = make_analyzer()
+
+    with caplog.at_level(logging.WARNING, logger=process_analyser.__name__):
+        assert analyzer.lexical_index is None
+    assert "busca híbrida desativada" in caplog.text
+    # O pré-filtro continua disponível
+    assert analyzer.metadata_index is not None
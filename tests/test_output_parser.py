@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from output_parser import IncrementalJSONArrayParser, OutputParsingError, parse_opportunity_list
+from response_cache import ResponseCache
+
+
+def _record(i, **overrides) -> dict:
+    record = {"oportunidade_melhoria": f"op {i}", "tarefa": f"tarefa {i}", "criterio_aceitacao": f"criterio {i}"}
+    record.update(overrides)
+    return record
+
+
+RECORDS = [_record(1), _record(2)]
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(RECORDS),
+    f"```json\n{json.dumps(RECORDS, indent=2)}\n```",
+    f"Seguem as oportunidades:\n{json.dumps(RECORDS)}\nEspero ter ajudado.",
+    repr(RECORDS),
+    json.dumps({"oportunidades": RECORDS}),
+])
+def test_accepted_formats(text):
+    records = parse_opportunity_list(text)
+    assert records == RECORDS
+    assert not records.truncated
+
+
+def test_single_record_dict():
+    assert parse_opportunity_list(json.dumps(RECORDS[0])) == [RECORDS[0]]
+
+
+def test_quotes_and_brackets_inside_strings():
+    records = [
+        _record(1, tarefa='Revisar o "SLA" {fornecedor} [crítico]'),
+        _record(2, oportunidade_melhoria="Reduzir o d'água e o \\ retrabalho"),
+    ]
+    text = json.dumps(records, ensure_ascii=False)
+    assert parse_opportunity_list(text) == records
+    # A extração incremental conta chaves e colchetes apenas fora das strings
+    assert parse_opportunity_list(text[:-1]) == records
+
+
+def test_truncated_array_keeps_complete_objects():
+    text = json.dumps(RECORDS + [_record(3)])
+    cut = text[:text.rindex('"tarefa"')]
+    records = parse_opportunity_list(f"```json\n{cut}")
+    assert records == RECORDS
+    assert records.truncated
+
+
+@pytest.mark.parametrize("records", [
+    [_record(1), {"oportunidade_melhoria": "op 2", "tarefa": "tarefa 2"}],
+    [_record(1, criterio_aceitacao="  ")],
+    [{"descricao": "sem os campos esperados"}],
+])
+def test_missing_or_empty_fields_fail(records):
+    with pytest.raises(OutputParsingError):
+        parse_opportunity_list(json.dumps(records))
+
+
+def test_unparseable_text_fails():
+    with pytest.raises(OutputParsingError):
+        parse_opportunity_list("Não foi possível identificar oportunidades.")
+
+
+def test_incremental_parser_emits_objects_as_they_complete():
+    text = "```json\n" + json.dumps(RECORDS, ensure_ascii=False) + "\n```"
+    parser = IncrementalJSONArrayParser()
+    emitted = []
+    for start in range(0, len(text), 7):
+        emitted.extend(parser.feed(text[start:start + 7]))
+    assert emitted == RECORDS
+    assert parser.finished
+
+
+def test_incremental_parser_single_quoted_literals():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed(repr(RECORDS)) == RECORDS
+
+
+PROCESS = [{"ramo_empresa": "Ramo 1", "nome_processo": "Processo 1", "atividade": "Compras",
+            "evento": "Atraso", "causa": "Fornecedor", "direcionadores": "Reduzir custos"}]
+
+
+def test_missing_fields_trigger_repair(make_analyzer):
+    incomplete = json.dumps([{"oportunidade_melhoria": "op 1", "tarefa": "tarefa 1"}])
+    analyzer = make_analyzer(responses=[incomplete, json.dumps(RECORDS)])
+    assert analyzer.analyze_process(PROCESS).to_dict("records") == RECORDS
+
+
+def test_truncated_answer_is_not_cached(make_analyzer):
+    truncated = json.dumps(RECORDS + [_record(3)])[:-40]
+    cache = ResponseCache()
+    analyzer = make_analyzer(responses=[truncated, json.dumps(RECORDS)], response_cache=cache)
+
+    assert analyzer.analyze_process(PROCESS).to_dict("records") == RECORDS
+    assert len(cache.backend) == 0
+    # A próxima análise chama o modelo de novo e grava a resposta completa
+    analyzer.analyze_process(PROCESS)
+    assert len(cache.backend) == 1
@@ -0,0 +1,38 @@
+import pytest
+
+from response_cache import (
+    InMemoryResponseBackend,
+    ResponseCache,
+    SQLiteResponseBackend,
+    make_cache_key,
+    normalize_process_data,
+)
+from text_utils import normalize_text
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        backend = InMemoryResponseBackend()
+    else:
+        backend = SQLiteResponseBackend(str(tmp_path / "responses.sqlite"))
+    return ResponseCache(backend)
+
+
+def test_hits_are_independent_copies(cache):
+    records = [{"oportunidade_melhoria": "op", "tarefa": "t", "criterio_aceitacao": "c"}]
+    cache.set("key", records)
+    records[0]["tarefa"] = "alterada pelo chamador antes"
+
+    hit = cache.get("key")
+    hit[0]["tarefa"] = "alterada pelo chamador depois"
+    hit.append({})
+
+    assert cache.get("key") == [{"oportunidade_melhoria": "op", "tarefa": "t", "criterio_aceitacao": "c"}]
+
+
+def test_form_values_normalize_like_lexical_tokens():
+    form = {"ramo_empresa": "  Gestão  de Estoques ", "causa": None, "evento": float("nan")}
+    assert normalize_process_data(form) == normalize_process_data({"ramo_empresa": "gestao de estoques"})
+    assert f'"{normalize_text(form["ramo_empresa"])}"' in normalize_process_data(form)
+    assert make_cache_key(form, ["1"], "m", "v1") == make_cache_key({"ramo_empresa": "GESTAO DE ESTOQUES"}, ["1"], "m", "v1")
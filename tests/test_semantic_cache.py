@@ -0,0 +1,54 @@
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+RECORDS = [{"oportunidade_melhoria": "op", "tarefa": "t", "criterio_aceitacao": "c"}]
+
+
+def _near(base: np.ndarray, scale: float, seed: int) -> np.ndarray:
+    noise = np.random.default_rng(seed).standard_normal(base.shape[0]).astype(np.float32)
+    return base + scale * noise / np.linalg.norm(noise)
+
+
+def test_hit_not_hidden_by_closer_entries_of_other_segments():
+    base = np.random.default_rng(0).standard_normal(16).astype(np.float32)
+    base /= np.linalg.norm(base)
+    cache = SemanticCache(threshold=0.9)
+    cache.set(_near(base, 0.2, 1), "varejo", "k", RECORDS)
+    # Muitas entradas de outros segmentos, todas mais próximas da consulta
+    for i in range(50):
+        cache.set(_near(base, 0.01, 100 + i), f"outro {i % 3}", "k", [{"tarefa": f"outro {i}"}])
+
+    records, similarity = cache.get(base, "varejo", "k")
+    assert records == RECORDS
+    assert similarity >= 0.9
+
+
+def test_other_segment_or_key_never_hits():
+    vector = np.ones(16, dtype=np.float32)
+    cache = SemanticCache(threshold=0.9)
+    cache.set(vector, "varejo", "k", RECORDS)
+
+    assert cache.get(vector, "industria", "k") == (None, 0.0)
+    assert cache.get(vector, "varejo", "outra chave") == (None, 0.0)
+    assert cache.get(vector, "varejo", "k")[0] == RECORDS
+
+
+def test_expired_entries_do_not_hide_valid_ones():
+    base = np.ones(16, dtype=np.float32)
+    cache = SemanticCache(threshold=0.9, ttl_seconds=-1)
+    for i in range(20):
+        cache.set(_near(base, 0.01, i), "varejo", "k", [{"tarefa": f"expirada {i}"}])
+    cache.ttl_seconds = 3600
+    cache.set(_near(base, 0.3, 99), "varejo", "k", RECORDS)
+
+    assert cache.get(base, "varejo", "k")[0] == RECORDS
+    assert cache.stats()["entries"] == 1
+
+
+def test_hits_are_independent_copies():
+    vector = np.ones(16, dtype=np.float32)
+    cache = SemanticCache(threshold=0.9)
+    cache.set(vector, "varejo", "k", [dict(record) for record in RECORDS])
+    cache.get(vector, "varejo", "k")[0][0]["tarefa"] = "alterada"
+    assert cache.get(vector, "varejo", "k")[0] == RECORDS
@@ -0,0 +1,53 @@
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+# Palavras funcionais do português ignoradas na indexação e nas consultas
+PORTUGUESE_STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre na nas no nos o os ou para pela pelas
+pelo pelos por que se sem sob sobre um uma umas uns
+""".split())
+
+
+def fold_accents(text: str) -> str:
+    """Remove acentos e cedilhas ("Gestão" -> "Gestao")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize_text(text) -> str:
+    """Minúsculas, sem acentos e com pontuação reduzida a espaços simples."""
+    if text is None:
+        return ""
+    return _NON_WORD.sub(" ", fold_accents(str(text)).lower()).strip()
+
+
+def tokenize(text, stopwords: frozenset = PORTUGUESE_STOPWORDS) -> list[str]:
+    """Tokens normalizados de text, sem as palavras funcionais."""
+    return [token for token in normalize_text(text).split() if token not in stopwords]
+
+
+# Plurais e flexões mais comuns, aplicados após a remoção de acentos (ordem importa)
+_SUFFIXES = (
+    ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"),
+    ("res", "r"), ("zes", "z"), ("ns", "m"), ("s", ""),
+)
+
+
+def light_stem(token: str) -> str:
+    """
+    Redução leve de plurais do português ("insumos" -> "insumo", "operações" ->
+    "operacao", "fornecedores" -> "fornecedor"). Tokens curtos ficam inalterados.
+    """
+    if len(token) <= 3:
+        return token
+    for suffix, replacement in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)] + replacement
+    return token
+
+
+def analyze(text) -> list[str]:
+    """Tokens normalizados, sem palavras funcionais e com plurais reduzidos (busca lexical)."""
+    return [light_stem(token) for token in tokenize(text)]
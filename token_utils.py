@@ -0,0 +1,51 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Aproximação usada quando o arquivo BPE do tiktoken não pode ser obtido (ambiente offline)
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = DEFAULT_ENCODING):
+    """
+    Retorna a codificação tiktoken, ou None se ela não puder ser carregada.
+
+    O tiktoken baixa o arquivo BPE no primeiro uso; sem rede, a contagem de tokens
+    passa a ser estimada pelo número de caracteres.
+    """
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logging.getLogger(__name__).warning(
+            f"Codificação tiktoken '{encoding_name}' indisponível ({e}); usando estimativa por caracteres."
+        )
+        return None
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """Conta os tokens de um texto."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return max(1, len(text) // _CHARS_PER_TOKEN) if text else 0
+    return len(encoding.encode_ordinary(text))
+
+
+def count_tokens_batch(texts: list[str], encoding_name: str = DEFAULT_ENCODING) -> list[int]:
+    """Conta os tokens de uma lista de textos."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return [count_tokens(text, encoding_name) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> str:
+    """Corta text para no máximo max_tokens tokens."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return text[: max_tokens * _CHARS_PER_TOKEN]
+    tokens = encoding.encode_ordinary(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])